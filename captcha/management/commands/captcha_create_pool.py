@@ -1,7 +1,7 @@
 from django.core.management.base import BaseCommand
-from django.db import transaction
 
 from captcha.models import CaptchaStore
+from captcha.pool import CaptchaPool
 
 
 class Command(BaseCommand):
@@ -18,14 +18,13 @@ class Command(BaseCommand):
             "--cleanup-expired",
             action="store_true",
             default=True,
-            help="Cleanup expired captchas after creating new ones",
+            help="Cleanup expired database captchas after creating new ones",
         )
 
-    @transaction.atomic
     def handle(self, **options):
         verbose = int(options.get("verbosity"))
         count = options.get("pool_size")
-        CaptchaStore.create_pool(count)
+        CaptchaPool.create_pool(count)
         verbose and self.stdout.write("Created %d new captchas\n" % count)
         options.get("cleanup_expired") and CaptchaStore.remove_expired()
         options.get("cleanup_expired") and verbose and self.stdout.write(
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# project : xadmin-server
+# filename : pool
+# author : ly_13
+# date : 10/18/2026
+import base64
+import hashlib
+import json
+import secrets
+
+from django.conf import settings
+from django_redis import get_redis_connection
+
+from captcha.helpers import get_challenge, render_captcha_image
+from common.cache.storage import CaptchaCache
+from common.utils import get_logger
+
+logger = get_logger(__name__)
+
+
+class CaptchaPool(object):
+    """
+    验证码池，预先渲染好的验证码保存在 Redis 集合中，通过 SPOP 原子取出，获取验证码不再查询数据库和实时渲染图片
+    取出的验证码保存在 CaptchaCache 中，依赖 Redis 过期时间自动失效
+    """
+    timeout = 3600 * 24
+    batch_size = 100
+    # 影响验证码内容和样式的配置
+    setting_names = [
+        'CAPTCHA_CHALLENGE_FUNCT', 'CAPTCHA_LENGTH', 'CAPTCHA_MATH_CHALLENGE_OPERATOR', 'CAPTCHA_IMAGE_SIZE',
+        'CAPTCHA_FONT_PATH', 'CAPTCHA_FONT_SIZE', 'CAPTCHA_BACKGROUND_COLOR', 'CAPTCHA_FOREGROUND_COLOR',
+        'CAPTCHA_LETTER_ROTATION', 'CAPTCHA_NOISE_FUNCTIONS', 'CAPTCHA_FILTER_FUNCTIONS', 'CAPTCHA_PUNCTUATION',
+    ]
+
+    @staticmethod
+    def get_connection():
+        return get_redis_connection("default")
+
+    @classmethod
+    def get_pool_key(cls):
+        """验证码配置修改后使用新的验证码池，旧的验证码池自动过期"""
+        data = json.dumps([getattr(settings, name, None) for name in cls.setting_names], default=str)
+        signature = hashlib.md5(data.encode('utf-8')).hexdigest()
+        return f"{settings.CACHE_KEY_TEMPLATE.get('captcha_pool_key')}_{signature}"
+
+    @staticmethod
+    def make_captcha():
+        challenge, response = get_challenge()()
+        return {
+            'hashkey': secrets.token_hex(20),
+            'challenge': challenge,
+            'response': response.lower(),
+            'image': render_captcha_image(challenge),
+        }
+
+    @staticmethod
+    def dumps(store):
+        return json.dumps({**store, 'image': base64.b64encode(store['image']).decode('utf-8')})
+
+    @staticmethod
+    def loads(data):
+        store = json.loads(data)
+        store['image'] = base64.b64decode(store['image'])
+        return store
+
+    @classmethod
+    def create_pool(cls, count=1000):
+        """向验证码池中添加 count 个验证码"""
+        pool_key = cls.get_pool_key()
+        connection = cls.get_connection()
+        created = 0
+        while created < count:
+            size = min(cls.batch_size, count - created)
+            with connection.pipeline(transaction=False) as pipe:
+                pipe.sadd(pool_key, *[cls.dumps(cls.make_captcha()) for _ in range(size)])
+                pipe.expire(pool_key, cls.timeout)
+                pipe.execute()
+            created += size
+        return created
+
+    @classmethod
+    def refill(cls, size=None):
+        """补充验证码池到目标数量"""
+        if size is None:
+            size = settings.CAPTCHA_POOL_SIZE
+        count = size - cls.get_connection().scard(cls.get_pool_key())
+        if count > 0:
+            return cls.create_pool(count)
+        return 0
+
+    @classmethod
+    def pick(cls):
+        """
+        取出一个验证码，验证码池为空时实时生成
+        :return: (hashkey, 验证码信息)
+        """
+        data = None
+        if settings.CAPTCHA_GET_FROM_POOL:
+            data = cls.get_connection().spop(cls.get_pool_key())
+            if not data:
+                # 定时任务未运行或补充不及时，实时生成即可，不需要每次请求都告警
+                logger.debug("Couldn't get a captcha from pool, generating")
+        store = cls.loads(data) if data else cls.make_captcha()
+        CaptchaCache(store['hashkey']).set_storage_cache(store, int(settings.CAPTCHA_TIMEOUT) * 60)
+        return store['hashkey'], store
+
+    @staticmethod
+    def get(hashkey):
+        return CaptchaCache(hashkey).get_storage_cache()
+
+    @classmethod
+    def valid(cls, hashkey, response):
+        """校验成功后删除验证码，删除成功才算校验通过，保证验证码只能使用一次"""
+        store = cls.get(hashkey)
+        if store and store['response'] == response.strip(" ").lower():
+            return bool(CaptchaCache(hashkey).del_storage_cache())
+        return False
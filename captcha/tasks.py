@@ -7,6 +7,7 @@
 from celery import shared_task
 
 from captcha.models import CaptchaStore
+from captcha.pool import CaptchaPool
 from common.celery.decorator import register_as_period_task
 
 
@@ -14,3 +15,9 @@ from common.celery.decorator import register_as_period_task
 @register_as_period_task(crontab='12 2 * * *')
 def auto_clean_expired_captcha_job():
     CaptchaStore.remove_expired()
+
+
+@shared_task
+@register_as_period_task(interval=60)
+def refill_captcha_pool_job():
+    CaptchaPool.refill()
@@ -1 +1,95 @@
-# Create your tests here.
+import uuid
+
+import mock
+from django.conf import settings
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from captcha import pool
+from captcha.pool import CaptchaPool
+from common.cache.storage import CaptchaCache
+
+
+class CaptchaPoolTests(SimpleTestCase):
+
+    def setUp(self):
+        # 使用独立的验证码池，避免影响其他测试
+        template = {**settings.CACHE_KEY_TEMPLATE, 'captcha_pool_key': f'captcha_pool_{uuid.uuid4().hex}'}
+        settings_override = override_settings(CACHE_KEY_TEMPLATE=template, CAPTCHA_GET_FROM_POOL=True)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(self.clean_keys, template['captcha_pool_key'])
+
+    @staticmethod
+    def clean_keys(prefix):
+        connection = CaptchaPool.get_connection()
+        keys = list(connection.scan_iter(f'{prefix}_*'))
+        if keys:
+            connection.delete(*keys)
+
+    def pick(self):
+        hashkey, store = CaptchaPool.pick()
+        self.addCleanup(CaptchaCache(hashkey).del_storage_cache)
+        return hashkey, store
+
+    def pool_size(self):
+        return CaptchaPool.get_connection().scard(CaptchaPool.get_pool_key())
+
+    @override_settings(CAPTCHA_GET_FROM_POOL=False)
+    def test_pick_without_pool(self):
+        with mock.patch.object(CaptchaPool, 'get_connection') as get_connection:
+            hashkey, store = self.pick()
+        get_connection.assert_not_called()
+        self.assertEqual(CaptchaPool.get(hashkey), store)
+        self.assertEqual(store['hashkey'], hashkey)
+
+    def test_valid_once(self):
+        hashkey, store = self.pick()
+        self.assertFalse(CaptchaPool.valid(hashkey, 'wrong'))
+        # 校验失败不删除验证码
+        self.assertIsNotNone(CaptchaPool.get(hashkey))
+        self.assertTrue(CaptchaPool.valid(hashkey, f" {store['response'].upper()} "))
+        self.assertFalse(CaptchaPool.valid(hashkey, store['response']))
+        self.assertFalse(CaptchaPool.valid('not_exists', store['response']))
+
+    @override_settings(CAPTCHA_TIMEOUT=2)
+    def test_expiration(self):
+        hashkey, store = self.pick()
+        self.assertTrue(0 < cache.ttl(CaptchaCache(hashkey).cache_key) <= 120)
+        # 模拟验证码过期
+        CaptchaCache(hashkey).del_storage_cache()
+        self.assertFalse(CaptchaPool.valid(hashkey, store['response']))
+
+    def test_pick_from_pool(self):
+        self.assertEqual(CaptchaPool.refill(size=3), 3)
+        self.assertEqual(CaptchaPool.refill(size=3), 0)
+        with mock.patch.object(CaptchaPool, 'make_captcha', wraps=CaptchaPool.make_captcha) as make_captcha:
+            hashkey, store = self.pick()
+        # 从验证码池中取出，不再实时生成
+        make_captcha.assert_not_called()
+        self.assertEqual(self.pool_size(), 2)
+        self.assertEqual(CaptchaPool.get(hashkey), store)
+        self.assertIsInstance(store['image'], bytes)
+        self.assertTrue(CaptchaPool.valid(hashkey, store['response']))
+        self.assertEqual(CaptchaPool.refill(size=3), 1)
+
+    def test_empty_pool_fallback(self):
+        self.assertEqual(self.pool_size(), 0)
+        with mock.patch.object(pool.logger, 'warning') as warning:
+            hashkey, store = self.pick()
+        # 验证码池为空时实时生成，不输出告警日志
+        warning.assert_not_called()
+        self.assertTrue(CaptchaPool.valid(hashkey, store['response']))
+
+    def test_new_pool_after_settings_change(self):
+        CaptchaPool.refill(size=1)
+        pool_key = CaptchaPool.get_pool_key()
+        with override_settings(CAPTCHA_LENGTH=settings.CAPTCHA_LENGTH + 1,
+                               CAPTCHA_CHALLENGE_FUNCT='captcha.helpers.random_char_challenge'):
+            self.assertNotEqual(CaptchaPool.get_pool_key(), pool_key)
+            self.assertEqual(self.pool_size(), 0)
+            _, store = self.pick()
+            self.assertEqual(len(store['response']), settings.CAPTCHA_LENGTH)
+        # 旧配置的验证码池不受影响
+        self.assertEqual(CaptchaPool.get_pool_key(), pool_key)
+        self.assertEqual(self.pool_size(), 1)
@@ -5,10 +5,8 @@
 # author : ly_13
 # date : 8/10/2024
 
-from django.utils import timezone
-
 from captcha.helpers import captcha_image_url
-from captcha.models import CaptchaStore
+from captcha.pool import CaptchaPool
 from common.utils import get_logger
 
 logger = get_logger(__name__)
@@ -19,25 +17,12 @@ class CaptchaAuth(object):
         self.captcha_key = captcha_key
         self.request = request
 
-    def __get_captcha_obj(self):
-        return CaptchaStore.objects.filter(hashkey=self.captcha_key).first()
-
     def generate(self):
-        self.captcha_key = CaptchaStore.generate_key()
+        self.captcha_key, store = CaptchaPool.pick()
         captcha_image = captcha_image_url(self.captcha_key)
         if self.request:
             captcha_image = self.request.build_absolute_uri(captcha_image)
-        captcha_obj = self.__get_captcha_obj()
-        code_length = 0
-        if captcha_obj:
-            code_length = len(captcha_obj.response)
-        return {"captcha_image": captcha_image, "captcha_key": self.captcha_key, "length": code_length}
+        return {"captcha_image": captcha_image, "captcha_key": self.captcha_key, "length": len(store['response'])}
 
     def valid(self, verify_code):
-        try:
-            CaptchaStore.objects.get(
-                response=verify_code.strip(" ").lower(), hashkey=self.captcha_key, expiration__gt=timezone.now()
-            ).delete()
-        except CaptchaStore.DoesNotExist:
-            return False
-        return True
+        return CaptchaPool.valid(self.captcha_key, verify_code)
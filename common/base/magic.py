@@ -6,7 +6,10 @@
 # date : 6/2/2023
 
 
+import fnmatch
+import threading
 import time
+from collections import OrderedDict
 from functools import wraps, WRAPPER_ASSIGNMENTS
 from importlib import import_module
 
@@ -14,6 +17,7 @@ from django.core.cache import cache
 from django.db import close_old_connections, connection
 from django.http.response import HttpResponse
 
+from common.cache.storage import CacheNamespace
 from common.utils import get_logger
 
 logger = get_logger(__name__)
@@ -143,14 +147,66 @@ def magic_call_in_times(call_time=24 * 3600, call_limit=6, key=None):
     return decorator
 
 
+class LocalLRUCache(object):
+    """
+    进程内 LRU 缓存，带过期时间，用于热点数据，避免频繁访问 Redis
+    """
+    missing = object()
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=missing):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            if item[0] < time.time():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return item[1]
+
+    def set(self, key, value, timeout):
+        with self._lock:
+            self._data[key] = (time.time() + timeout, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def delete_pattern(self, pattern):
+        with self._lock:
+            for key in fnmatch.filter(list(self._data.keys()), pattern):
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
 class MagicCacheData(object):
+    local_cache = LocalLRUCache(maxsize=2048)
+    wait_interval = 0.05  # 等待其他进程计算数据的轮询间隔，单位秒
+
     @staticmethod
-    def make_cache(timeout=60 * 10, invalid_time=0, key_func=None, timeout_func=None):
+    def make_cache(timeout=60 * 10, invalid_time=0, key_func=None, timeout_func=None, single_flight=False,
+                   stale_time=0, local_timeout=0, version_func=None):
         """
         :param timeout_func:
         :param timeout:  数据缓存的时候，单位秒
         :param invalid_time: 数据缓存提前失效时间，单位秒。该cache有效时间为 cache_time-invalid_time
         :param key_func: cache唯一标识，默认为所装饰函数名称
+        :param single_flight: 缓存命中时仅需一次 Redis GET，缓存失效时只有一个进程重新计算，不再加锁轮询等待
+        :param stale_time: single_flight 模式下，数据过期后仍可返回旧数据的时间，单位秒，期间由一个进程后台刷新
+        :param local_timeout: single_flight 模式下，进程内 L1 缓存时间，单位秒，用于热点数据，建议设置较短时间
+        :param version_func: single_flight 模式下，数据的当前版本号，版本号保存在缓存数据中，不一致时按过期数据处理
         :return:
         """
 
@@ -164,6 +220,10 @@ class MagicCacheData(object):
                 cache_time = timeout
                 if timeout_func:
                     cache_time = timeout_func(*args, **kwargs)
+                if single_flight:
+                    version = version_func(*args, **kwargs) if version_func else None
+                    return MagicCacheData.single_flight_call(func, cache_key, cache_time - invalid_time, stale_time,
+                                                             local_timeout, version, *args, **kwargs)
                 n_time = time.time()
                 res = cache.get(cache_key)
                 if res:
@@ -197,30 +257,105 @@ class MagicCacheData(object):
 
         return decorator
 
+    @staticmethod
+    def single_flight_call(func, cache_key, cache_time, stale_time, local_timeout, version, *args, **kwargs):
+        """
+        1.L1 进程内缓存命中，直接返回
+        2.Redis 缓存未过期且版本号一致，直接返回
+        3.Redis 缓存已过期但在 stale_time 内，或者版本号不一致，通过 cache.add 抢占刷新标识，抢到的进程重新计算，其他进程返回旧数据
+        4.没有缓存数据，抢到刷新标识的进程计算，其他进程短暂等待计算结果
+        """
+        local_cache = MagicCacheData.local_cache
+        if local_timeout:
+            item = local_cache.get(cache_key)
+            if item is not local_cache.missing and item[0] == version:
+                return item[1]
+
+        n_time = time.time()
+        refresh_key = f"refresh_{cache_key}"
+        refresh_timeout = max(min(cache_time, 60), 1)
+        res = cache.get(cache_key)
+        if res and res.get('status') == 'ok':
+            if n_time - res.get('c_time', n_time) < cache_time and res.get('version') == version:
+                if local_timeout:
+                    local_cache.set(cache_key, (version, res['data']), local_timeout)
+                return res['data']
+            if not cache.add(refresh_key, 1, refresh_timeout):
+                logger.debug(f"exec {func} refreshing by other worker. cache_key:{cache_key} return stale data")
+                return res['data']
+        elif not cache.add(refresh_key, 1, refresh_timeout):
+            # 其他进程正在计算，等待计算结果，超时后自行计算
+            while time.time() - n_time < refresh_timeout:
+                time.sleep(MagicCacheData.wait_interval)
+                res = cache.get(cache_key)
+                if res and res.get('status') == 'ok':
+                    return res['data']
+                if not cache.get(refresh_key):
+                    # 计算的进程失败退出，不再等待
+                    logger.debug(f"exec {func} refresh key released. cache_key:{cache_key}")
+                    break
+            else:
+                logger.warning(f"exec {func} wait timeout. cache_key:{cache_key}")
+            return func(*args, **kwargs)
+
+        try:
+            data = func(*args, **kwargs)
+        except Exception as e:
+            cache.delete(refresh_key)
+            logger.error(f"exec {func} failed. time:{time.time() - n_time} cache_key:{cache_key} Exception:{e}")
+            if res and res.get('status') == 'ok':
+                return res['data']
+            raise
+
+        # 先写入数据再释放刷新标识，避免其他进程在写入前抢到标识重复计算
+        cache.set(cache_key, {'c_time': n_time, 'data': data, 'status': 'ok', 'version': version},
+                  cache_time + stale_time)
+        if local_timeout:
+            local_cache.set(cache_key, (version, data), local_timeout)
+        cache.delete(refresh_key)
+        logger.debug(f"exec {func} finished. time:{time.time() - n_time} cache_key:{cache_key} result:{data}")
+        return data
+
     @staticmethod
     def invalid_cache(key):
         cache_key = f'magic_cache_data_{key}'
-        count = cache.delete_pattern(cache_key)
+        if '*' in cache_key:
+            # 通配符会扫描整个 Redis，业务代码应使用 invalid_caches 精确删除
+            count = cache.delete_pattern(cache_key)
+            MagicCacheData.local_cache.delete_pattern(cache_key)
+        else:
+            count = cache.delete(cache_key)
+            MagicCacheData.local_cache.delete_many([cache_key])
         logger.warning(f"invalid_cache cache_key:{cache_key} count:{count}")
 
     @staticmethod
     def invalid_caches(keys):
         delete_keys = [f'magic_cache_data_{key}' for key in keys]
         count = cache.delete_many(delete_keys)
+        MagicCacheData.local_cache.delete_many(delete_keys)
         logger.warning(
             f"invalid_cache_data cache_key:{delete_keys[0]}... {len(delete_keys)} count. delete count:{count}")
 
 class MagicCacheResponse(object):
+    namespace_timeout = 3600 * 24  # 命名空间代数的过期时间，响应缓存的过期时间不会超过该时间
+
     def __init__(self, timeout=60 * 10, invalid_time=0, key_func=None):
         self.timeout = timeout
         self.key_func = key_func
         self.invalid_time = invalid_time
 
+    @staticmethod
+    def get_namespace(key):
+        return CacheNamespace(f'magic_cache_response_{key}', timeout=MagicCacheResponse.namespace_timeout)
+
     @staticmethod
     def invalid_cache(key):
+        """失效 key 对应的缓存和以 key 为命名空间的缓存，递增命名空间代数，不再扫描 Redis"""
+        key = key.rstrip("*")
         cache_key = f'magic_cache_response_{key}'
-        count = cache.delete_pattern(cache_key)
-        logger.warning(f"invalid_response_cache cache_key:{cache_key} count:{count}")
+        version = MagicCacheResponse.get_namespace(key).incr_version()
+        count = cache.delete(cache_key)
+        logger.warning(f"invalid_response_cache cache_key:{cache_key} version:{version} count:{count}")
 
     @staticmethod
     def invalid_caches(keys):
@@ -288,7 +423,7 @@ class MagicCacheResponse(object):
                     {k: (k, v) for k, v in response.items()}
                 )
                 res = {'c_time': n_time, 'data': data}
-                cache.set(cache_key, res, timeout)
+                cache.set(cache_key, res, min(timeout, self.namespace_timeout))
                 logger.debug(
                     f"exec {func_name} finished. time:{time.time() - n_time}  cache_key:{cache_key} result:{res}")
 
@@ -5,6 +5,8 @@
 # author : ly_13
 # date : 6/2/2023
 
+import time
+
 from django.conf import settings
 from django.core.cache import cache
 
@@ -58,7 +60,20 @@ class RedisCacheBase(object):
     def get_many(self):
         return cache.get_many(self.cache_key)
 
+    @staticmethod
+    def get_many_storage_cache(cache_keys):
+        return cache.get_many(cache_keys)
+
+    @staticmethod
+    def set_many_storage_cache(data, timeout=None):
+        return cache.set_many(data, timeout)
+
+    @staticmethod
+    def del_many_storage_cache(cache_keys):
+        return cache.delete_many(cache_keys)
+
     def del_many(self):
+        # 会扫描整个 Redis，仅用于运维命令，业务代码的批量失效使用 CacheNamespace
         cache.delete_pattern(self.cache_key)
         return True
 
@@ -93,6 +108,18 @@ class BlackAccessTokenCache(RedisCacheBase):
         super().__init__(self.cache_key)
 
 
+class AuthUserCache(RedisCacheBase):
+    def __init__(self, user_id):
+        self.cache_key = f"{settings.CACHE_KEY_TEMPLATE.get('auth_user_key')}_{user_id}"
+        super().__init__(self.cache_key, timeout=settings.AUTH_USER_CACHE_TIMEOUT)
+
+
+class CaptchaCache(RedisCacheBase):
+    def __init__(self, hashkey):
+        self.cache_key = f"{settings.CACHE_KEY_TEMPLATE.get('captcha_key')}_{hashkey}"
+        super().__init__(self.cache_key)
+
+
 class UserSystemConfigCache(RedisCacheBase):
     def __init__(self, prefix_key):
         self.cache_key = f"{settings.CACHE_KEY_TEMPLATE.get('config_key')}_{prefix_key}"
@@ -103,3 +130,92 @@ class CommonResourceIDsCache(RedisCacheBase):
     def __init__(self, prefix_key):
         self.cache_key = f"{settings.CACHE_KEY_TEMPLATE.get('common_resource_ids_key')}_{prefix_key}"
         super().__init__(self.cache_key)
+
+
+class VersionCacheBase(RedisCacheBase):
+    """
+    版本号缓存，数据发生变化时递增版本号，依赖版本号的缓存自动失效
+    """
+
+    def __init__(self, cache_key):
+        super().__init__(cache_key, timeout=None)
+
+    def get_version(self):
+        return self.get_storage_cache(0)
+
+    def incr_version(self):
+        cache.add(self.cache_key, 0, None)
+        return self.incr()
+
+
+class CacheNamespace(VersionCacheBase):
+    """
+    缓存命名空间，命名空间的代数拼接到缓存 key 中，失效整个命名空间只需一次 INCR，不再使用 delete_pattern 扫描
+    旧代数的缓存不再被访问，等待过期时间自动清理，因此命名空间内的缓存必须设置过期时间
+    按用户等数量不固定的命名空间，需设置 timeout，且不小于命名空间内缓存的最长过期时间
+    """
+
+    def __init__(self, namespace, timeout=None):
+        super().__init__(f"{settings.CACHE_KEY_TEMPLATE.get('cache_namespace_key')}_{namespace}")
+        self._timeout = timeout
+
+    def incr_version(self):
+        if self._timeout is None:
+            return super().incr_version()
+        # 代数过期后从当前时间戳开始递增，不会重复使用过期前的代数，旧代数的缓存不会再次生效
+        cache.add(self.cache_key, int(time.time() * 1000), self._timeout)
+        version = self.incr()
+        self.expire(self._timeout)
+        return version
+
+    @staticmethod
+    def make_version_key(key, version):
+        return f"{key}_g{version}"
+
+    def make_key(self, key):
+        return self.make_version_key(key, self.get_version())
+
+
+class DataPermissionVersionCache(VersionCacheBase):
+    """
+    数据权限版本号，数据权限，部门，用户绑定的规则发生变化时递增，用于让缓存的数据权限规则失效
+    """
+
+    def __init__(self):
+        super().__init__(f"{settings.CACHE_KEY_TEMPLATE.get('data_permission_version_key')}")
+
+
+class DeptTreeVersionCache(VersionCacheBase):
+    """
+    部门树版本号，部门新增，删除，修改时递增，用于让进程内的部门树索引失效
+    """
+
+    def __init__(self):
+        super().__init__(f"{settings.CACHE_KEY_TEMPLATE.get('dept_tree_version_key')}")
+
+
+class SearchColumnsVersionCache(VersionCacheBase):
+    """
+    表格字段配置版本号，模型字段，字段扩展，分隔字段发生变化时递增，用于让进程内缓存的字段信息失效
+    """
+
+    def __init__(self):
+        super().__init__(f"{settings.CACHE_KEY_TEMPLATE.get('search_columns_version_key')}")
+
+
+class DashboardRollupVersionCache(VersionCacheBase):
+    """
+    面板统计汇总数据版本号，定时任务更新汇总数据后递增，用于让缓存的面板数据失效，为 0 时表示还未汇总
+    """
+
+    def __init__(self):
+        super().__init__(f"{settings.CACHE_KEY_TEMPLATE.get('dashboard_rollup_version_key')}")
+
+
+class MenuRouteVersionCache(VersionCacheBase):
+    """
+    菜单路由版本号，菜单，角色，部门及其关联关系发生变化时递增，用于让按角色组合缓存的路由树失效
+    """
+
+    def __init__(self):
+        super().__init__(f"{settings.CACHE_KEY_TEMPLATE.get('menu_route_version_key')}")
@@ -7,14 +7,17 @@
 import functools
 import hashlib
 
+from django.core.cache import cache
+from django.db.models import FileField
 from django.http.cookie import parse_cookie
 from django.utils.translation import gettext_lazy as _
 from rest_framework.exceptions import NotAuthenticated
 from rest_framework_simplejwt.authentication import JWTAuthentication
-from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.exceptions import TokenError, AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
 from rest_framework_simplejwt.tokens import AccessToken
 
-from common.cache.storage import BlackAccessTokenCache
+from common.cache.storage import BlackAccessTokenCache, AuthUserCache
 
 
 def auth_required(view_func):
@@ -27,16 +30,51 @@ def auth_required(view_func):
     return wrapper
 
 
+def get_user_snapshot(user_obj):
+    """用户字段快照，不包含密码，文件字段只保存文件名"""
+    fields = {}
+    for field in user_obj._meta.concrete_fields:
+        if field.attname == 'password':
+            continue
+        value = getattr(user_obj, field.attname)
+        if isinstance(field, FileField):
+            value = value.name if value else value
+        fields[field.attname] = value
+    return {'fields': fields, 'role_ids': list(user_obj.roles.values_list('pk', flat=True))}
+
+
+def build_user_from_snapshot(model, snapshot):
+    """通过快照构建用户实例，密码为延迟加载字段，访问时才查询数据库"""
+    fields = snapshot['fields']
+    user_obj = model.from_db(None, list(fields.keys()), list(fields.values()))
+    user_obj.role_ids = snapshot['role_ids']
+    return user_obj
+
+
+def get_user_role_ids(user_obj):
+    """优先使用认证时缓存的角色ID，避免查询数据库"""
+    role_ids = getattr(user_obj, 'role_ids', None)
+    if role_ids is None:
+        role_ids = list(user_obj.roles.values_list('pk', flat=True))
+    return role_ids
+
+
 class ServerAccessToken(AccessToken):
     """
     自定义的token方法是为了登出的时候，将 access token 禁用
+    黑名单和用户信息缓存通过一次 MGET 查询，用户信息保存在 user_snapshot 中，由认证类使用
     """
+    user_snapshot = None
 
     def verify(self):
         user_id = self.payload.get('user_id')
-        if BlackAccessTokenCache(user_id, hashlib.md5(self.token).hexdigest()).get_storage_cache():
+        black_key = BlackAccessTokenCache(user_id, hashlib.md5(self.token).hexdigest()).cache_key
+        user_key = AuthUserCache(user_id).cache_key
+        data = cache.get_many([black_key, user_key])
+        if data.get(black_key):
             raise TokenError(_("Token is invalid or expired"))
         super().verify()
+        self.user_snapshot = data.get(user_key)
 
 
 class GetUserFromAccessToken(AccessToken):
@@ -46,8 +84,23 @@ class GetUserFromAccessToken(AccessToken):
 class CookieJWTAuthentication(JWTAuthentication):
     """
     支持cookie认证，是为了可以访问 django-proxy 的页面，比如 flower
+    用户信息短时间缓存，缓存命中时认证不再查询数据库，用户修改，角色变化，登出时主动失效
     """
 
+    def get_user(self, validated_token):
+        snapshot = getattr(validated_token, 'user_snapshot', None)
+        # 校验修改密码后 token 失效需要用户密码，不使用缓存，也不再写入不会被读取的缓存
+        if api_settings.CHECK_REVOKE_TOKEN:
+            return super().get_user(validated_token)
+        if snapshot is None:
+            user_obj = super().get_user(validated_token)
+            AuthUserCache(user_obj.pk).set_storage_cache(get_user_snapshot(user_obj))
+            return user_obj
+        user_obj = build_user_from_snapshot(self.user_model, snapshot)
+        if not user_obj.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return user_obj
+
     def get_header(self, request):
         header = super().get_header(request)
         if not header:
@@ -4,17 +4,21 @@
 # filename : config
 # author : ly_13
 # date : 12/15/2023
-# 修改下面配置之后，记得清理一下redis缓存： python manage.py expire_caches 'config_*'
+# 修改下面配置之后，记得清理一下redis缓存： python manage.py expire_config_caches
 
 
+import copy
 import json
+import os
 import re
+import threading
 
 from django.template import Context, Template, TemplateSyntaxError
 from django.template.base import VariableNode
 from rest_framework import serializers
 
-from common.cache.storage import UserSystemConfigCache
+from common.base.magic import LocalLRUCache
+from common.cache.storage import UserSystemConfigCache, CacheNamespace
 from common.utils import get_logger
 from server import settings
 from system.models import SystemConfig, UserPersonalConfig
@@ -39,6 +43,54 @@ def get_render_context(tmp: str, context: dict) -> str:
     return template.render(context)
 
 
+class ConfigLocalCache(object):
+    """
+    配置的进程内缓存，位于 Redis 缓存之前，避免每次读取配置都访问 Redis
+    配置修改后，通过 Redis 发布订阅通知所有进程删除对应缓存，订阅失败时依赖过期时间失效
+    """
+    channel = 'config_cache_invalidation'
+
+    def __init__(self, maxsize=4096, timeout=60):
+        self.cache = LocalLRUCache(maxsize=maxsize)
+        self.timeout = timeout
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        # 多进程部署时，子进程需要重新订阅
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self.cache.clear()
+            try:
+                from common.utils.connection import RedisPubSub
+                RedisPubSub(self.channel).subscribe(self.cache.delete_pattern)
+            except Exception as e:
+                logger.warning(f"config local cache subscribe failed {e}")
+
+    def get(self, cache_key):
+        self.subscribe()
+        data = self.cache.get(cache_key, None)
+        return copy.deepcopy(data)
+
+    def set(self, cache_key, data):
+        self.cache.set(cache_key, copy.deepcopy(data), self.timeout)
+
+    def invalid(self, pattern):
+        self.cache.delete_pattern(pattern)
+        try:
+            from common.utils.connection import RedisPubSub
+            RedisPubSub(self.channel).publish(pattern)
+        except Exception as e:
+            logger.warning(f"config local cache publish failed {e}")
+
+
+config_local_cache = ConfigLocalCache()
+
+
 class ConfigCacheBase(object):
     def __init__(self, px='system', model=SystemConfig, cache=UserSystemConfigCache, serializer=SystemConfigSerializer,
                  timeout=60 * 60 * 24 * 30, filter_kwargs=None):
@@ -51,8 +103,41 @@ class ConfigCacheBase(object):
         self.serializer = serializer
         self.filter_kwargs = filter_kwargs
 
+    @property
+    def root_px(self):
+        # 用户配置的 px 为 user_{pk}，所有用户共用一个命名空间
+        return self.px.split('_')[0]
+
+    def get_namespace_version(self):
+        """命名空间代数同样缓存在进程内，命名空间失效时通过发布订阅一起删除"""
+        local_key = f"{UserSystemConfigCache(self.root_px).cache_key}_:namespace"
+        version = config_local_cache.get(local_key)
+        if version is None:
+            version = CacheNamespace(f'config_{self.root_px}').get_version()
+            config_local_cache.set(local_key, version)
+        return version
+
+    def get_cache_key(self, key, version=None):
+        """
+        :return: (进程内缓存 key, Redis 缓存 key)，Redis 缓存 key 拼接了命名空间代数
+        """
+        cache_key = self.cache(f'{self.px}_{key}').cache_key
+        if version is None:
+            version = self.get_namespace_version()
+        return cache_key, CacheNamespace.make_version_key(cache_key, version)
+
     def invalid_config_cache(self, key='*'):
-        UserSystemConfigCache(f'{self.px}_{key}').del_many()
+        """key 包含通配符时，递增命名空间代数失效所有配置缓存，不再扫描 Redis"""
+        if '*' in key:
+            CacheNamespace(f'config_{self.root_px}').incr_version()
+            config_local_cache.invalid(UserSystemConfigCache(f'{self.root_px}_*').cache_key)
+        else:
+            self.invalid_cache(key)
+
+    def invalid_cache(self, key):
+        local_key, cache_key = self.get_cache_key(key)
+        UserSystemConfigCache.del_many_storage_cache([cache_key])
+        config_local_cache.invalid(local_key)
 
     def get_render_value(self, value: str) -> dict:
         if value:
@@ -90,7 +175,11 @@ class ConfigCacheBase(object):
         return value
 
     def get_value_from_db(self, key):  # 取得数据是激活的数据，如果数据未激活，则取默认数据
-        data = self.serializer(self.model.objects.filter(is_active=True, key=key, **self.filter_kwargs).first()).data
+        return self.serialize_db_data(key, self.model.objects.filter(is_active=True, key=key,
+                                                                     **self.filter_kwargs).first())
+
+    def serialize_db_data(self, key, instance):
+        data = self.serializer(instance).data
         if re.findall('{{.*%s.*}}' % data['key'], json.dumps(data['value'])):  # 防止渲染出现递归
             logger.warning(f"get same render key:{key}. so get default value")
             data['key'] = ''
@@ -101,32 +190,82 @@ class ConfigCacheBase(object):
             default_data = {}
         return default_data
 
+    def build_cache_data(self, key, db_data, default_data=None):
+        d_key = db_data.get('key', '')
+        if d_key != key:
+            data = self.get_default_data(key, default_data)
+            if data is not None:
+                db_data['value'] = data
+                db_data['key'] = key
+                db_data['access'] = True
+        db_data['value'] = self.get_render_value(json.dumps(db_data['value']))
+        return db_data
+
     def get_value(self, key, default_data=None, ignore_access=True):
         data = self.get_data(key, default_data, ignore_access)
         if data:
             return data.get('value')
         return data
 
+    @staticmethod
+    def get_cache_data_many(items):
+        """
+        批量获取缓存数据，先查询进程内缓存，再通过一次 Redis MGET 查询
+        :param items: [(config, key), ...]
+        :return: 与 items 顺序对应的数据列表，未命中缓存的为 None
+        """
+        results = [None] * len(items)
+        missing = {}
+        for index, (config, key) in enumerate(items):
+            local_key = config.cache(f'{config.px}_{key}').cache_key
+            data = config_local_cache.get(local_key)
+            if data is not None and data.get('key', '') == key:
+                results[index] = data
+            else:
+                missing[config.get_cache_key(key)[1]] = (index, local_key)
+        if missing:
+            for cache_key, data in UserSystemConfigCache.get_many_storage_cache(list(missing.keys())).items():
+                index, local_key = missing[cache_key]
+                if data is not None and data.get('key', '') == items[index][1]:
+                    results[index] = data
+                    config_local_cache.set(local_key, data)
+        return results
+
     def get_data(self, key, default_data=None, ignore_access=True):
-        cache = self.cache(f'{self.px}_{key}')
-        cache_data = cache.get_storage_cache()
-        if cache_data is not None and cache_data.get('key', '') == key:
+        # 先读取代数再查询数据库，查询期间命名空间失效时，数据写入旧代数，不会覆盖新数据
+        version = self.get_namespace_version()
+        cache_data = self.get_cache_data_many([(self, key)])[0]
+        if cache_data is not None:
             if ignore_access or cache_data.get('access'):
                 return cache_data
-        db_data = self.get_value_from_db(key)
-        d_key = db_data.get('key', '')
-        if d_key != key:
-            data = self.get_default_data(key, default_data)
-            if data is not None:
-                db_data['value'] = data
-                db_data['key'] = key
-                db_data['access'] = True
-        db_data['value'] = self.get_render_value(json.dumps(db_data['value']))
-        cache.set_storage_cache(db_data, timeout=self.timeout)
+        db_data = self.build_cache_data(key, self.get_value_from_db(key), default_data)
+        local_key, cache_key = self.get_cache_key(key, version)
+        UserSystemConfigCache.set_many_storage_cache({cache_key: db_data}, timeout=self.timeout)
+        # 进程内缓存 key 不包含代数，查询期间命名空间失效时不写入
+        if self.get_namespace_version() == version:
+            config_local_cache.set(local_key, db_data)
         if ignore_access or db_data.get('access'):
             return db_data
         return {}
 
+    def get_many(self, keys, default_data=None, ignore_access=True):
+        """
+        批量获取配置
+        :param keys: 配置 key 列表
+        :param default_data: 默认数据 {key: value}
+        :return: {key: value}
+        """
+        if default_data is None:
+            default_data = {}
+        result = {}
+        for key, data in zip(keys, self.get_cache_data_many([(self, key) for key in keys])):
+            if data is None:
+                data = self.get_data(key, default_data.get(key), ignore_access)
+            elif not ignore_access and not data.get('access'):
+                data = {}
+            result[key] = data.get('value') if data else data
+        return result
+
     def save_db(self, key, value, is_active, description, **kwargs):
         defaults = {'value': value}
         if is_active is not None:
@@ -140,7 +279,7 @@ class ConfigCacheBase(object):
 
     def set_value(self, key, value, is_active=None, description=None, **kwargs):
         obj = self.save_db(key, value, is_active, description, **kwargs)
-        self.cache(f'{self.px}_{key}').del_storage_cache()
+        self.invalid_cache(key)
         return obj
 
     def set_default_value(self, key, **kwargs):
@@ -148,7 +287,7 @@ class ConfigCacheBase(object):
 
     def del_value(self, key, **kwargs):
         self.delete_db(key, **kwargs)
-        self.cache(f'{self.px}_{key}').del_storage_cache()
+        self.invalid_cache(key)
 
     def __getattribute__(self, name):
         if name == 'shape':
@@ -209,6 +348,7 @@ class UserPersonalConfigCache(ConfigCache):
             self.filter_kwargs = {'owner_id': self.user_obj}
         else:
             key = user_obj.pk
+        self.user_key = key
         super().__init__(f'user_{key}', UserPersonalConfig, UserSystemConfigCache, UserConfigSerializer,
                          filter_kwargs=self.filter_kwargs)
 
@@ -228,5 +368,38 @@ class UserPersonalConfigCache(ConfigCache):
     def set_default_value(self, key, **kwargs):
         return super(UserPersonalConfigCache, self).set_default_value(key, **self.filter_kwargs)
 
+    @classmethod
+    def for_users(cls, pks, key, default_data=None, ignore_access=True):
+        """
+        批量获取多个用户的同一配置，未命中缓存的用户配置通过一次数据库查询获取
+        :return: {pk: value}
+        """
+        configs = [cls(pk) for pk in dict.fromkeys(pks)]
+        datas = cls.get_cache_data_many([(config, key) for config in configs])
+        missing = [config for config, data in zip(configs, datas) if data is None]
+        if missing:
+            instances = {}
+            queryset = UserPersonalConfig.objects.filter(is_active=True, key=key,
+                                                         owner_id__in=[config.user_key for config in missing])
+            for instance in queryset:
+                instances.setdefault(str(instance.owner_id), instance)
+            caches = {}
+            for config in missing:
+                db_data = config.serialize_db_data(key, instances.get(str(config.user_key)))
+                caches[config.cache(f'{config.px}_{key}').cache_key] = config.build_cache_data(key, db_data,
+                                                                                               default_data)
+            UserSystemConfigCache.set_many_storage_cache(caches, timeout=missing[0].timeout)
+            for cache_key, db_data in caches.items():
+                config_local_cache.set(cache_key, db_data)
+            datas = [data if data is not None else caches[config.cache(f'{config.px}_{key}').cache_key]
+                     for config, data in zip(configs, datas)]
+
+        result = {}
+        for config, data in zip(configs, datas):
+            if not ignore_access and not data.get('access'):
+                data = {}
+            result[config.user_key] = data.get('value') if data else data
+        return result
+
 
 UserConfig = UserPersonalConfigCache
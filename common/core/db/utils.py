@@ -4,13 +4,14 @@
 # filename : utils
 # author : ly_13
 # date : 12/18/2023
-import ipaddress
 import re
 from contextlib import contextmanager
 
 from django.db import connections, transaction
 from django.db.models import Q
 
+from common.utils.ip import get_ip_networks, get_ip_network_lookups
+
 
 class RelatedManager:
     def __init__(self, instance, field):
@@ -24,30 +25,37 @@ class RelatedManager:
 
     @staticmethod
     def get_ip_in_q(name, val):
+        """网段和ip段转换为前缀匹配和小范围 in 查询，不再展开为主机列表"""
         q = Q()
+        in_values = []
         if isinstance(val, str):
             val = [val]
-        if ['*'] in val:
+        if '*' in val:
             return Q()
         for ip in val:
             if not ip:
                 continue
-            try:
-                if '/' in ip:
-                    network = ipaddress.ip_network(ip)
-                    ips = network.hosts()
-                    q |= Q(**{"{}__in".format(name): ips})
-                elif '-' in ip:
-                    start_ip, end_ip = ip.split('-')
-                    start_ip = ipaddress.ip_address(start_ip)
-                    end_ip = ipaddress.ip_address(end_ip)
-                    q |= Q(**{"{}__range".format(name): (start_ip, end_ip)})
-                elif len(ip.split('.')) == 4:
+            networks = get_ip_networks(ip)
+            if not networks:
+                if '/' in ip or '-' in ip:
+                    continue
+                if len(ip.split('.')) == 4:
                     q |= Q(**{"{}__exact".format(name): ip})
                 else:
                     q |= Q(**{"{}__startswith".format(name): ip})
-            except ValueError:
                 continue
+            for network in networks:
+                lookups = get_ip_network_lookups(network)
+                if not lookups:
+                    # 无法转换为查询条件的 IPv6 网段，不匹配任何数据
+                    q |= Q(pk__isnull=True)
+                for lookup, value in lookups:
+                    if lookup == 'in':
+                        in_values.extend(value)
+                    else:
+                        q |= Q(**{"{}__{}".format(name, lookup): value})
+        if in_values:
+            q |= Q(**{"{}__in".format(name): in_values})
         return q
 
     @classmethod
@@ -8,7 +8,7 @@ from functools import partial
 
 import phonenumbers
 from django.conf import settings
-from django.core.exceptions import ObjectDoesNotExist
+from django.core.exceptions import ObjectDoesNotExist, ValidationError as DjangoValidationError
 from django.db.models import Model
 from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
@@ -94,6 +94,7 @@ class BasePrimaryKeyRelatedField(RelatedField):
         super().__init__(**kwargs)
         self.request: Request = get_current_request()
         self.ignore_field_permission = ignore_field_permission
+        self.prefetched_instances = None
 
     def use_pk_only_optimization(self):
         return False
@@ -190,6 +191,35 @@ class BasePrimaryKeyRelatedField(RelatedField):
                     data["label"] = data.get("pk")
         return data
 
+    def get_pk_value(self, data):
+        if not isinstance(data, dict):
+            return data
+        return data.get("id") or data.get("pk") or data.get(self.attrs[0])
+
+    def prefetch_instances(self, values):
+        """
+        批量导入时，一次性查询所有关联数据，避免逐条数据校验时重复查询
+        :param values: 字段的原始数据列表
+        """
+        self.prefetched_instances = None
+        queryset = self.get_queryset()
+        if queryset is None:
+            return
+        pks = set()
+        for data in values:
+            if isinstance(data, (Model, bool)):
+                continue
+            pk = self.get_pk_value(data)
+            if pk not in (None, '') and isinstance(pk, (str, int)):
+                pks.add(pk)
+        if not pks:
+            return
+        try:
+            self.prefetched_instances = {str(obj.pk): obj for obj in queryset.filter(pk__in=pks)}
+        except (TypeError, ValueError, DjangoValidationError):
+            # 存在格式错误的pk，交给逐条校验处理并返回对应的错误信息
+            self.prefetched_instances = None
+
     def to_internal_value(self, data):
         queryset = self.get_queryset()
         if queryset is None:
@@ -197,10 +227,12 @@ class BasePrimaryKeyRelatedField(RelatedField):
         if isinstance(data, Model):
             return queryset.get(pk=data.pk)
 
-        if not isinstance(data, dict):
-            pk = data
-        else:
-            pk = data.get("id") or data.get("pk") or data.get(self.attrs[0])
+        pk = self.get_pk_value(data)
+
+        if self.prefetched_instances and isinstance(pk, (str, int)) and not isinstance(data, bool):
+            instance = self.prefetched_instances.get(str(pk))
+            if instance is not None:
+                return instance
 
         try:
             if isinstance(data, bool):
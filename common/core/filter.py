@@ -4,6 +4,7 @@
 # filename : filter
 # author : ly_13
 # date : 6/2/2023
+import copy
 import datetime
 import json
 
@@ -19,8 +20,8 @@ from django_filters.fields import MultipleChoiceField
 from rest_framework.exceptions import NotAuthenticated
 from rest_framework.filters import BaseFilterBackend
 
-from common.base.magic import timeit, count_sql_queries
-from common.cache.storage import CommonResourceIDsCache
+from common.base.magic import timeit, count_sql_queries, MagicCacheData
+from common.cache.storage import CommonResourceIDsCache, DataPermissionVersionCache
 from common.core.db.utils import RelatedManager
 from common.utils import get_logger
 from system.models import UserInfo, DataPermission, ModeTypeAbstract, DeptInfo, ModelLabelField
@@ -28,40 +29,33 @@ from system.models import UserInfo, DataPermission, ModeTypeAbstract, DeptInfo,
 logger = get_logger(__name__)
 
 
-def get_filter_q_base(model, permission, user_obj=None, dept_obj=None):
+def get_filter_rules_base(model, permission, dept_obj=None):
+    """
+    编译数据权限规则，仅保留当前模型相关的规则，并预先处理与时间无关的规则值，结果可以被缓存
+    与时间或用户相关的规则，例如 DATE, OWNER 在应用时再计算，见 get_filter_q_by_rules
+    """
     results = []
     for obj in permission:
         rules = []
+        mode_type = obj.mode_type
         if len(obj.rules) == 1:
-            obj.mode_type = ModeTypeAbstract.ModeChoices.OR
+            mode_type = ModeTypeAbstract.ModeChoices.OR
         for rule in obj.rules:
             if rule.get('table') in [model._meta.label_lower, "*"]:
                 if rule.get('type') == ModelLabelField.KeyChoices.ALL:
-                    if obj.mode_type == ModeTypeAbstract.ModeChoices.AND:  # 且模式，存在*，则忽略该规则
+                    if mode_type == ModeTypeAbstract.ModeChoices.AND:  # 且模式，存在*，则忽略该规则
                         continue
                     else:  # 或模式，存在* 则该规则表仅*生效
-                        rules = [rule]
+                        rules = [copy.deepcopy(rule)]
                         break
-                rules.append(rule)
+                rules.append(copy.deepcopy(rule))
         if rules:
-            results.append({'mode': obj.mode_type, 'rules': rules})
-    or_qs = []
-    if not results:
-        return Q(id=0)
+            results.append({'mode': mode_type, 'rules': rules})
+
     for result in results:
         for rule in result.get('rules'):
             f_type = rule.get('type')
-            if f_type == ModelLabelField.KeyChoices.OWNER:
-                if user_obj:
-                    rule['value'] = user_obj.id
-                else:
-                    rule['value'] = '0'
-            elif f_type == ModelLabelField.KeyChoices.OWNER_DEPARTMENT:
-                if user_obj:
-                    rule['value'] = str(user_obj.dept_id)
-                else:
-                    rule['value'] = '0'
-            elif f_type == ModelLabelField.KeyChoices.OWNER_DEPARTMENTS:
+            if f_type == ModelLabelField.KeyChoices.OWNER_DEPARTMENTS:
                 rule['match'] = 'in'
                 if dept_obj:
                     rule['value'] = DeptInfo.recursion_dept_info(dept_obj.pk)
@@ -73,18 +67,6 @@ def get_filter_q_base(model, permission, user_obj=None, dept_obj=None):
                     rule['value'] = DeptInfo.recursion_dept_info(json.loads(rule['value']))
                 else:
                     rule['value'] = []
-            elif f_type == ModelLabelField.KeyChoices.ALL:
-                rule['match'] = 'all'
-                if ModeTypeAbstract.ModeChoices.OR == result.get('mode'):
-                    if (dept_obj and dept_obj.mode_type == ModeTypeAbstract.ModeChoices.OR) or not dept_obj:
-                        logger.info(f"{model._meta.label_lower} : all queryset")
-                        return Q()  # 全部数据直接返回 queryset
-            elif f_type == ModelLabelField.KeyChoices.DATE:
-                val = json.loads(rule['value'])
-                if val < 0:
-                    rule['value'] = timezone.now() - datetime.timedelta(seconds=-val)
-                else:
-                    rule['value'] = timezone.now() + datetime.timedelta(seconds=val)
             elif f_type == ModelLabelField.KeyChoices.DATETIME_RANGE:
                 if isinstance(rule['value'], list) and len(rule['value']) == 2:
                     rule['value'] = [from_current_timezone(parse_datetime(rule['value'][0])),
@@ -104,6 +86,42 @@ def get_filter_q_base(model, permission, user_obj=None, dept_obj=None):
                 rule['value'] = value
             elif f_type == ModelLabelField.KeyChoices.JSON:
                 rule['value'] = json.loads(rule['value'])
+    return results
+
+
+def get_filter_q_by_rules(model, results, user_obj=None, dept_mode_type=None):
+    """
+    根据编译后的数据权限规则生成Q，results 为 get_filter_rules_base 的结果，该方法会修改 results，需传入副本
+    :param dept_mode_type: 用户部门的权限模式，None 表示用户没有部门
+    """
+    or_qs = []
+    if not results:
+        return Q(id=0)
+    for result in results:
+        for rule in result.get('rules'):
+            f_type = rule.get('type')
+            if f_type == ModelLabelField.KeyChoices.OWNER:
+                if user_obj:
+                    rule['value'] = user_obj.id
+                else:
+                    rule['value'] = '0'
+            elif f_type == ModelLabelField.KeyChoices.OWNER_DEPARTMENT:
+                if user_obj:
+                    rule['value'] = str(user_obj.dept_id)
+                else:
+                    rule['value'] = '0'
+            elif f_type == ModelLabelField.KeyChoices.ALL:
+                rule['match'] = 'all'
+                if ModeTypeAbstract.ModeChoices.OR == result.get('mode'):
+                    if dept_mode_type is None or dept_mode_type == ModeTypeAbstract.ModeChoices.OR:
+                        logger.info(f"{model._meta.label_lower} : all queryset")
+                        return Q()  # 全部数据直接返回 queryset
+            elif f_type == ModelLabelField.KeyChoices.DATE:
+                val = json.loads(rule['value'])
+                if val < 0:
+                    rule['value'] = timezone.now() - datetime.timedelta(seconds=-val)
+                else:
+                    rule['value'] = timezone.now() + datetime.timedelta(seconds=val)
             rule.pop('type', None)
 
         #  ((0, '或模式'), (1, '且模式'))
@@ -122,12 +140,12 @@ def get_filter_q_base(model, permission, user_obj=None, dept_obj=None):
                 q |= a
         or_qs.append(q)
     q1 = Q()
-    if not dept_obj:
+    if dept_mode_type is None:
         for q in set(or_qs):
             q1 |= q
     else:
         for q in set(or_qs):
-            if dept_obj.mode_type == ModeTypeAbstract.ModeChoices.AND:
+            if dept_mode_type == ModeTypeAbstract.ModeChoices.AND:
                 if q == Q():
                     continue
                 q1 &= q
@@ -135,12 +153,65 @@ def get_filter_q_base(model, permission, user_obj=None, dept_obj=None):
                 if q == Q():
                     return q
                 q1 |= q
-        if dept_obj.mode_type == ModeTypeAbstract.ModeChoices.AND and q1 == Q():
+        if dept_mode_type == ModeTypeAbstract.ModeChoices.AND and q1 == Q():
             return Q(id=0)
     logger.info(f"{model._meta.label_lower} : {q1}")
     return q1
 
 
+def get_filter_q_base(model, permission, user_obj=None, dept_obj=None):
+    results = get_filter_rules_base(model, permission, dept_obj)
+    return get_filter_q_by_rules(model, results, user_obj, dept_obj.mode_type if dept_obj else None)
+
+
+@MagicCacheData.make_cache(timeout=3600 * 24, single_flight=True, stale_time=60,
+                           key_func=lambda *args: f"{args[0].pk}_{args[0].dept_id}_{args[1]._meta.label_lower}_{args[2]}_{args[3]}")
+def get_user_filter_rules(user_obj: UserInfo, model, menu, version):
+    """
+    获取用户在某个模型某个菜单下的数据权限规则，数据库查询结果按 (用户, 部门, 模型, 菜单, 版本) 缓存
+    数据权限，部门，用户绑定的规则变化后，会更新版本号，旧缓存自动失效
+    :return: {'has_dept': 是否存在部门规则, 'has_user': 是否存在个人规则, 'dept_mode_type': 部门权限模式,
+              'dept_rules': [], 'user_rules': []}
+    """
+    data = {'has_dept': False, 'has_user': False, 'dept_mode_type': None, 'dept_rules': [], 'user_rules': []}
+    dq = Q(menu__isnull=True) | Q(menu__isnull=False, menu__pk=menu)
+    dept_obj = user_obj.dept
+    if dept_obj:
+        data['dept_mode_type'] = dept_obj.mode_type
+        # 存在部门，递归获取部门，类似树结构，部门权限需要且模式，将获取到的所有部门的数据规则通过且操作
+        dept_pks = DeptInfo.recursion_dept_info(dept_obj.pk, is_parent=True)
+        dept_active_pks = list(DeptInfo.objects.filter(pk__in=dept_pks, is_active=True).values_list('pk', flat=True))
+        data['has_dept'] = bool(dept_active_pks)
+        permissions = {pk: [] for pk in dept_active_pks}
+        # 通过中间表一次查询出所有部门的数据权限
+        dept_dq = Q(datapermission__menu__isnull=True) | Q(datapermission__menu__isnull=False,
+                                                           datapermission__menu__pk=menu)
+        queryset = DeptInfo.rules.through.objects.filter(deptinfo__in=dept_active_pks,
+                                                         datapermission__is_active=True).filter(dept_dq)
+        for item in queryset.select_related('datapermission').order_by('-datapermission__created_time'):
+            permissions[item.deptinfo_id].append(item.datapermission)
+        for permission in permissions.values():
+            data['dept_rules'].append(get_filter_rules_base(model, permission, dept_obj))
+    # 获取个人单独授权规则
+    permission = list(DataPermission.objects.filter(is_active=True).filter(userinfo=user_obj).filter(dq))
+    if permission:
+        data['has_user'] = True
+        data['user_rules'] = get_filter_rules_base(model, permission, dept_obj)
+    return data
+
+
+def get_user_filter_rules_cache(user_obj: UserInfo, model):
+    menu = getattr(user_obj, 'menu', None)
+    version = DataPermissionVersionCache().get_version()
+    # 同一个请求中，多个关联字段会多次调用，在用户对象上再做一层缓存
+    local_cache = user_obj.__dict__.setdefault('_filter_rules_cache', {})
+    key = (model._meta.label_lower, menu, version)
+    data = local_cache.get(key)
+    if data is None:
+        data = local_cache[key] = get_user_filter_rules(user_obj, model, menu, version)
+    return copy.deepcopy(data)
+
+
 @timeit
 @count_sql_queries
 def get_filter_queryset(queryset: QuerySet, user_obj: UserInfo):
@@ -153,6 +224,7 @@ def get_filter_queryset(queryset: QuerySet, user_obj: UserInfo):
     b.判断外层规则 【如果规则数量为一个，则模式该规则链为或模式】
         若模式为或模式，并存在全部数据，则直接返回queryset
         若模式为且模式，则 返回queryset.filter(规则)
+    数据库中的规则编译后会被缓存，见 get_user_filter_rules，与时间相关的规则在此处计算
     """
     if not settings.PERMISSION_DATA_ENABLED or queryset is None:
         return queryset
@@ -161,33 +233,26 @@ def get_filter_queryset(queryset: QuerySet, user_obj: UserInfo):
         logger.info(f"superuser: {user_obj.username}. return all queryset {queryset.model._meta.label_lower}")
         return queryset
 
-    dept_obj = user_obj.dept
+    data = get_user_filter_rules_cache(user_obj, queryset.model)
+    dept_mode_type = data.get('dept_mode_type')
     q = Q()
-    dq = Q(menu__isnull=True) | Q(menu__isnull=False, menu__pk=getattr(user_obj, 'menu', None))
-    has_dept = False
-    if dept_obj:
-        # 存在部门，递归获取部门，类似树结构，部门权限需要且模式，将获取到的所有部门的数据规则通过且操作
-        dept_pks = DeptInfo.recursion_dept_info(dept_obj.pk, is_parent=True)
-        for p_dept_obj in DeptInfo.objects.filter(pk__in=dept_pks, is_active=True):
-            # 获取对应的数据权限
-            permission = DataPermission.objects.filter(is_active=True).filter(deptinfo=p_dept_obj).filter(dq)
+    has_dept = data.get('has_dept')
+    if user_obj.dept_id:
+        for results in data.get('dept_rules'):
             # 将数据权限且操作
-            q &= get_filter_q_base(queryset.model, permission, user_obj, dept_obj)
-            has_dept = True
+            q &= get_filter_q_by_rules(queryset.model, results, user_obj, dept_mode_type)
         if not has_dept and q == Q():
             q = Q(id=0)
         if has_dept and q == Q():
             return queryset
-    # 获取个人单独授权规则
-    permission = DataPermission.objects.filter(is_active=True).filter(userinfo=user_obj).filter(dq)
     # 不存在个人单独授权，则返回部门规则授权
-    if not permission.count():
+    if not data.get('has_user'):
         logger.info(f"get filter end. {queryset.model._meta.label} : {q}")
         if has_dept:
             return queryset.filter(q)
         else:
             return queryset.none()  # 没有任何授权，返回 none
-    q1 = get_filter_q_base(queryset.model, permission, user_obj, dept_obj)
+    q1 = get_filter_q_by_rules(queryset.model, data.get('user_rules'), user_obj, dept_mode_type)
     if q1 == Q():
         q = q1
     else:
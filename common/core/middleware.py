@@ -5,22 +5,140 @@
 # author : ly_13
 # date : 6/27/2023
 
+import atexit
+import collections
+import datetime
 import json
+import os
+import threading
 import time
 
 from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
+from django.db import transaction
 from django.utils.deprecation import MiddlewareMixin
 from rest_framework.utils import encoders
 
+from common.core.db.utils import open_db_connection
 from common.utils import get_logger
-from common.utils.request import get_request_user, get_request_ip, get_request_data, get_os, \
-    get_browser, get_verbose_name
+from common.utils.request import get_request_user, get_request_ip, get_request_data, get_user_agent, \
+    get_verbose_name
 from system.models import OperationLog
 
 logger = get_logger(__name__)
 
 
+class OperationLogWriter(object):
+    """
+    操作日志异步批量写入，请求线程只把日志对象放入内存队列，后台线程按批次 bulk_create
+    队列已满时丢弃新日志并计数，避免数据库变慢时拖慢请求或占用过多内存
+    """
+
+    def __init__(self, max_size=10000, batch_size=500, interval=1):
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.interval = interval
+        self.queue = collections.deque()
+        self.lock = threading.Lock()
+        self.event = threading.Event()
+        self.dropped = 0  # 队列已满丢弃的日志数
+        self.failed = 0  # 写入数据库失败的日志数
+        self.written = 0
+        self._reported_dropped = 0
+        self._pid = None
+        self._thread = None
+
+    def ensure_started(self):
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self.lock:
+            if self._pid == os.getpid() and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                # fork 后的子进程丢弃父进程未写入的日志，避免重复写入
+                self.queue.clear()
+                atexit.register(self.flush)
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self.run, name='operation-log-writer', daemon=True)
+            self._thread.start()
+
+    def put(self, log):
+        self.ensure_started()
+        with self.lock:
+            if len(self.queue) >= self.max_size:
+                self.dropped += 1
+                self.event.set()
+                return False
+            self.queue.append(log)
+            if len(self.queue) >= self.batch_size:
+                self.event.set()
+        return True
+
+    def run(self):
+        while True:
+            self.event.wait(self.interval)
+            self.event.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"flush operation log failed. {e}")
+
+    @staticmethod
+    def write_batch(batch):
+        """
+        批量写入失败时逐条重试，只丢弃写入失败的日志，返回写入成功的数量
+        每次写入使用单独的保存点，写入失败时不影响外层事务中的其他写入
+        """
+        try:
+            with transaction.atomic():
+                OperationLog.objects.bulk_create(batch)
+            return len(batch)
+        except Exception as e:
+            logger.warning(f"bulk write {len(batch)} operation logs failed, retry one by one. {e}")
+        written = 0
+        for log in batch:
+            try:
+                with transaction.atomic():
+                    OperationLog.objects.bulk_create([log])
+                written += 1
+            except Exception as e:  # sqlite3 数据库因为锁表可能会导致日志记录失败
+                logger.warning(f"write operation log failed. {e}")
+        return written
+
+    def flush(self):
+        while self.queue:
+            with self.lock:
+                batch = [self.queue.popleft() for _ in range(min(self.batch_size, len(self.queue)))]
+            try:
+                with open_db_connection():
+                    written = self.write_batch(batch)
+            except Exception as e:
+                written = 0
+                logger.warning(f"write operation logs failed. {e}")
+            self.written += written
+            if written < len(batch):
+                self.failed += len(batch) - written
+                logger.warning(f"write {len(batch) - written} operation logs failed, total failed {self.failed}")
+        if self.dropped != self._reported_dropped:
+            logger.warning(f"operation log queue is full, total dropped {self.dropped}")
+            self._reported_dropped = self.dropped
+
+    def stats(self):
+        return {
+            'queued': len(self.queue),
+            'written': self.written,
+            'dropped': self.dropped,
+            'failed': self.failed,
+        }
+
+
+operation_log_writer = OperationLogWriter(
+    max_size=getattr(settings, 'API_LOG_QUEUE_SIZE', 10000),
+    batch_size=getattr(settings, 'API_LOG_BATCH_SIZE', 500),
+    interval=getattr(settings, 'API_LOG_FLUSH_INTERVAL', 1),
+)
+
+
 class ApiLoggingMiddleware(MiddlewareMixin):
 
     def __init__(self, get_response=None):
@@ -28,7 +146,19 @@ class ApiLoggingMiddleware(MiddlewareMixin):
         self.enable = getattr(settings, 'API_LOG_ENABLE', None) or False
         self.methods = getattr(settings, 'API_LOG_METHODS', None) or set()
         self.ignores = getattr(settings, 'API_LOG_IGNORE', None) or {}
-        self.operation_log_id = '__operation_log_id'
+        self.async_write = getattr(settings, 'API_LOG_ASYNC', True)
+        self.operation_log_module = '__operation_log_module'
+
+    def save_operation_log(self, log):
+        # 请求处于事务中时（如测试用例），日志可能关联未提交的数据，后台线程无法写入，直接在当前事务中写入
+        if self.async_write and not transaction.get_connection().in_atomic_block:
+            return operation_log_writer.put(log)
+        try:
+            with transaction.atomic():
+                log.save()
+        except Exception:  # sqlite3 数据库因为锁表可能会导致日志记录失败
+            return False
+        return True
 
     @classmethod
     def __handle_request(cls, request):
@@ -43,9 +173,9 @@ class ApiLoggingMiddleware(MiddlewareMixin):
         if exec_time > 1:
             logger.warning(
                 f"exec time {exec_time} over 1s. {request.method} {request.path} {getattr(request, 'request_data', {})}")
-        # 判断有无log_id属性，使用All记录时，会出现此情况
-        operation_log_id = getattr(request, self.operation_log_id, None)
-        if operation_log_id is None:
+        # 判断有无日志模块属性，使用All记录时，会出现此情况
+        request_module = getattr(request, self.operation_log_module, None)
+        if request_module is None:
             return
 
         body = getattr(request, 'request_data', {})
@@ -55,13 +185,15 @@ class ApiLoggingMiddleware(MiddlewareMixin):
         if not hasattr(response, 'data') or not isinstance(response.data, dict):
             response.data = {}
         try:
-            if not response.data and response.content:
+            if not response.data and not response.streaming and response.content:
                 content = json.loads(response.content.decode().replace('\\', ''))
                 response.data = content if isinstance(content, dict) else {}
         except Exception:
-            return
+            # 视图异常时返回的错误页面不是json，仍然需要记录日志
+            pass
         user = get_request_user(request)
-        request_module = getattr(request, 'request_module', '')
+        if isinstance(user, AnonymousUser):
+            user = None
         if hasattr(response, 'renderer_context'):
             action_doc = getattr(response.renderer_context['view'], request.method.lower()).__doc__
             if action_doc:
@@ -73,27 +205,28 @@ class ApiLoggingMiddleware(MiddlewareMixin):
                 action_doc = request_module
         else:
             action_doc = request_module
+        # 日志在内存中一次组装完成，不再先插入再更新
+        user_agent = get_user_agent(request)
         info = {
+            'created_time': datetime.datetime.fromtimestamp(request_start_time, tz=datetime.timezone.utc),
             'module': action_doc,
-            'creator': user if not isinstance(user, AnonymousUser) else None,
+            'creator': user,
+            'modifier': user,
             'dept_belong_id': getattr(request.user, 'dept_id', None),
             'ipaddress': getattr(request, 'request_ip'),
             'method': request.method,
             'path': request.path,
             'body': json.dumps(body) if isinstance(body, dict) else body,
             'response_code': response.status_code,
-            'system': get_os(request),
-            'browser': get_browser(request),
+            'system': user_agent['os'],
+            'browser': user_agent['browser'],
             'status_code': response.data.get('code'),
             'request_uuid': getattr(request, 'request_uuid', None),
             'exec_time': time.time() - request_start_time,
             'response_result': json.dumps({"code": response.data.get('code'), "data": response.data.get('data'),
                                            "detail": response.data.get('detail')}, cls=encoders.JSONEncoder),
         }
-        try:
-            OperationLog.objects.update_or_create(defaults=info, id=operation_log_id)
-        except Exception:  # sqlite3 数据库因为锁表可能会导致日志记录失败
-            pass
+        self.save_operation_log(OperationLog(**info))
         del info['request_uuid']
         logger.debug(f"request end. {request.method} {request.path} {getattr(request, 'request_data', {})} log:{info}")
         return True
@@ -110,10 +243,7 @@ class ApiLoggingMiddleware(MiddlewareMixin):
                         v = settings.API_MODEL_MAP.get(request.path, v)
                         if not v and model:
                             v = model._meta.label
-                    log = OperationLog(module=v)
-                    log.save()
-                    setattr(request, self.operation_log_id, log.id)
-                    setattr(request, 'request_module', v)
+                    setattr(request, self.operation_log_module, v or '')
 
         return
 
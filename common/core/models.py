@@ -8,6 +8,7 @@ import os
 import time
 import uuid
 
+from django.apps import apps
 from django.conf import settings
 from django.db import models
 from django.utils.translation import gettext_lazy as _
@@ -34,7 +35,9 @@ class DbCharModel(models.Model):
 class AutoCleanFileMixin(object):
     """
     当对象包含文件字段，更新或者删除的时候，自动删除底层文件
+    share_file 为 True 时，多个对象可以共用底层文件，只有没有其他对象引用时才删除
     """
+    share_file = False
 
     def save(self, *args, **kwargs):
         if kwargs.get('force_insert', None):
@@ -58,11 +61,18 @@ class AutoCleanFileMixin(object):
                     file = getattr(self, item[0], None)
                     if file and file.name == item[1]:
                         continue
+                if self.file_is_shared(item[0], item[1]):
+                    continue
                 item[2].name = item[1]
                 item[2].delete(save=False)
         except Exception as e:
             logger.warning(f"remove {self} old file {filelist} failed, {e}")
 
+    def file_is_shared(self, field_name, name):
+        if not self.share_file:
+            return False
+        return self._meta.model.objects.filter(**{field_name: name}).exclude(pk=self.pk).exists()
+
     def __get_filelist(self, obj=None):
         filelist = []
         if obj is None:
@@ -74,6 +84,33 @@ class AutoCleanFileMixin(object):
                     filelist.append((field.name, file_obj.name, file_obj))
         return filelist
 
+    @staticmethod
+    def get_bulk_filelist(instances):
+        """
+        批量删除时收集对象的底层文件，返回 [(模型label, 字段名, 文件名)]，用于后台批量清理
+        """
+        filelist = []
+        for obj in instances:
+            if not isinstance(obj, AutoCleanFileMixin):
+                continue
+            for field in obj._meta.fields:
+                if isinstance(field, (models.ImageField, models.FileField)):
+                    file_obj = getattr(obj, field.name, None)
+                    if file_obj:
+                        filelist.append((obj._meta.label, field.name, file_obj.name))
+        return filelist
+
+    @staticmethod
+    def bulk_delete_files(filelist):
+        for label, field_name, name in filelist:
+            try:
+                model = apps.get_model(label)
+                if getattr(model, 'share_file', False) and model.objects.filter(**{field_name: name}).exists():
+                    continue
+                model._meta.get_field(field_name).storage.delete(name)
+            except Exception as e:
+                logger.warning(f"remove {label} file {name} failed, {e}")
+
 
 class DbBaseModel(models.Model):
     created_time = models.DateTimeField(auto_now_add=True, verbose_name=_("Created time"), null=True, blank=True)
@@ -4,6 +4,7 @@
 # filename : modelset
 # author : ly_13
 # date : 6/2/2023
+import copy
 import itertools
 import json
 import uuid
@@ -12,9 +13,12 @@ from typing import Callable
 
 import math
 from django.conf import settings
-from django.db import transaction
+from django.db import transaction, models, router
+from django.db.models.deletion import Collector
+from django.db.models.signals import pre_save
 from django.forms.widgets import SelectMultiple, DateTimeInput
-from django.utils.translation import gettext_lazy as _
+from django.http import StreamingHttpResponse
+from django.utils.translation import gettext_lazy as _, get_language
 from django_filters.utils import get_model_field
 from django_filters.widgets import DateRangeWidget
 from drf_spectacular.plumbing import build_object_type, build_basic_type, build_array_type
@@ -24,21 +28,25 @@ from rest_framework import mixins
 from rest_framework.decorators import action
 from rest_framework.fields import CharField
 from rest_framework.parsers import MultiPartParser
+from rest_framework.serializers import ModelSerializer
 from rest_framework.utils import encoders
 from rest_framework.viewsets import GenericViewSet
 
-from common.base.magic import cache_response
+from common.base.magic import cache_response, LocalLRUCache
 from common.base.utils import get_choices_dict
 from common.core.config import SysConfig
+from common.core.models import AutoCleanFileMixin
 from common.core.response import ApiResponse
-from common.core.serializers import BasePrimaryKeyRelatedField
+from common.cache.storage import SearchColumnsVersionCache
+from common.core.serializers import BasePrimaryKeyRelatedField, BulkImportListSerializer, BaseModelSerializer
 from common.core.utils import has_self_fields, topological_sort
 from common.drf.renders.csv import CSVFileRenderer
 from common.drf.renders.excel import ExcelFileRenderer
 from common.swagger.utils import get_default_response_schema
-from common.tasks import background_task_view_set_job
+from common.signals import post_bulk_delete
+from common.tasks import background_task_view_set_job, background_delete_files_job
 from common.utils import get_logger
-from system.models.field import ModelLabelField
+from system.models.field import ModelLabelField, ModelSeparationField
 
 logger = get_logger(__name__)
 
@@ -77,7 +85,9 @@ class CacheDetailResponseMixin(object):
 class CacheListResponseMixin(object):
     def get_cache_key(self, view_instance, view_method, request, args, kwargs):
         func_name = f'{view_instance.__class__.__name__}_{view_method.__name__}'
-        return f"{func_name}_{request.user.pk}_{md5(json.dumps(request.query_params, sort_keys=True).encode('utf-8')).hexdigest()}"
+        # 列表缓存以 {func_name}_{user.pk} 为命名空间，invalid_cache 时递增代数，所有查询参数的缓存一起失效
+        key = cache_response.get_namespace(f"{func_name}_{request.user.pk}").make_key(f"{func_name}_{request.user.pk}")
+        return f"{key}_{md5(json.dumps(request.query_params, sort_keys=True).encode('utf-8')).hexdigest()}"
 
     @classmethod
     def invalid_cache(cls, pk, methods=None):
@@ -135,12 +145,19 @@ class RankAction(object):
     @action(methods=['post'], detail=False, url_path='rank')
     def rank(self, request, *args, **kwargs):
         """{cls}排序"""
-        rank = 1
-        for pk in request.data:
-            self.filter_queryset(self.get_queryset()).filter(pk=pk).update(rank=rank)
-            rank += 1
+        # 排序值为提交列表中的位置，重复的pk以最后一次为准
+        ranks = {pk: rank for rank, pk in enumerate(request.data, 1)}
+        if ranks:
+            self.perform_rank(ranks)
         return ApiResponse(detail=_("Sorting saved successfully"))
 
+    def perform_rank(self, ranks):
+        """一条 CASE WHEN 语句更新所有有权限的数据，批量更新不会触发 save 信号"""
+        whens = [models.When(pk=pk, then=models.Value(rank)) for pk, rank in ranks.items()]
+        with transaction.atomic():
+            self.filter_queryset(self.get_queryset()).filter(pk__in=ranks.keys()).update(
+                rank=models.Case(*whens, output_field=models.IntegerField()))
+
 
 class ChoicesAction(object):
     choices_models: []
@@ -269,8 +286,174 @@ class SearchFieldsAction(object):
         return ApiResponse(data=results)
 
 
+search_columns_cache = LocalLRUCache(maxsize=512)
+
+
 class SearchColumnsAction(object):
     filterset_class: Callable
+    get_serializer: Callable
+    get_serializer_class: Callable
+    paginate_queryset: Callable
+    get_paginated_response: Callable
+    search_columns_choices_limit = 100  # 关联字段默认返回的选项数量，更多选项通过 search-columns-choices 分页获取
+
+    @staticmethod
+    def get_search_columns_extensions(model):
+        # 一次查询获取模型所有字段的扩展配置
+        extensions = {}
+        queryset = ModelLabelField.objects.filter(
+            parent__name=model._meta.label_lower,
+            parent__parent=None,
+            field_type=ModelLabelField.FieldChoices.ROLE
+        ).select_related('modellabelfieldextension')
+        for model_field in queryset:
+            if model_field.name in extensions:
+                continue
+            try:
+                extension = model_field.modellabelfieldextension
+            except ModelLabelField.modellabelfieldextension.RelatedObjectDoesNotExist:
+                extension = None
+            extensions[model_field.name] = extension
+        return extensions
+
+    @staticmethod
+    def get_search_columns_separations(model):
+        separation_fields = []
+        for field in ModelSeparationField.objects.filter(model_name=model._meta.label_lower):
+            separation_fields.append({
+                'key': field.name,
+                'label': field.label,
+                'label_visible': field.label_visible,
+                'describe': field.describe,
+                'style': field.style,
+                'color': field.color,
+                'label_color': field.label_color,
+                'field_auth': field.field_auth,
+                'form_grid': float(field.form_grid) if field.form_grid else None,
+                'input_type': 'separator',  # Special type for separation fields
+                'required': False,
+                'read_only': False,
+                'write_only': False,
+                'field_sort_order': field.field_sort_order,
+                'field_read_only': field.field_read_only,
+            })
+        return separation_fields
+
+    @staticmethod
+    def get_search_columns_related_field(value, input_type):
+        if hasattr(value, 'child_relation') and isinstance(value.child_relation, BasePrimaryKeyRelatedField):
+            value = value.child_relation
+        if input_type and input_type.endswith('related_field') and hasattr(value, 'get_choices'):
+            return value
+
+    def get_full_serializer(self):
+        serializer_class = self.get_serializer_class()
+        if issubclass(serializer_class, BaseModelSerializer):
+            return self.get_serializer(ignore_field_permission=True)
+        return self.get_serializer()
+
+    def build_search_columns(self):
+        """
+        生成所有字段的展示信息，不包含关联字段的选项数据，关联字段选项依赖用户数据权限，在请求时获取
+        :return: {'columns': [], 'related_fields': [需要选项数据的字段], 'separations': []}
+        """
+        columns = []
+        related_fields = []
+        metadata_class = self.metadata_class()
+        serializer = self.get_full_serializer()
+        fields = getattr(serializer, 'fields', {})
+        meta = getattr(serializer, 'Meta', {})
+        table_fields = getattr(meta, 'table_fields', [])
+        model = getattr(meta, 'model', None)
+        extensions = self.get_search_columns_extensions(model) if model else {}
+        for key, value in fields.items():
+            info = metadata_class.get_field_info(value)
+            field = get_model_field(model, value.source) if model else None
+            extension = extensions.get(key)
+            if extension:
+                info.update({
+                    'align': extension.align,
+                    'width': extension.width,
+                    'table_visible': extension.table_visible,
+                    'table_sortable': extension.table_sortable,
+                    'table_merge': extension.table_merge,
+                    'form_visible': extension.form_visible,
+                    'form_is_search': extension.form_is_search,
+                    'form_is_filter': extension.form_is_filter,
+                    'form_is_batch_edit': extension.form_is_batch_edit,
+                    'form_placehold': extension.form_placehold,
+                    'form_grid': extension.form_grid,
+                    'form_rules': extension.form_rules,
+                    'field_sort_order': extension.field_sort_order,
+                    'field_read_only': extension.field_read_only,
+                })
+            info['key'] = key
+            if info.get("help_text", None) is None and hasattr(field, 'help_text'):
+                info['help_text'] = field.help_text
+
+            if value.field_name.replace('_', ' ').capitalize() == info['label'] and hasattr(field, 'verbose_name'):
+                info['label'] = field.verbose_name
+
+            if isinstance(value, CharField) and value.style.get('base_template', '') == 'textarea.html':
+                info['input_type'] = 'textarea'
+            else:
+                tp = info['type']
+                if hasattr(value, 'child_relation') and isinstance(value.child_relation, BasePrimaryKeyRelatedField):
+                    info['multiple'] = True
+                    tp = value.child_relation.input_type if value.child_relation.input_type else info['type']
+                if self.get_search_columns_related_field(value, tp):
+                    related_fields.append(key)
+                info['input_type'] = tp
+                if key == 'items':
+                    info['input_type'] = 'm2m_related_field'
+            del info['type']
+            if not table_fields:
+                info['table_show'] = 1
+            if key in table_fields:
+                info['table_show'] = (table_fields.index(key)) + 1
+            columns.append(info)
+        separations = self.get_search_columns_separations(model) if model else []
+        return {'columns': columns, 'related_fields': related_fields, 'separations': separations}
+
+    def get_search_columns_cache(self):
+        """
+        字段展示信息按 (序列化器, 模型, 语言) 缓存在进程内，字段配置变化后版本号递增，缓存自动失效
+        """
+        serializer_class = self.get_serializer_class()
+        model = getattr(getattr(serializer_class, 'Meta', None), 'model', None)
+        cache_key = (f"{serializer_class.__module__}.{serializer_class.__qualname__}",
+                     model._meta.label_lower if model else None, get_language(),
+                     SearchColumnsVersionCache().get_version())
+        data = search_columns_cache.get(cache_key)
+        if data is search_columns_cache.missing:
+            data = self.build_search_columns()
+            search_columns_cache.set(cache_key, data, 3600)
+        return copy.deepcopy(data)
+
+    def get_search_columns(self):
+        data = self.get_search_columns_cache()
+        # 字段权限按当前用户过滤，关联字段选项按当前用户数据权限获取
+        fields = getattr(self.get_serializer(), 'fields', {})
+        results = []
+        for info in data['columns']:
+            key = info['key']
+            if key not in fields:
+                continue
+            if key in data['related_fields']:
+                info['choices'], info['choices_has_more'] = self.get_search_columns_choices_data(fields[key], info)
+            results.append(info)
+        return results, data['separations']
+
+    def get_search_columns_choices_data(self, value, info):
+        related_field = self.get_search_columns_related_field(value, info.get('input_type'))
+        setattr(related_field, 'is_column', True)
+        limit = self.search_columns_choices_limit
+        try:
+            choices = related_field.get_choices(cutoff=limit + 1)
+        except Exception as e:
+            logger.warning(f"get {info['key']} choices failed {e}")
+            return [], False
+        return choices[:limit], len(choices) > limit
 
     @extend_schema(
         responses=get_default_response_schema(
@@ -307,104 +490,42 @@ class SearchColumnsAction(object):
     @action(methods=['get'], detail=False, url_path='search-columns')
     def search_columns(self, request, *args, **kwargs):
         """获取{cls}的展示字段"""
-        logger.info("Starting search_columns method")
-        try:
-            from django.db import connection
-            logger.info(f"Database connection status: {connection.ensure_connection()}")
-        except Exception as e:
-            logger.error(f"Database connection error: {str(e)}")
-        results = []
-
-        def get_input_type(value, info):
-            if hasattr(value, 'child_relation') and isinstance(value.child_relation, BasePrimaryKeyRelatedField):
-                info['multiple'] = True
-                setattr(value.child_relation, 'is_column', True)
-                tp = value.child_relation.input_type if value.child_relation.input_type else info['type']
-                if tp and tp.endswith('related_field'):
-                    setattr(value.child_relation, 'is_column', True)
-                    try:
-                        info['choices'] = value.child_relation.get_choices()
-                    except Exception as e:
-                        info['choices'] = []
-            else:
-                tp = info['type']
-                if tp and tp.endswith('related_field'):
-                    setattr(value, 'is_column', True)
-                    try:
-                        info['choices'] = value.get_choices()
-                    except Exception as e:
-                        info['choices'] = []
-            return tp
-
-        metadata_class = self.metadata_class()
-        serializer = self.get_serializer()
-        fields = getattr(serializer, 'fields', [])
-        logger.info(f"search_columns.fields: {fields}")
-        meta = getattr(serializer, 'Meta', {})
-        table_fields = getattr(meta, 'table_fields', [])
-        for key, value in fields.items():
-            info = metadata_class.get_field_info(value)
-            if hasattr(meta, 'model'):
-                field = get_model_field(meta.model, value.source)
-                # Get model name and field name for ModelLabelField lookup
-                model_name = meta.model._meta.label_lower
-                logger.info(f"model_name: {model_name}")
-                # Look up ModelLabelField and its extension
-                model_field = ModelLabelField.objects.filter(
-                    name=key,
-                    parent__name=model_name,
-                    parent__parent=None,
-                    field_type=ModelLabelField.FieldChoices.ROLE
-                ).first()
-                
-                logger.info(f"Looking up ModelLabelField for {model_name}.{key}")
-                
-                if model_field:
-                    try:
-                        extension = model_field.modellabelfieldextension
-                        # Update info with extension data
-                        info.update({
-                            'align': extension.align,
-                            'width': extension.width,
-                            'table_visible': extension.table_visible,
-                            'table_sortable': extension.table_sortable,
-                            'table_merge': extension.table_merge,
-                            'form_visible': extension.form_visible,
-                            'form_is_search': extension.form_is_search,
-                            'form_is_filter': extension.form_is_filter,
-                            'form_is_batch_edit': extension.form_is_batch_edit,
-                            'form_placehold': extension.form_placehold,
-                            'form_grid': extension.form_grid,
-                            'form_rules': extension.form_rules,
-                            'field_sort_order': extension.field_sort_order,
-                            'field_read_only': extension.field_read_only,
-                        })
-                    except ModelLabelField.modellabelfieldextension.RelatedObjectDoesNotExist:
-                        logger.warning(f"No extension found for ModelLabelField {model_field.pk}")
-                    except Exception as e:
-                        logger.error(f"Error accessing extension for ModelLabelField {model_field.pk}: {str(e)}")
-            else:
-                field = None
-            info['key'] = key
-            if info.get("help_text", None) is None and hasattr(field, 'help_text'):
-                info['help_text'] = field.help_text
-
-            if value.field_name.replace('_', ' ').capitalize() == info['label'] and hasattr(field, 'verbose_name'):
-                info['label'] = field.verbose_name
+        return ApiResponse(data=self.get_search_columns()[0])
 
-            if isinstance(value, CharField) and value.style.get('base_template', '') == 'textarea.html':
-                info['input_type'] = 'textarea'
-            else:
-                info['input_type'] = get_input_type(value, info)
-                if key == 'items':
-                    info['input_type'] = 'm2m_related_field'
-            del info['type']
-            if not table_fields:
-                info['table_show'] = 1
-            if key in table_fields:
-                info['table_show'] = (table_fields.index(key)) + 1
-            results.append(info)
-        return ApiResponse(data=results)
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(name='key', required=True, type=str),
+            OpenApiParameter(name='page', required=False, type=int),
+            OpenApiParameter(name='size', required=False, type=int),
+        ],
+        responses=get_default_response_schema()
+    )
+    @action(methods=['get'], detail=False, url_path='search-columns-choices')
+    def search_columns_choices(self, request, *args, **kwargs):
+        """分页获取{cls}关联字段的选项"""
+        key = request.query_params.get('key')
+        data = self.get_search_columns_cache()
+        fields = getattr(self.get_serializer(), 'fields', {})
+        if key not in data['related_fields'] or key not in fields:
+            return ApiResponse(code=1001, detail=_("Operation failed. Abnormal data"))
+        info = next(info for info in data['columns'] if info['key'] == key)
+        related_field = self.get_search_columns_related_field(fields[key], info.get('input_type'))
+        queryset = related_field.get_queryset()
+        if queryset is None:
+            return ApiResponse(data={'total': 0, 'results': []})
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            setattr(related_field, 'is_column', True)
+            results = related_field.get_choices(cutoff=self.search_columns_choices_limit)
+            return ApiResponse(data={'total': len(results), 'results': results})
+        results = []
+        for item in page:
+            choice = related_field.to_representation(item)
+            if not isinstance(choice, dict):
+                choice = {'pk': choice, 'label': related_field.display_value(item)}
+            choice['value'] = choice.get('pk')
+            results.append(choice)
+        return ApiResponse(data=self.get_paginated_response(results).data)
 
     @extend_schema(
         responses=get_default_response_schema(
@@ -449,45 +570,10 @@ class SearchColumnsAction(object):
     @action(methods=['get'], detail=False, url_path='search-columns-edit')
     def search_columns_edit(self, request, *args, **kwargs):
         """获取{cls}的展示字段（包含分隔字段）"""
-        # First get the base results from search_columns
-        response = self.search_columns(request, *args, **kwargs)
-        results = response.data.get('data', [])
-        
-        # Get the model name
-        serializer = self.get_serializer()
-        meta = getattr(serializer, 'Meta', {})
-        if hasattr(meta, 'model'):
-            model_name = meta.model._meta.label_lower
-            
-            # Query ModelSeparationField for additional fields
-            from system.models.field import ModelSeparationField
-            separation_fields = ModelSeparationField.objects.filter(
-                model_name=model_name
-            )
-            # Add separation fields to results
-            for field in separation_fields:
-                field_info = {
-                    'key': field.name,
-                    'label': field.label,
-                    'label_visible': field.label_visible,
-                    'describe': field.describe,
-                    'style': field.style,
-                    'color': field.color,
-                    'label_color': field.label_color,
-                    'field_auth': field.field_auth,
-                    'form_grid': float(field.form_grid) if field.form_grid else None,
-                    'input_type': 'separator',  # Special type for separation fields
-                    'required': False,
-                    'read_only': False,
-                    'write_only': False,
-                    'field_sort_order': field.field_sort_order,
-                    'field_read_only': field.field_read_only,
-                }
-                results.append(field_info)
-                
-            # Sort results by table_show if available
-            results.sort(key=lambda x: (x.get('field_sort_order', float('inf')) or float('inf')))
-            
+        results, separations = self.get_search_columns()
+        results.extend(separations)
+        # Sort results by table_show if available
+        results.sort(key=lambda x: (x.get('field_sort_order', float('inf')) or float('inf')))
         return ApiResponse(data=results)
 
 
@@ -526,6 +612,57 @@ class BatchDestroyAction(object):
     filter_queryset: Callable
     get_queryset: Callable
     perform_destroy: Callable
+    batch_destroy_bulk = False  # 设置为 True 且满足条件时，通过一次 Collector 批量删除，不再逐条删除
+
+    def can_bulk_destroy(self, queryset):
+        """
+        视图未重写 perform_destroy，模型未重写 delete（AutoCleanFileMixin 除外），才可以批量删除
+        pre_delete/post_delete 信号仍由 Collector 逐条发送
+        """
+        if not self.batch_destroy_bulk:
+            return False
+        if type(self).perform_destroy not in (BaseViewSet.perform_destroy, mixins.DestroyModelMixin.perform_destroy):
+            return False
+        return queryset.model.delete in (models.Model.delete, AutoCleanFileMixin.delete)
+
+    def bulk_destroy_data(self, queryset):
+        model = queryset.model
+        using = router.db_for_write(model)
+        with transaction.atomic(using=using):
+            pks = list(queryset.values_list('pk', flat=True))
+            if not pks:
+                return 0
+            collector = Collector(using=using, origin=queryset)
+            collector.collect(model._base_manager.using(using).filter(pk__in=pks))
+            filelist = self.get_collector_filelist(collector)
+            _deleted, rows_count = collector.delete()
+            post_bulk_delete.send(sender=model, pks=pks, rows_count=rows_count, using=using)
+        if filelist:
+            # 数据删除成功后，后台批量清理文件
+            transaction.on_commit(lambda: self.bulk_delete_files(filelist), using=using)
+        return rows_count.get(model._meta.label, 0)
+
+    @staticmethod
+    def get_collector_filelist(collector):
+        """收集 Collector 将要删除的数据的底层文件，fast_deletes 中的数据不会加载为对象，需要单独查询文件字段"""
+        filelist = AutoCleanFileMixin.get_bulk_filelist(itertools.chain.from_iterable(collector.data.values()))
+        for queryset in collector.fast_deletes:
+            model = getattr(queryset, 'model', None)
+            if model is None or not issubclass(model, AutoCleanFileMixin):
+                continue
+            fields = [field.name for field in model._meta.fields if
+                      isinstance(field, (models.ImageField, models.FileField))]
+            if fields:
+                filelist.extend(AutoCleanFileMixin.get_bulk_filelist(queryset.only('pk', *fields)))
+        return filelist
+
+    @staticmethod
+    def bulk_delete_files(filelist):
+        try:
+            background_delete_files_job.apply_async(args=(filelist,))
+        except Exception as e:
+            logger.warning(f"send delete files task failed, delete files now. {e}")
+            AutoCleanFileMixin.bulk_delete_files(filelist)
 
     @extend_schema(
         request=OpenApiRequest(build_array_type(build_basic_type(OpenApiTypes.STR))),
@@ -539,9 +676,18 @@ class BatchDestroyAction(object):
         # if response:
         #     return response
 
+        queryset = self.filter_queryset(self.get_queryset()).filter(pk__in=request.data)
+        if self.can_bulk_destroy(queryset):
+            try:
+                count = self.bulk_destroy_data(queryset)
+                return ApiResponse(detail=_("Operation successful. Batch deleted {} data").format(count))
+            except Exception as e:
+                # 存在受保护的关联数据等情况，退回逐条删除，跳过无法删除的数据
+                logger.warning(f"bulk destroy {queryset.model} failed, fallback to destroy one by one. {e}")
+
         # queryset  delete() 方法进行批量删除，并不调用模型上的任何 delete() 方法,需要通过循环对象进行删除
         count = 0
-        for instance in self.filter_queryset(self.get_queryset()).filter(pk__in=request.data):
+        for instance in queryset:
             try:
                 deleted, _rows_count = self.perform_destroy(instance)
                 if deleted:
@@ -593,6 +739,42 @@ class UpdateAction(mixins.UpdateModelMixin):
 
 
 class OnlyExportDataAction(ListAction):
+    filter_queryset: Callable
+    get_queryset: Callable
+    get_serializer: Callable
+    export_data_streaming = True  # 流式导出数据，分批查询和序列化，避免一次性加载全部数据
+    export_data_chunk_size = 1000  # 流式导出时，每批次查询和序列化的数据条数
+    export_data_renderers = {'xlsx': ExcelFileRenderer, 'csv': CSVFileRenderer}
+
+    def can_streaming_export(self, request):
+        # 导入模板和压缩包导出需要完整的数据，使用原有方式导出
+        return (self.export_data_streaming and self.format_kwarg in self.export_data_renderers
+                and request.query_params.get('template', 'export') == 'export'
+                and not getattr(self, 'export_as_zip', False))
+
+    def get_export_data_chunks(self, queryset, serializer):
+        chunk = []
+        for instance in queryset.iterator(chunk_size=self.export_data_chunk_size):
+            chunk.append(serializer.to_representation(instance))
+            if len(chunk) >= self.export_data_chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def streaming_export_data(self, request):
+        # 查询集和序列化器需在当前请求内创建，保证数据权限和字段权限生效
+        queryset = self.filter_queryset(self.get_queryset())[:settings.EXPORT_MAX_LIMIT]
+        serializer = self.get_serializer()
+        renderer = self.export_data_renderers[self.format_kwarg]()
+        renderer.serializer = serializer
+        response = StreamingHttpResponse(
+            renderer.stream_render(serializer, self.get_export_data_chunks(queryset, serializer)),
+            content_type=renderer.media_type
+        )
+        renderer.set_response_disposition(response)
+        return response
+
     @extend_schema(
         parameters=[
             OpenApiParameter(name='type', required=True, enum=['xlsx', 'csv']),
@@ -606,6 +788,8 @@ class OnlyExportDataAction(ListAction):
         """导出{cls}数据"""
         self.format_kwarg = request.query_params.get('type', 'xlsx')
         request.no_cache = True  # 防止自定义缓存数据
+        if self.can_streaming_export(request):
+            return self.streaming_export_data(request)
         self.renderer_classes = [ExcelFileRenderer, CSVFileRenderer]
         request.accepted_renderer = None
         data = self.list(request, *args, **kwargs)
@@ -616,6 +800,109 @@ class ImportExportDataAction(CreateAction, UpdateAction, OnlyExportDataAction):
     filter_queryset: Callable
     get_queryset: Callable
     get_serializer: Callable
+    get_serializer_context: Callable
+    perform_create: Callable
+    perform_update: Callable
+    import_data_batch_size = 500  # 导入数据时，每批次校验和写入的数据条数
+    import_data_bulk_write = False  # 设置为 True 时，满足条件使用 bulk_create/bulk_update 批量写入数据
+
+    def get_import_data_chunks(self, datas, self_field=None):
+        """
+        按批次切分导入数据，存在自关联字段时，若数据依赖当前批次中的数据，则切分到下一批次，保证依赖数据先写入
+        """
+        chunk, pks = [], set()
+        for data in datas:
+            parent = data.get(self_field) if self_field and isinstance(data, dict) else None
+            if isinstance(parent, dict):
+                parent = parent.get('pk')
+            if len(chunk) >= self.import_data_batch_size or (parent is not None and str(parent) in pks):
+                yield chunk
+                chunk, pks = [], set()
+            chunk.append(data)
+            if self_field and isinstance(data, dict):
+                pks.add(str(data.get('pk')))
+        if chunk:
+            yield chunk
+
+    def can_bulk_import(self, act, serializer):
+        """
+        视图开启 import_data_bulk_write，视图和序列化器未重写保存方法，模型未重写 save，才可以使用批量写入
+        批量写入不会发送 post_save 信号，需由视图确认模型没有依赖 post_save 的逻辑
+        """
+        if not self.import_data_bulk_write:
+            return False
+        model = serializer.child.Meta.model
+        if act == 'create':
+            methods = [(type(self).perform_create, mixins.CreateModelMixin.perform_create),
+                       (type(serializer.child).create, ModelSerializer.create)]
+        else:
+            methods = [(type(self).perform_update, mixins.UpdateModelMixin.perform_update),
+                       (type(serializer.child).update, ModelSerializer.update)]
+        if any(method is not default for method, default in methods):
+            return False
+        if model.save is not models.Model.save or model._meta.parents:
+            return False
+        # 仅包含普通字段和外键字段，多对多等字段仍需逐条保存
+        fields = {field.name for field in model._meta.concrete_fields if not field.primary_key}
+        return all(set(attrs) <= fields for attrs in serializer.validated_data)
+
+    def bulk_import_data(self, act, serializer):
+        model = serializer.child.Meta.model
+        using = router.db_for_write(model)
+        objs = []
+        update_fields = set()
+        for instance, attrs in zip(serializer.validated_instances, serializer.validated_data):
+            if act == 'create':
+                instance = model(**attrs)
+            else:
+                for attr, value in attrs.items():
+                    setattr(instance, attr, value)
+                update_fields.update(attrs)
+            # bulk_create/bulk_update 不会发送 pre_save 信号，手动发送，用于设置创建者，修改者等信息
+            pre_save.send(sender=model, instance=instance, raw=False, using=using, update_fields=None)
+            objs.append(instance)
+
+        if act == 'create':
+            model._default_manager.bulk_create(objs, batch_size=self.import_data_batch_size)
+        else:
+            # bulk_update 不会自动更新 auto_now 字段
+            for field in model._meta.concrete_fields:
+                if getattr(field, 'auto_now', False):
+                    for obj in objs:
+                        field.pre_save(obj, False)
+                    update_fields.add(field.name)
+                elif field.name == 'modifier':
+                    update_fields.add(field.name)
+            model._default_manager.bulk_update(objs, update_fields, batch_size=self.import_data_batch_size)
+        return len(objs)
+
+    def import_data_chunk(self, act, datas, ignore_error):
+        partial = act == 'update'
+        serializer = BulkImportListSerializer(child=self.get_serializer(partial=partial), data=datas, partial=partial,
+                                              ignore_error=ignore_error, context=self.get_serializer_context())
+        if act == 'update':
+            # 一次性查询本批次所有需要更新的数据
+            queryset = self.filter_queryset(self.get_queryset())
+            keys = {serializer.get_instance_key(data) for data in datas}
+            keys.discard(None)
+            serializer.instance = {str(obj.pk): obj for obj in queryset.filter(pk__in=keys)}
+            serializer.initial_data = [data for data in datas if serializer.get_instance_key(data) in serializer.instance]
+
+        if not serializer.initial_data:
+            return 0
+        serializer.is_valid(raise_exception=not ignore_error)
+        if not serializer.validated_data:
+            return 0
+
+        if self.can_bulk_import(act, serializer):
+            return self.bulk_import_data(act, serializer)
+
+        for child in serializer.iter_child_serializers():
+            if act == 'create':
+                self.perform_create(child)
+            else:
+                self.perform_update(child)
+        return len(serializer.validated_data)
 
     @extend_schema(
         parameters=[
@@ -634,17 +921,17 @@ class ImportExportDataAction(CreateAction, UpdateAction, OnlyExportDataAction):
         """导入{cls}数据"""
 
         task = kwargs.get("task", request.query_params.get('task', 'true').lower() in ['true', '1', 'yes'])  # 默认为任务异步导入
+        self_field = has_self_fields(self.queryset.model)
         if task:
             # 如果包含自关联数据，则对数据进行排序，将依赖数据先导入，并且取消批量导入任务
             datas = request.data
             if isinstance(datas, dict):
                 datas = [datas]
-            self_field = has_self_fields(self.queryset.model)
             if self_field:
                 batch_length = 99999999
                 datas = topological_sort(datas, parent=self_field)
             else:
-                batch_length = 100
+                batch_length = self.import_data_batch_size
             response = run_view_by_celery_task(self, request, kwargs, datas, batch_length)
             if response:
                 return response
@@ -653,26 +940,9 @@ class ImportExportDataAction(CreateAction, UpdateAction, OnlyExportDataAction):
         ignore_error = request.query_params.get('ignore_error', 'false') == 'true'
         if act and request.data:
             count = 0
-            if act == 'create':
-                for data in request.data:
-                    serializer = self.get_serializer(data=data)
-                    serializer.is_valid(raise_exception=not ignore_error)
-                    if serializer.errors and ignore_error:
-                        continue
-                    self.perform_create(serializer)
-                    count += 1
-            elif act == 'update':
-                queryset = self.filter_queryset(self.get_queryset())
-                for data in request.data:
-                    instance = queryset.filter(pk=data.get('pk')).first()
-                    if not instance:
-                        continue
-                    serializer = self.get_serializer(instance, data=data, partial=True)
-                    serializer.is_valid(raise_exception=not ignore_error)
-                    if serializer.errors and ignore_error:
-                        continue
-                    self.perform_update(serializer)
-                    count += 1
+            if act in ['create', 'update']:
+                for datas in self.get_import_data_chunks(request.data, self_field):
+                    count += self.import_data_chunk(act, datas, ignore_error)
             return ApiResponse(detail=_("Operation successful. Import {} data").format(count))
         return ApiResponse(detail=_("Operation failed. Abnormal data"), code=1001)
 
@@ -7,13 +7,47 @@
 # -*- coding: utf-8 -*-
 
 
+import base64
+import datetime
+import json
 from collections import OrderedDict
 
+from django.db import connections
+from django.db.models import Q
+from django.utils.translation import gettext_lazy as _
 from drf_spectacular.plumbing import build_object_type, build_basic_type
 from drf_spectacular.types import OpenApiTypes
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
 
+from common.utils import get_logger
+
+logger = get_logger(__name__)
+
+
+def get_estimated_count(queryset):
+    """从数据库统计信息中获取表的估算行数，不支持的数据库返回 None"""
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    if connection.vendor == 'postgresql':
+        sql, params = "SELECT reltuples FROM pg_class WHERE oid = to_regclass(%s)", [table]
+    elif connection.vendor == 'mysql':
+        sql = "SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s"
+        params = [table]
+    else:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            row = cursor.fetchone()
+    except Exception as e:
+        logger.warning(f"get {table} estimated count failed {e}")
+        return None
+    # postgresql 未 analyze 的表 reltuples 为 -1
+    if row and row[0] is not None and row[0] >= 0:
+        return int(row[0])
+
 
 class PageNumber(PageNumberPagination):
     page_size = 20  # 每页显示多少条
@@ -54,3 +88,119 @@ class DynamicPageNumber(object):
         instance.max_page_size = self.max_page_size
         instance.page_size = self.page_size
         return instance
+
+
+class CursorPageNumber(PageNumber):
+    """
+    键集分页，请求参数中存在 cursor 时，按 (created_time, pk) 排序并通过游标定位下一页，不再使用 OFFSET
+    首页传入空的 cursor，返回数据中的 cursor 为下一页的游标，为 null 时表示没有下一页
+    没有过滤条件并且数据量较大时，总数使用数据库统计信息估算，total=0 时不统计总数
+    不传 cursor，或者排序字段不是 created_time 时，和 PageNumber 一致
+    """
+    cursor_query_param = 'cursor'
+    total_query_param = 'total'
+    cursor_field = 'created_time'
+    estimate_count_threshold = 100000  # 估算行数大于该值时，使用估算值作为总数
+    invalid_cursor_message = _('Invalid cursor')
+
+    cursor_mode = False
+    total = None
+    next_cursor = None
+
+    def get_cursor_reverse(self, queryset):
+        """根据查询排序判断能否使用键集分页，返回是否为倒序，不能使用时返回 None"""
+        ordering = queryset.query.order_by
+        if not ordering and queryset.query.default_ordering:
+            ordering = queryset.model._meta.ordering
+        ordering = list(ordering) or [f'-{self.cursor_field}']
+        first = ordering[0]
+        if not isinstance(first, str) or first.lstrip('-') != self.cursor_field:
+            return None
+        # 只允许主键作为第二排序字段
+        for item in ordering[1:]:
+            if not isinstance(item, str) or item.lstrip('-') not in ['pk', queryset.model._meta.pk.name]:
+                return None
+        return first.startswith('-')
+
+    def encode_cursor(self, obj):
+        value = getattr(obj, self.cursor_field)
+        data = json.dumps([value.isoformat(), str(obj.pk)])
+        return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii')
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None
+        try:
+            value, pk = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+            return datetime.datetime.fromisoformat(value), pk
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_total(self, queryset, request):
+        if request.query_params.get(self.total_query_param) in ['0', 'false']:
+            return None
+        if not queryset.query.has_filters():
+            count = get_estimated_count(queryset)
+            if count is not None and count > self.estimate_count_threshold:
+                return count
+        return queryset.count()
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = False
+        if self.cursor_query_param not in request.query_params:
+            return super().paginate_queryset(queryset, request, view)
+        reverse = self.get_cursor_reverse(queryset)
+        if reverse is None:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.cursor_mode = True
+        self.request = request
+        position = self.decode_cursor(request.query_params.get(self.cursor_query_param))
+        page_size = self.get_page_size(request)
+        self.total = self.get_total(queryset, request)
+        queryset = queryset.filter(**{f'{self.cursor_field}__isnull': False})
+        lookup = 'lt' if reverse else 'gt'
+        if position:
+            value, pk = position
+            queryset = queryset.filter(Q(**{f'{self.cursor_field}__{lookup}': value}) | Q(
+                **{self.cursor_field: value, f'pk__{lookup}': pk}))
+        prefix = '-' if reverse else ''
+        # 多查询一条，用于判断是否存在下一页
+        results = list(queryset.order_by(f'{prefix}{self.cursor_field}', f'{prefix}pk')[:page_size + 1])
+        self.next_cursor = None
+        if len(results) > page_size:
+            results = results[:page_size]
+            self.next_cursor = self.encode_cursor(results[-1])
+        return results
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('total', self.total),
+            ('cursor', self.next_cursor),
+            ('results', data)
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties']['data']['properties']['cursor'] = build_basic_type(OpenApiTypes.STR)
+        return response_schema
+
+    def get_schema_operation_parameters(self, view):
+        return super().get_schema_operation_parameters(view) + [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Keyset pagination cursor, empty for the first page',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.total_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Set 0 to skip the total count in keyset pagination',
+                'schema': {'type': 'integer'},
+            },
+        ]
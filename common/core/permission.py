@@ -6,6 +6,7 @@
 # date : 6/6/2023
 import re
 import uuid
+from functools import lru_cache
 
 from django.conf import settings
 from django.db.models import Q
@@ -14,6 +15,7 @@ from rest_framework.exceptions import PermissionDenied, NotAuthenticated
 from rest_framework.permissions import BasePermission
 
 from common.base.magic import MagicCacheData
+from common.core.auth import get_user_role_ids
 from server.utils import get_current_request, set_current_request
 from system.models import Menu, FieldPermission
 
@@ -23,11 +25,12 @@ logger = get_logger(__name__)
 def get_user_menu_queryset(user_obj):
     q = Q()
     has_role = False
-    if user_obj.roles.exists():
-        q |= (Q(userrole__in=user_obj.roles.all()) & Q(userrole__is_active=True))
+    role_ids = get_user_role_ids(user_obj)
+    if role_ids:
+        q |= (Q(userrole__in=role_ids) & Q(userrole__is_active=True))
         has_role = True
-    if user_obj.dept:
-        q |= (Q(userrole__deptinfo=user_obj.dept) & Q(userrole__deptinfo__is_active=True))
+    if user_obj.dept_id:
+        q |= (Q(userrole__deptinfo=user_obj.dept_id) & Q(userrole__deptinfo__is_active=True))
         has_role = True
     if has_role:
         # return get_filter_queryset(Menu.objects.filter(is_active=True).filter(q), user_obj)
@@ -35,16 +38,18 @@ def get_user_menu_queryset(user_obj):
         return Menu.objects.filter(is_active=True).filter(q)
 
 
-@MagicCacheData.make_cache(timeout=10, key_func=lambda *args: f"{args[0].pk}_{args[1]}")
+@MagicCacheData.make_cache(timeout=10, key_func=lambda *args: f"{args[0].pk}_{args[1]}", single_flight=True,
+                           stale_time=60, local_timeout=2)
 def get_user_field_queryset(user_obj, menu):
     q = Q()
     data = {}
     has_q = False
-    if user_obj.roles.count():
-        q |= (Q(role__in=user_obj.roles.all()) & Q(role__is_active=True))
+    role_ids = get_user_role_ids(user_obj)
+    if role_ids:
+        q |= (Q(role__in=role_ids) & Q(role__is_active=True))
         has_q = True
-    if user_obj.dept:
-        q |= (Q(role__deptinfo=user_obj.dept) & Q(role__deptinfo__is_active=True))
+    if user_obj.dept_id:
+        q |= (Q(role__deptinfo=user_obj.dept_id) & Q(role__deptinfo__is_active=True))
         has_q = True
     if has_q:
         # queryset = get_filter_queryset(FieldPermission.objects.filter(q), user_obj).filter(menu=menu)
@@ -59,7 +64,8 @@ def get_user_field_queryset(user_obj, menu):
     return data
 
 
-@MagicCacheData.make_cache(timeout=3600 * 24, key_func=lambda x, y: f"{x.pk}_{y}")
+@MagicCacheData.make_cache(timeout=3600 * 24, key_func=lambda x, y: f"{x.pk}_{y}", single_flight=True,
+                           stale_time=60, local_timeout=2)
 def get_user_permission(user_obj, method):
     """
     Retrieves a user's menu permissions based on their role and request method.
@@ -100,6 +106,79 @@ def get_import_export_permission(permission_data, url):
                 return p_data
 
 
+class PermissionRouteIndex(object):
+    """
+    权限路由索引，将用户的权限路由字典编译一次，避免每次请求都逐条进行正则匹配
+    1.以$结尾的路由，放入hash表中直接查找
+    2.除纯文本以$结尾之外的路由按原有顺序合并为一个正则，一次匹配即可得到第一个命中的路由
+    """
+    META_CHARS = set('.^$*+?{}[]\\|()')
+    GROUP_NAME_RE = re.compile(r'\(\?P<[^>]+>')
+    PARAMS_RE = re.compile(r'/\(\?P<[^>]+>[^)]+\)')
+
+    def __init__(self, permission_data):
+        self.exact_map = {}
+        self.pattern_items = []
+        self.without_params_map = {}
+        for p_path, p_data in permission_data:
+            clean_path = self.PARAMS_RE.sub('', p_path).rstrip('$')
+            self.without_params_map.setdefault(clean_path, p_data)
+            if p_path.endswith('$'):
+                self.exact_map.setdefault(p_path[:-1], p_data)
+                if not self.META_CHARS & set(p_path[:-1]):
+                    continue
+            self.pattern_items.append((p_path, p_data))
+        self.pattern = self.compile_pattern(self.pattern_items)
+
+    @classmethod
+    def compile_pattern(cls, pattern_items):
+        if not pattern_items:
+            return None
+        # 路由中的命名分组会重名，转换为非捕获分组，末尾追加标记分组用于确定命中的路由
+        alternatives = [f"(?:/{cls.GROUP_NAME_RE.sub('(?:', p_path)})(?P<_r{i}>)"
+                        for i, (p_path, _) in enumerate(pattern_items)]
+        try:
+            return re.compile('|'.join(alternatives))
+        except re.error as e:
+            logger.warning(f"compile permission route index failed {e}. fallback to single pattern match")
+
+    def match_pattern(self, url):
+        if self.pattern is not None:
+            match = self.pattern.match(url)
+            if match and match.lastgroup:
+                return self.pattern_items[int(match.lastgroup[2:])][1]
+            return None
+        for p_path, p_data in self.pattern_items:
+            try:
+                if re.match(f"/{p_path}", url):
+                    return p_data
+            except re.error as e:
+                logger.warning(f"permission route {p_path} match failed {e}")
+        return None
+
+    def get_menu_pk(self, url):
+        p_data = self.exact_map.get(url[1:])
+        if not p_data:
+            p_data = self.match_pattern(url)
+        return p_data
+
+    def get_menu_pk_without_params(self, url):
+        url_without_slash = url[1:] if url.startswith('/') else url
+        return self.without_params_map.get(url_without_slash)
+
+
+@lru_cache(maxsize=1024)
+def _get_permission_route_index(permission_items):
+    return PermissionRouteIndex(permission_items)
+
+
+def get_permission_route_index(permission_data):
+    """
+    获取权限路由索引，索引根据权限路由内容缓存在进程内，相同权限的用户共用同一个索引，权限变更后内容不同会自动重建
+    """
+    return _get_permission_route_index(tuple((p_path, tuple(p_data)) for p_path, p_data in permission_data.items()))
+
+
 def get_menu_pk(permission_data, url):
     """
     Retrieves menu permission data by matching a URL path against permission patterns.
@@ -107,6 +186,9 @@ def get_menu_pk(permission_data, url):
     This function attempts to find matching permission data in two ways:
     1. First tries an exact match by appending '$' to the URL (excluding leading slash)
     2. If no exact match is found, tries regex matching against all permission paths
+
+    Both lookups go through a compiled :class:`PermissionRouteIndex`, which is built
+    once per distinct permission set and reused across requests.
     
     Args:
         permission_data (dict): Dictionary mapping permission paths to permission data tuples
@@ -122,15 +204,8 @@ def get_menu_pk(permission_data, url):
         (1, 'User')
     """
     # 1.直接get api/system/permission$   /api/system/config/system
-    p_data = permission_data.get(f"{url[1:]}$")
-    logger.info(f"get_menu_pk.url: {url[1:]}$")
-    logger.info(f"get_menu_pk.p_data: {p_data}")
-    if not p_data:
-        for p_path, p_data in permission_data.items():
-            logger.info(f"get_menu_pk.p_path: {p_path}")
-            if re.match(f"/{p_path}", url):
-                return p_data
-    return p_data
+    # 2.未直接命中，则通过编译好的合并正则进行匹配
+    return get_permission_route_index(permission_data).get_menu_pk(url)
 
 
 def get_menu_pk_without_params(permission_data, url):
@@ -146,15 +221,7 @@ def get_menu_pk_without_params(permission_data, url):
         tuple or None: Permission data tuple (menu_pk, model) if a match is found,
                       None if no matching permission is found
     """
-    url_without_slash = url[1:] if url.startswith('/') else url
-    for p_path, p_data in permission_data.items():
-        # Remove URL parameters pattern from permission path
-        clean_path = re.sub(r'/\(\?P<[^>]+>[^)]+\)', '', p_path)
-        # Remove trailing $ if exists
-        clean_path = clean_path.rstrip('$')
-        if clean_path == url_without_slash:
-            return p_data
-    return None
+    return get_permission_route_index(permission_data).get_menu_pk_without_params(url)
 
 
 class IsAuthenticated(BasePermission):
@@ -187,7 +254,8 @@ class IsAuthenticated(BasePermission):
                 logger.info(f"url: {url}")
                 permission_data = get_user_permission(request.user, 'PATCH')
                 logger.info(f"permission_data: {permission_data}")
-                p_data = p_data_new = get_menu_pk_without_params(permission_data, url)
+                route_index = get_permission_route_index(permission_data)
+                p_data = p_data_new = route_index.get_menu_pk_without_params(url)
             else:
                 logger.info(f"match_group: false")
                 permission_data = get_user_permission(request.user, request.method)
@@ -197,14 +265,15 @@ class IsAuthenticated(BasePermission):
                 if match_group:
                     url = match_group.group('url')
                     logger.info(f"url: {url}")
-                p_data = p_data_new = get_menu_pk(permission_data, url)
+                route_index = get_permission_route_index(permission_data)
+                p_data = p_data_new = route_index.get_menu_pk(url)
             logger.info(f"p_data: {p_data}")
             if p_data:
                 # 导入导出功能，若未绑定模型，则使用list, create菜单
                 match_group = re.match("(?P<url>.*)/(export|import)-data$", url)
                 if match_group and p_data[1] is None:
                     url = match_group.group('url')
-                    p_data_new = get_menu_pk(permission_data, url)
+                    p_data_new = route_index.get_menu_pk(url)
                 if not p_data_new:
                     p_data_new = p_data
 
@@ -7,10 +7,15 @@
 from inspect import isfunction
 
 from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
 from django.db.models.fields import NOT_PROVIDED
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import ValidationError
 from rest_framework.fields import empty
+from rest_framework.relations import ManyRelatedField
 from rest_framework.request import Request
-from rest_framework.serializers import ModelSerializer
+from rest_framework.serializers import ModelSerializer, ListSerializer
+from rest_framework.settings import api_settings
 
 from common.core.fields import BasePrimaryKeyRelatedField, LabeledChoiceField
 from server.utils import get_current_request
@@ -86,3 +91,124 @@ class BaseModelSerializer(ModelSerializer):
             field_kwargs.setdefault("default", default)
         return field_class, field_kwargs
 
+
+class BulkImportListSerializer(ListSerializer):
+    """
+    批量导入数据校验，instance 为 {str(pk): obj} 格式，根据数据中的 pk 匹配需要更新的对象
+    校验前批量查询关联字段数据，ignore_error 为 True 时，跳过校验失败的数据
+    """
+
+    def __init__(self, *args, ignore_error=False, **kwargs):
+        self.ignore_error = ignore_error
+        self.validated_instances = []
+        super().__init__(*args, **kwargs)
+
+    def prefetch_related_instances(self, data):
+        for field_name, field in self.child.fields.items():
+            if field.read_only:
+                continue
+            values = [item.get(field_name) for item in data if isinstance(item, dict)]
+            if isinstance(field, BasePrimaryKeyRelatedField):
+                field.prefetch_instances(values)
+            elif isinstance(field, ManyRelatedField) and isinstance(field.child_relation, BasePrimaryKeyRelatedField):
+                field.child_relation.prefetch_instances(
+                    [value for items in values if isinstance(items, list) for value in items])
+
+    def get_instance_key(self, data):
+        pk = data.get('pk') if isinstance(data, dict) else None
+        if pk in (None, ''):
+            return None
+        try:
+            return str(self.child.Meta.model._meta.pk.to_python(pk))
+        except DjangoValidationError:
+            return None
+
+    def get_unique_fields(self):
+        """模型中需要唯一的字段组合"""
+        opts = self.child.Meta.model._meta
+        unique_fields = [(field.name,) for field in opts.concrete_fields if field.unique and not field.primary_key]
+        unique_fields.extend(tuple(fields) for fields in opts.unique_together)
+        unique_fields.extend(tuple(constraint.fields) for constraint in opts.total_unique_constraints)
+        return list(dict.fromkeys(unique_fields))
+
+    def get_unique_value(self, attrs, instance, field_names):
+        """获取数据中唯一字段组合的值，包含空值时不参与唯一校验"""
+        opts = self.child.Meta.model._meta
+        values = []
+        for name in field_names:
+            field = opts.get_field(name)
+            if name in attrs:
+                value = attrs[name]
+                if field.is_relation:
+                    value = getattr(value, 'pk', value)
+            elif instance is not None:
+                value = getattr(instance, field.attname)
+            else:
+                return None
+            if value is None:
+                return None
+            values.append(value)
+        return tuple(values)
+
+    def get_unique_errors(self, attrs, instance, unique_values):
+        """
+        校验本批次数据之间的唯一性，UniqueValidator 只校验数据库中的数据，同一批次中重复的数据写入时才会报错
+        :param unique_values: {字段组合: {值: 对象主键}}，记录本批次已校验通过的数据
+        """
+        pk = instance.pk if instance is not None else None
+        items = []
+        for field_names, values in unique_values.items():
+            value = self.get_unique_value(attrs, instance, field_names)
+            if value is None:
+                continue
+            if value in values and (pk is None or values[value] != pk):
+                if len(field_names) == 1:
+                    return {field_names[0]: [_('This field must be unique.')]}
+                return {api_settings.NON_FIELD_ERRORS_KEY: [
+                    _('The fields {field_names} must make a unique set.').format(field_names=', '.join(field_names))
+                ]}
+            items.append((values, value))
+        for values, value in items:
+            values[value] = pk
+        return {}
+
+    def run_child_validation(self, data):
+        if isinstance(self.instance, dict):
+            self.child.instance = self.instance.get(self.get_instance_key(data))
+        self.child.initial_data = data
+        return super().run_child_validation(data)
+
+    def to_internal_value(self, data):
+        self.prefetch_related_instances(data)
+        self.validated_instances = []
+        ret = []
+        errors = []
+        unique_values = {field_names: {} for field_names in self.get_unique_fields()}
+        for item in data:
+            try:
+                validated = self.run_child_validation(item)
+            except ValidationError as exc:
+                errors.append(exc.detail)
+                continue
+            unique_errors = self.get_unique_errors(validated, self.child.instance, unique_values)
+            if unique_errors:
+                errors.append(unique_errors)
+            else:
+                ret.append(validated)
+                self.validated_instances.append(self.child.instance)
+                errors.append({})
+
+        if any(errors) and not self.ignore_error:
+            raise ValidationError(errors)
+        return ret
+
+    def iter_child_serializers(self):
+        """
+        逐条返回已校验数据对应的 child serializer，用于调用 perform_create/perform_update 保存
+        """
+        for instance, attrs in zip(self.validated_instances, self.validated_data):
+            self.child.instance = instance
+            self.child._validated_data = attrs
+            self.child._errors = {}
+            self.child.__dict__.pop('_data', None)
+            yield self.child
@@ -0,0 +1,106 @@
+import os
+import shutil
+import tempfile
+
+import mock
+from django.core.files.base import ContentFile
+from django.db.models.deletion import Collector
+from django.test import override_settings
+from rest_framework import permissions
+from rest_framework.test import APITestCase, APIRequestFactory, force_authenticate
+
+from common.core.modelset import BatchDestroyAction
+from common.signals import post_bulk_delete
+from system.models import UserInfo, UserRole, Menu, MenuMeta, FieldPermission, UploadFile
+from system.views.admin.file import UploadFileViewSet
+from system.views.admin.loginlog import LoginLogViewSet
+from system.views.admin.role import RoleViewSet
+
+
+class BulkUploadFileViewSet(UploadFileViewSet):
+    batch_destroy_bulk = True
+
+
+class BulkRoleViewSet(RoleViewSet):
+    batch_destroy_bulk = True
+
+
+class BatchDestroyTests(APITestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.user = UserInfo.objects.create_superuser(username='destroy_admin', password='password123')
+
+    def batch_destroy(self, viewset, pks):
+        request = APIRequestFactory().post('/batch-destroy', [str(pk) for pk in pks], format='json',
+                                           HTTP_USER_AGENT='Mozilla/5.0 (test)')
+        force_authenticate(request, user=self.user)
+        # 只测试删除逻辑，菜单权限由 IsAuthenticated 单独控制
+        with mock.patch.object(viewset, 'permission_classes', [permissions.IsAuthenticated]):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = viewset.as_view({'post': 'batch_destroy'})(request)
+        self.assertEqual(response.data['code'], 1000)
+        return response
+
+    def create_file(self, name, content):
+        obj = UploadFile(filename=name, filepath=ContentFile(content, name=name), mime_type='text/plain',
+                         filesize=len(content), is_upload=True)
+        obj.save(force_insert=True)
+        return obj
+
+    def test_opt_in(self):
+        self.assertFalse(UploadFileViewSet.batch_destroy_bulk)
+        self.assertTrue(LoginLogViewSet.batch_destroy_bulk)
+        self.assertFalse(UploadFileViewSet().can_bulk_destroy(UploadFile.objects.all()))
+        self.assertTrue(BulkUploadFileViewSet().can_bulk_destroy(UploadFile.objects.all()))
+
+    def test_file_cleanup(self):
+        files = [self.create_file('a.txt', b'file a'), self.create_file('b.txt', b'file b')]
+        paths = [obj.filepath.path for obj in files]
+        self.assertTrue(all(os.path.exists(path) for path in paths))
+        # 没有 celery 时直接删除文件
+        with mock.patch('common.core.modelset.background_delete_files_job.apply_async', side_effect=Exception):
+            with mock.patch.object(BulkUploadFileViewSet, 'get_collector_filelist',
+                                   wraps=BulkUploadFileViewSet.get_collector_filelist) as get_filelist:
+                self.batch_destroy(BulkUploadFileViewSet, [obj.pk for obj in files])
+        get_filelist.assert_called_once()
+        self.assertFalse(UploadFile.objects.filter(pk__in=[obj.pk for obj in files]).exists())
+        self.assertFalse(any(os.path.exists(path) for path in paths))
+
+    def test_fast_delete_filelist(self):
+        obj = self.create_file('a.txt', b'file a')
+        collector = Collector(using='default', origin=None)
+        # 没有删除信号和关联数据的模型，Collector 不加载对象，直接通过 queryset 删除
+        collector.fast_deletes.append(UploadFile.objects.filter(pk=obj.pk))
+        collector.fast_deletes.append(UserRole.objects.all())
+        self.assertEqual(BatchDestroyAction.get_collector_filelist(collector),
+                         [('system.UploadFile', 'filepath', obj.filepath.name)])
+
+    def test_cascade_and_signal(self):
+        meta = MenuMeta.objects.create(title='destroy')
+        menu = Menu.objects.create(name='destroy', path='/destroy', menu_type=Menu.MenuChoices.MENU, meta=meta)
+        roles = [UserRole.objects.create(name=f'destroy_{i}', code=f'destroy_{i}') for i in range(2)]
+        keep = UserRole.objects.create(name='keep', code='keep')
+        for role in roles + [keep]:
+            role.menu.add(menu)
+            FieldPermission.objects.create(role=role, menu=menu)
+
+        receiver = mock.Mock()
+        post_bulk_delete.connect(receiver, sender=UserRole)
+        self.addCleanup(post_bulk_delete.disconnect, receiver, sender=UserRole)
+        response = self.batch_destroy(BulkRoleViewSet, [role.pk for role in roles])
+
+        self.assertIn('2', str(response.data['detail']))
+        self.assertEqual(list(UserRole.objects.filter(name__startswith='destroy_')), [])
+        self.assertEqual(list(FieldPermission.objects.values_list('role', flat=True)), [keep.pk])
+        self.assertEqual(list(UserRole.menu.through.objects.values_list('userrole', flat=True)), [keep.pk])
+
+        receiver.assert_called_once()
+        kwargs = receiver.call_args.kwargs
+        self.assertEqual(set(kwargs['pks']), {role.pk for role in roles})
+        self.assertEqual(kwargs['rows_count']['system.UserRole'], 2)
+        self.assertEqual(kwargs['rows_count']['system.FieldPermission'], 2)
@@ -0,0 +1,110 @@
+import uuid
+
+import mock
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+
+from common.base.magic import MagicCacheData, MagicCacheResponse
+from common.cache.storage import CacheNamespace
+from common.core.config import ConfigCacheBase
+from system.models import SystemConfig
+
+
+class CacheNamespaceTests(SimpleTestCase):
+
+    def setUp(self):
+        self.name = uuid.uuid4().hex
+
+    def get_namespace(self, timeout=None):
+        namespace = CacheNamespace(self.name, timeout=timeout)
+        self.addCleanup(namespace.del_storage_cache)
+        return namespace
+
+    def test_make_key(self):
+        namespace = self.get_namespace()
+        key = namespace.make_key('data')
+        self.assertEqual(key, 'data_g0')
+        namespace.incr_version()
+        self.assertNotEqual(namespace.make_key('data'), key)
+        # 没有设置过期时间的命名空间，代数永久保存
+        self.assertIsNone(cache.ttl(namespace.cache_key))
+
+    def test_timeout(self):
+        namespace = self.get_namespace(timeout=60)
+        version = namespace.incr_version()
+        self.assertGreater(version, 0)
+        self.assertTrue(0 < cache.ttl(namespace.cache_key) <= 60)
+        self.assertEqual(namespace.incr_version(), version + 1)
+
+    def test_not_reuse_expired_version(self):
+        namespace = self.get_namespace(timeout=60)
+        namespace.incr_version()
+        key = namespace.make_key('data')
+        # 模拟代数过期，旧代数的缓存仍未过期
+        namespace.del_storage_cache()
+        self.assertEqual(namespace.make_key('data'), 'data_g0')
+        namespace.incr_version()
+        self.assertNotIn(namespace.make_key('data'), [key, 'data_g0'])
+
+    def test_magic_cache_data_exact_delete(self):
+        cache_key = f'magic_cache_data_{self.name}'
+        cache.set(cache_key, 1, 60)
+        MagicCacheData.invalid_cache(self.name)
+        self.assertIsNone(cache.get(cache_key))
+        # 精确删除不再创建命名空间代数
+        self.assertIsNone(CacheNamespace(cache_key).get_storage_cache())
+
+    def test_magic_cache_response_namespace(self):
+        namespace = MagicCacheResponse.get_namespace(self.name)
+        self.addCleanup(namespace.del_storage_cache)
+        key = namespace.make_key(self.name)
+        MagicCacheResponse.invalid_cache(self.name)
+        self.assertNotEqual(namespace.make_key(self.name), key)
+        self.assertTrue(0 < cache.ttl(namespace.cache_key) <= MagicCacheResponse.namespace_timeout)
+
+
+class ConfigNamespaceTests(TestCase):
+
+    def setUp(self):
+        self.key = f'TEST_{uuid.uuid4().hex[:8].upper()}'
+        self.config = ConfigCacheBase()
+        SystemConfig.objects.create(key=self.key, value=1)
+        self.addCleanup(self.config.invalid_cache, self.key)
+
+    def update_db(self, value):
+        # 批量更新不触发信号，缓存不会自动失效
+        SystemConfig.objects.filter(key=self.key).update(value=value)
+
+    def test_invalid_all(self):
+        self.assertEqual(self.config.get_value(self.key), 1)
+        cache_key = self.config.get_cache_key(self.key)[1]
+        self.update_db(2)
+        self.assertEqual(self.config.get_value(self.key), 1)
+
+        self.config.invalid_config_cache()
+        self.assertNotEqual(self.config.get_cache_key(self.key)[1], cache_key)
+        self.assertEqual(self.config.get_value(self.key), 2)
+        # 其他实例共用同一个命名空间
+        self.assertEqual(ConfigCacheBase().get_value(self.key), 2)
+
+    def test_invalid_key(self):
+        self.assertEqual(self.config.get_value(self.key), 1)
+        version = self.config.get_namespace_version()
+        self.update_db(2)
+        self.config.invalid_config_cache(self.key)
+        self.assertEqual(self.config.get_namespace_version(), version)
+        self.assertEqual(self.config.get_value(self.key), 2)
+
+    def test_invalid_during_query(self):
+        get_value_from_db = self.config.get_value_from_db
+
+        def query_then_invalid(key):
+            data = get_value_from_db(key)
+            # 查询期间配置被修改，查询结果写入旧代数，不会覆盖新数据
+            self.update_db(2)
+            self.config.invalid_config_cache()
+            return data
+
+        with mock.patch.object(self.config, 'get_value_from_db', side_effect=query_then_invalid):
+            self.assertEqual(self.config.get_value(self.key), 1)
+        self.assertEqual(self.config.get_value(self.key), 2)
@@ -0,0 +1,130 @@
+import json
+
+from django.test import TestCase, override_settings
+
+from common.cache.storage import DataPermissionVersionCache
+from common.core.filter import get_filter_queryset
+from system.models import UserInfo, DeptInfo, DataPermission
+
+
+class DeptTreeIndexTests(TestCase):
+
+    def setUp(self):
+        self.root = DeptInfo.objects.create(name='root', code='root')
+        self.a = DeptInfo.objects.create(name='a', code='a', parent=self.root)
+        self.b = DeptInfo.objects.create(name='b', code='b', parent=self.a)
+        self.c = DeptInfo.objects.create(name='c', code='c', parent=self.root)
+        # 测试数据在事务中创建，提交回调不会执行，需要手动让其他测试加载的索引失效
+        DeptInfo.invalid_tree_index()
+
+    def test_descendants_and_ancestors(self):
+        self.assertEqual(set(DeptInfo.recursion_dept_info(self.root.pk)),
+                         {str(obj.pk) for obj in [self.root, self.a, self.b, self.c]})
+        self.assertEqual(DeptInfo.recursion_dept_info(self.a.pk), [str(self.a.pk), str(self.b.pk)])
+        self.assertEqual(DeptInfo.recursion_dept_info(self.b.pk, is_parent=True),
+                         [str(self.b.pk), str(self.a.pk), str(self.root.pk)])
+        # 支持部门ID列表和前端传入的 {'pk': xx} 格式，结果去重
+        self.assertEqual(DeptInfo.recursion_dept_info([{'pk': str(self.a.pk)}, str(self.b.pk), str(self.c.pk)]),
+                         [str(self.a.pk), str(self.b.pk), str(self.c.pk)])
+
+    def test_reuse_index(self):
+        tree_index = DeptInfo.get_tree_index()
+        with self.assertNumQueries(0):
+            self.assertIs(DeptInfo.get_tree_index(), tree_index)
+            DeptInfo.recursion_dept_info(self.root.pk)
+
+    def test_invalid_after_dept_change(self):
+        DeptInfo.get_tree_index()
+        with self.captureOnCommitCallbacks(execute=True):
+            d = DeptInfo.objects.create(name='d', code='d', parent=self.b)
+        self.assertEqual(DeptInfo.recursion_dept_info(self.a.pk), [str(self.a.pk), str(self.b.pk), str(d.pk)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.c.parent = self.b
+            self.c.save(update_fields=['parent'])
+        self.assertEqual(DeptInfo.recursion_dept_info(self.c.pk, is_parent=True),
+                         [str(self.c.pk), str(self.b.pk), str(self.a.pk), str(self.root.pk)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            d.delete()
+        self.assertNotIn(str(d.pk), DeptInfo.recursion_dept_info(self.root.pk))
+
+
+@override_settings(PERMISSION_DATA_ENABLED=True)
+class DataPermissionFilterTests(TestCase):
+
+    def setUp(self):
+        self.root = DeptInfo.objects.create(name='root', code='root')
+        self.child = DeptInfo.objects.create(name='child', code='child', parent=self.root)
+        self.other = DeptInfo.objects.create(name='other', code='other')
+        self.permission = DataPermission.objects.create(name='own depts', rules=[
+            {"table": "system.deptinfo", "field": "id", "match": "in", "exclude": False, "type": "value.user.dept.ids",
+             "value": ""}
+        ])
+        self.user = UserInfo.objects.create_user(username='dept_user', password='password123', dept=self.child)
+        self.user.rules.add(self.permission)
+        # 测试数据在事务中创建，提交回调不会执行，需要手动让其他测试缓存的规则和部门树失效
+        DataPermissionVersionCache().incr_version()
+        DeptInfo.invalid_tree_index()
+
+    def filter_pks(self, user):
+        # 重新查询用户，避免用户对象上的请求级缓存
+        user = UserInfo.objects.get(pk=user.pk)
+        return set(get_filter_queryset(DeptInfo.objects.all(), user).values_list('pk', flat=True))
+
+    def test_superuser_and_no_rules(self):
+        superuser = UserInfo.objects.create_superuser(username='super_user', password='password123')
+        self.assertEqual(self.filter_pks(superuser), {self.root.pk, self.child.pk, self.other.pk})
+        user = UserInfo.objects.create_user(username='no_rules', password='password123')
+        self.assertEqual(self.filter_pks(user), set())
+
+    def test_cached_rules(self):
+        self.assertEqual(self.filter_pks(self.user), {self.child.pk})
+        user = UserInfo.objects.get(pk=self.user.pk)
+        # 规则已缓存，生成查询条件时不再查询数据库
+        with self.assertNumQueries(0):
+            queryset = get_filter_queryset(DeptInfo.objects.all(), user)
+        self.assertEqual(set(queryset.values_list('pk', flat=True)), {self.child.pk})
+
+    def test_invalid_after_rule_change(self):
+        self.assertEqual(self.filter_pks(self.user), {self.child.pk})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.permission.rules = [
+                {"table": "system.deptinfo", "field": "id", "match": "in", "exclude": False,
+                 "type": "value.table.dept.ids", "value": json.dumps([{'pk': str(self.other.pk)}])}
+            ]
+            self.permission.save(update_fields=['rules'])
+        self.assertEqual(self.filter_pks(self.user), {self.other.pk})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.permission.is_active = False
+            self.permission.save(update_fields=['is_active'])
+        self.assertEqual(self.filter_pks(self.user), set())
+
+    def test_invalid_after_dept_change(self):
+        self.assertEqual(self.filter_pks(self.user), {self.child.pk})
+        # 编译后的规则中保存了下级部门ID，新增下级部门后需要重新编译
+        with self.captureOnCommitCallbacks(execute=True):
+            grandchild = DeptInfo.objects.create(name='grandchild', code='grandchild', parent=self.child)
+        self.assertEqual(self.filter_pks(self.user), {self.child.pk, grandchild.pk})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.dept = self.other
+            self.user.save(update_fields=['dept'])
+        self.assertEqual(self.filter_pks(self.user), {self.other.pk})
+
+    def test_invalid_after_m2m_change(self):
+        self.assertEqual(self.filter_pks(self.user), {self.child.pk})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.rules.remove(self.permission)
+        self.assertEqual(self.filter_pks(self.user), set())
+
+        user = UserInfo.objects.create_user(username='root_user', password='password123', dept=self.root)
+        self.assertEqual(self.filter_pks(user), set())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.root.rules.add(self.permission)
+        self.assertEqual(self.filter_pks(user), {self.root.pk, self.child.pk})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.permission.deptinfo_set.clear()
+        self.assertEqual(self.filter_pks(user), set())
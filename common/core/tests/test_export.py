@@ -0,0 +1,32 @@
+import io
+import warnings
+
+from django.test import SimpleTestCase
+from openpyxl import load_workbook
+from rest_framework import serializers
+
+from common.drf.renders.excel import ExcelFileRenderer
+
+
+class ExportSerializer(serializers.Serializer):
+    pk = serializers.IntegerField(label='ID', required=False)
+    name = serializers.CharField(label='Name', required=False)
+
+
+class ExcelStreamRenderTests(SimpleTestCase):
+
+    def test_stream_render_table_columns(self):
+        chunks = [[{'pk': 1, 'name': 'a'}, {'pk': 2, 'name': 'b'}], [{'pk': 3, 'name': 'c'}]]
+        with warnings.catch_warnings(record=True) as records:
+            warnings.simplefilter('always')
+            content = b''.join(ExcelFileRenderer().stream_render(ExportSerializer(), iter(chunks)))
+        # 只写模式下 openpyxl 总会提示手动设置表格列，只需保证没有缺失列名
+        self.assertFalse([record for record in records if 'headings' in str(record.message)])
+
+        ws = load_workbook(io.BytesIO(content)).active
+        rows = list(ws.iter_rows(values_only=True))
+        self.assertEqual(rows[0], ('ID(pk)', 'Name(name)'))
+        self.assertEqual(rows[1:], [('1', 'a'), ('2', 'b'), ('3', 'c')])
+        table = ws.tables['Table']
+        self.assertEqual(table.ref, 'A1:B4')
+        self.assertEqual([column.name for column in table.tableColumns], ['ID(pk)', 'Name(name)'])
@@ -0,0 +1,77 @@
+import mock
+from rest_framework.test import APITestCase
+
+from system.models import UserInfo, SystemConfig, UserPersonalConfig
+
+
+class ImportDataUniqueTests(APITestCase):
+    url = '/api/system/config/system/import-data'
+
+    def setUp(self):
+        self.client.defaults['HTTP_USER_AGENT'] = 'Mozilla/5.0 (test)'
+        self.user = UserInfo.objects.create_user(username='admin', password='admin123', is_superuser=True)
+        self.client.force_authenticate(user=self.user)
+        self.datas = [
+            {'key': 'IMPORT_TEST', 'value': '"1"', 'is_active': True},
+            {'key': 'IMPORT_TEST', 'value': '"2"', 'is_active': True},
+            {'key': 'IMPORT_TEST_OTHER', 'value': '"3"', 'is_active': True},
+        ]
+
+    def import_data(self, ignore_error):
+        return self.client.post(f'{self.url}?action=create&task=false&ignore_error={ignore_error}',
+                                self.datas, format='json')
+
+    def test_duplicate_in_chunk_ignore_error(self):
+        response = self.import_data('true')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['code'], 1000)
+        self.assertEqual(SystemConfig.objects.get(key='IMPORT_TEST').value, '"1"')
+        self.assertTrue(SystemConfig.objects.filter(key='IMPORT_TEST_OTHER').exists())
+
+    def test_duplicate_in_chunk(self):
+        response = self.import_data('false')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(SystemConfig.objects.filter(key__startswith='IMPORT_TEST').exists())
+
+
+class BulkImportDataTests(APITestCase):
+    url = '/api/system/config/user/import-data'
+
+    def setUp(self):
+        self.client.defaults['HTTP_USER_AGENT'] = 'Mozilla/5.0 (test)'
+        self.user = UserInfo.objects.create_user(username='admin', password='admin123', is_superuser=True)
+        self.owner = UserInfo.objects.create_user(username='owner', password='owner123')
+
+    def import_data(self, user, action, datas):
+        self.client.force_authenticate(user=user)
+        manager = UserPersonalConfig.objects
+        with mock.patch.object(manager, 'bulk_create', wraps=manager.bulk_create) as bulk_create, \
+                mock.patch.object(manager, 'bulk_update', wraps=manager.bulk_update) as bulk_update:
+            response = self.client.post(f'{self.url}?action={action}&task=false&ignore_error=false', datas,
+                                        format='json')
+        self.assertEqual(response.data['code'], 1000)
+        # 用户配置没有 post_save 信号，使用批量写入
+        self.assertTrue((bulk_create if action == 'create' else bulk_update).called)
+        return response
+
+    def test_bulk_create_and_update(self):
+        self.import_data(self.user, 'create', [
+            {'key': 'BULK_A', 'value': '"1"', 'is_active': True, 'owner': {'pk': self.owner.pk}},
+            {'key': 'BULK_B', 'value': '"2"', 'is_active': True, 'owner': {'pk': self.owner.pk}},
+        ])
+        objs = list(UserPersonalConfig.objects.filter(owner=self.owner).order_by('key'))
+        self.assertEqual([obj.key for obj in objs], ['BULK_A', 'BULK_B'])
+        for obj in objs:
+            # 批量写入时手动发送 pre_save 信号，设置创建者和修改者
+            self.assertEqual(obj.creator, self.user)
+            self.assertEqual(obj.modifier, self.user)
+            self.assertIsNotNone(obj.created_time)
+            self.assertIsNotNone(obj.updated_time)
+
+        other = UserInfo.objects.create_user(username='other', password='other123', is_superuser=True)
+        self.import_data(other, 'update', [{'pk': str(objs[0].pk), 'value': '"3"'}])
+        obj = UserPersonalConfig.objects.get(pk=objs[0].pk)
+        self.assertEqual(obj.value, '"3"')
+        self.assertEqual(obj.creator, self.user)
+        self.assertEqual(obj.modifier, other)
+        self.assertGreater(obj.updated_time, objs[0].updated_time)
@@ -0,0 +1,141 @@
+from ipaddress import ip_network
+
+import mock
+from django.db.models import Q
+from django.test import SimpleTestCase, TestCase, override_settings
+from geoip2.errors import AddressNotFoundError
+
+from common.core.db.utils import RelatedManager
+from common.utils.ip import contains_ip, get_ip_network_lookups, get_ip_networks, get_ip_city
+from common.utils.ip import geoip
+from common.utils.ip.utils import IpSet, _get_ip_city
+from system.models import UserLoginLog
+
+
+class IpSetTests(SimpleTestCase):
+
+    def test_contains_ip(self):
+        ip_group = ['192.168.1.0/24', '10.1.1.1-10.1.1.20', '172.16.0.5', '2001:db8:1a:1110::/64',
+                    '2001:db8:2de::e13', 'localhost']
+        for ip in ['192.168.1.1', '192.168.1.255', '10.1.1.1', '10.1.1.20', '172.16.0.5',
+                   '2001:db8:1a:1110::1', '2001:db8:2de::e13', 'localhost']:
+            self.assertTrue(contains_ip(ip, ip_group), ip)
+        for ip in ['192.168.2.1', '10.1.1.21', '10.1.1.0', '172.16.0.6', '2001:db8:1a:1111::1', '2001:db8:2de::e14',
+                   'example.com', 'invalid']:
+            self.assertFalse(contains_ip(ip, ip_group), ip)
+
+    def test_merge_intervals(self):
+        ip_set = IpSet(('10.0.0.0/25', '10.0.0.128/25', '10.0.0.100-10.0.1.10', '10.0.1.11', '10.0.2.0/24'))
+        self.assertEqual(len(ip_set.starts[4]), 2)
+        self.assertIn('10.0.1.11', ip_set)
+        self.assertNotIn('10.0.1.12', ip_set)
+        self.assertIn('10.0.2.255', ip_set)
+        self.assertFalse(ip_set.starts[6])
+
+    def test_reversed_segment(self):
+        self.assertTrue(contains_ip('10.1.1.5', ['10.1.1.20-10.1.1.1']))
+
+    def test_match_all(self):
+        self.assertTrue(contains_ip('8.8.8.8', ['*']))
+        self.assertTrue(contains_ip('2001:db8::1', ['*']))
+
+
+@override_settings(LANGUAGE_CODE='en')
+class IpCityTests(SimpleTestCase):
+
+    def setUp(self):
+        _get_ip_city.cache_clear()
+        self.addCleanup(_get_ip_city.cache_clear)
+        ipip_patch = mock.patch('common.utils.ip.utils.get_ip_city_by_ipip', return_value=None)
+        ipip_patch.start()
+        self.addCleanup(ipip_patch.stop)
+
+    @staticmethod
+    def mock_reader(city=None, side_effect=None):
+        reader = mock.Mock()
+        reader.city.return_value.city.names = {'en': city}
+        reader.city.side_effect = side_effect
+        return mock.patch.object(geoip.utils, 'get_reader', return_value=reader)
+
+    def test_cache_city(self):
+        with self.mock_reader('Mountain View') as get_reader:
+            self.assertEqual(get_ip_city('8.8.8.8'), 'Mountain View')
+            self.assertEqual(get_ip_city('8.8.8.8'), 'Mountain View')
+        self.assertEqual(get_reader.return_value.city.call_count, 1)
+        self.assertEqual(get_ip_city('192.168.1.1'), 'LAN')
+
+    def test_cache_address_not_found(self):
+        with self.mock_reader(side_effect=AddressNotFoundError('not found')) as get_reader:
+            self.assertEqual(get_ip_city('8.8.4.4'), 'Unknown')
+            self.assertEqual(get_ip_city('8.8.4.4'), 'Unknown')
+        self.assertEqual(get_reader.return_value.city.call_count, 1)
+
+    def test_not_cache_reader_error(self):
+        with mock.patch.object(geoip.utils, 'get_reader', side_effect=FileNotFoundError('GeoLite2-City.mmdb')):
+            self.assertEqual(get_ip_city('1.1.1.1'), 'Unknown')
+        # ip 库打开失败的结果不缓存，恢复后重新查询
+        with self.mock_reader('Sydney'):
+            self.assertEqual(get_ip_city('1.1.1.1'), 'Sydney')
+
+
+class IpNetworkLookupTests(SimpleTestCase):
+
+    def test_small_network(self):
+        lookups = get_ip_network_lookups(ip_network('192.168.1.0/30'))
+        self.assertEqual(lookups, [('in', ['192.168.1.0', '192.168.1.1', '192.168.1.2', '192.168.1.3'])])
+
+    def test_octet_aligned_network(self):
+        self.assertEqual(get_ip_network_lookups(ip_network('10.1.0.0/16')), [('startswith', '10.1.')])
+
+    def test_unaligned_network(self):
+        lookups = get_ip_network_lookups(ip_network('10.1.16.0/20'))
+        self.assertEqual(len(lookups), 16)
+        self.assertEqual(lookups[0], ('startswith', '10.1.16.'))
+        self.assertEqual(lookups[-1], ('startswith', '10.1.31.'))
+
+    def test_all_network(self):
+        self.assertEqual(get_ip_network_lookups(ip_network('0.0.0.0/0')), [('contains', '.')])
+        self.assertEqual(get_ip_network_lookups(ip_network('::/0')), [('contains', ':')])
+
+    def test_ipv6_network(self):
+        self.assertEqual(get_ip_network_lookups(ip_network('2001:db8:1a:1110::/64')),
+                         [('startswith', '2001:db8:1a:1110:')])
+        # 前缀包含 0 组时存在压缩写法，无法使用前缀匹配
+        self.assertEqual(get_ip_network_lookups(ip_network('2001:0:1a:1110::/64')), [])
+        self.assertEqual(get_ip_network_lookups(ip_network('2001:db8:1a:1110::/60')), [])
+
+    def test_segment_networks(self):
+        self.assertEqual(get_ip_networks('10.1.1.0-10.1.1.255'), [ip_network('10.1.1.0/24')])
+        self.assertEqual(get_ip_networks('10.1.1.1-10.1.1.2'),
+                         [ip_network('10.1.1.1/32'), ip_network('10.1.1.2/32')])
+        self.assertEqual(get_ip_networks('example.com'), [])
+
+
+class IpInQTests(TestCase):
+
+    def setUp(self):
+        for ip in ['10.1.0.1', '10.1.255.3', '10.2.0.1', '10.1.16.7', '10.1.32.1', '192.168.1.5', '2001:db8:1a:1110::1',
+                   '2001:0:1a:1110::1']:
+            UserLoginLog.objects.create(ipaddress=ip)
+
+    def filter_ips(self, rules):
+        queryset = UserLoginLog.objects.filter(RelatedManager.get_ip_in_q('ipaddress', rules))
+        return set(queryset.values_list('ipaddress', flat=True))
+
+    def test_match_all(self):
+        self.assertEqual(RelatedManager.get_ip_in_q('ipaddress', ['10.1.0.0/16', '*']), Q())
+
+    def test_network(self):
+        self.assertEqual(self.filter_ips(['10.1.0.0/16']), {'10.1.0.1', '10.1.255.3', '10.1.16.7', '10.1.32.1'})
+        self.assertEqual(self.filter_ips('10.1.16.0/20'), {'10.1.16.7'})
+
+    def test_segment_and_host(self):
+        self.assertEqual(self.filter_ips(['192.168.1.1-192.168.1.10', '10.2.0.1']), {'192.168.1.5', '10.2.0.1'})
+        q = RelatedManager.get_ip_in_q('ipaddress', ['192.168.1.1-192.168.1.10', '10.2.0.1'])
+        # 小网段和 ip 合并为一个 in 查询
+        self.assertEqual(len(q.children), 1)
+
+    def test_ipv6_network(self):
+        self.assertEqual(self.filter_ips(['2001:db8:1a:1110::/64']), {'2001:db8:1a:1110::1'})
+        # 无法转换为前缀匹配的网段，不匹配任何数据
+        self.assertEqual(self.filter_ips(['2001:0:1a:1110::/64']), set())
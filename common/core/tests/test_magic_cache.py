@@ -0,0 +1,111 @@
+import threading
+import time
+import uuid
+
+import mock
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from common.base import magic
+from common.base.magic import MagicCacheData
+
+
+class SingleFlightCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        self.key = uuid.uuid4().hex
+        self.cache_key = f'magic_cache_data_compute_{self.key}'
+        self.refresh_key = f'refresh_{self.cache_key}'
+        self.calls = []
+        self.result = 'new'
+        self.addCleanup(cache.delete_many, [self.cache_key, self.refresh_key])
+
+        @MagicCacheData.make_cache(timeout=60, single_flight=True, stale_time=60, key_func=lambda key: key)
+        def compute(key):
+            self.calls.append(key)
+            if isinstance(self.result, Exception):
+                raise self.result
+            return self.result
+
+        self.compute = compute
+
+    def make_stale(self):
+        res = cache.get(self.cache_key)
+        res['c_time'] -= 61
+        cache.set(self.cache_key, res, 60)
+
+    def test_hit(self):
+        self.assertEqual(self.compute(self.key), 'new')
+        self.result = 'other'
+        self.assertEqual(self.compute(self.key), 'new')
+        self.assertEqual(len(self.calls), 1)
+        self.assertIsNone(cache.get(self.refresh_key))
+
+    def test_stale_refresh(self):
+        self.compute(self.key)
+        self.make_stale()
+        self.result = 'refreshed'
+        self.assertEqual(self.compute(self.key), 'refreshed')
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(self.compute(self.key), 'refreshed')
+        self.assertEqual(len(self.calls), 2)
+
+    def test_stale_refreshing_by_other_worker(self):
+        self.compute(self.key)
+        self.make_stale()
+        cache.add(self.refresh_key, 1, 60)
+        self.result = 'refreshed'
+        # 其他进程正在刷新，直接返回旧数据
+        self.assertEqual(self.compute(self.key), 'new')
+        self.assertEqual(len(self.calls), 1)
+
+    def test_release_refresh_key_after_write(self):
+        delete = cache.delete
+
+        def check_delete(key, *args, **kwargs):
+            if key == self.refresh_key:
+                # 释放刷新标识时数据必须已经写入，否则其他进程会再次计算
+                self.assertEqual(cache.get(self.cache_key)['data'], 'new')
+            return delete(key, *args, **kwargs)
+
+        with mock.patch.object(magic.cache, 'delete', side_effect=check_delete) as delete_mock:
+            self.assertEqual(self.compute(self.key), 'new')
+        delete_mock.assert_called_once_with(self.refresh_key)
+
+    def test_cold_miss_wait_other_worker(self):
+        cache.add(self.refresh_key, 1, 60)
+
+        def other_worker():
+            time.sleep(0.2)
+            cache.set(self.cache_key, {'c_time': time.time(), 'data': 'other', 'status': 'ok'}, 60)
+            cache.delete(self.refresh_key)
+
+        thread = threading.Thread(target=other_worker)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.assertEqual(self.compute(self.key), 'other')
+        self.assertEqual(self.calls, [])
+
+    def test_cold_miss_other_worker_failed(self):
+        cache.add(self.refresh_key, 1, 60)
+        threading.Timer(0.2, cache.delete, args=(self.refresh_key,)).start()
+        with mock.patch.object(magic.logger, 'warning') as warning:
+            self.assertEqual(self.compute(self.key), 'new')
+        # 计算的进程退出后不再等待，也不是等待超时
+        warning.assert_not_called()
+        self.assertEqual(len(self.calls), 1)
+
+    def test_exception(self):
+        self.result = ValueError('failed')
+        with self.assertRaises(ValueError):
+            self.compute(self.key)
+        self.assertIsNone(cache.get(self.refresh_key))
+        self.assertIsNone(cache.get(self.cache_key))
+
+        self.result = 'new'
+        self.assertEqual(self.compute(self.key), 'new')
+        self.make_stale()
+        # 刷新失败时返回旧数据
+        self.result = ValueError('failed')
+        self.assertEqual(self.compute(self.key), 'new')
+        self.assertIsNone(cache.get(self.refresh_key))
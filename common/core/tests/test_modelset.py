@@ -221,3 +221,14 @@ class SearchColumnsEditTests(APITransactionTestCase, URLPatternsTestCase):
         
         # Check null values are handled properly
         self.assertIsNone(null_section['form_grid'])
+
+    def test_cache_invalidated_on_change(self):
+        """Test cached columns are refreshed after separation fields change"""
+        self.client.get(self.url)
+        self.separation_field1.label = 'Section 1 changed'
+        self.separation_field1.save()
+
+        response = self.client.get(self.url)
+        data = response.json()['data']
+        section1 = next(f for f in data if f['key'] == 'section1')
+        self.assertEqual(section1['label'], 'Section 1 changed')
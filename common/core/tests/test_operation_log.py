@@ -0,0 +1,100 @@
+import contextlib
+import datetime
+
+import mock
+from django.test import TestCase
+from rest_framework.test import APITestCase
+
+from common.core import middleware
+from common.core.middleware import OperationLogWriter
+from system.models import UserInfo, OperationLog
+from system.views.admin.role import RoleViewSet
+
+
+class OperationLogWriterTests(TestCase):
+
+    def setUp(self):
+        self.writer = OperationLogWriter(max_size=3, batch_size=2)
+        # 不启动后台线程，在测试线程中写入；测试用例的事务中不能关闭数据库连接
+        for patcher in [mock.patch.object(self.writer, 'ensure_started'),
+                        mock.patch.object(middleware, 'open_db_connection', side_effect=contextlib.nullcontext)]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.created_time = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+    def make_log(self, path, **kwargs):
+        return OperationLog(path=path, created_time=self.created_time, **kwargs)
+
+    def test_batch_write(self):
+        for i in range(3):
+            self.assertTrue(self.writer.put(self.make_log(f'/batch/{i}')))
+        with mock.patch.object(OperationLog.objects, 'bulk_create', wraps=OperationLog.objects.bulk_create) as bulk:
+            self.writer.flush()
+        self.assertEqual([len(call.args[0]) for call in bulk.call_args_list], [2, 1])
+        self.assertEqual(self.writer.stats(), {'queued': 0, 'written': 3, 'dropped': 0, 'failed': 0})
+        # 创建时间使用日志对象上的请求时间，不是写入时间
+        self.assertEqual(set(OperationLog.objects.filter(path__startswith='/batch/').values_list('created_time',
+                                                                                                 flat=True)),
+                         {self.created_time})
+
+    def test_retry_row_by_row(self):
+        exists = OperationLog.objects.create(path='/exists')
+        batch = [self.make_log('/retry/0'), self.make_log('/retry/1', pk=exists.pk), self.make_log('/retry/2')]
+        for log in batch:
+            self.writer.put(log)
+        self.writer.batch_size = 3
+        self.writer.flush()
+        # 主键冲突的日志被丢弃，同批次的其他日志逐条写入
+        self.assertEqual(list(OperationLog.objects.filter(path__startswith='/retry/').order_by('path').values_list(
+            'path', flat=True)), ['/retry/0', '/retry/2'])
+        self.assertEqual(self.writer.stats(), {'queued': 0, 'written': 2, 'dropped': 0, 'failed': 1})
+
+    def test_connection_failed(self):
+        self.writer.put(self.make_log('/failed'))
+        with mock.patch.object(middleware, 'open_db_connection', side_effect=Exception('connect failed')):
+            self.writer.flush()
+        self.assertFalse(OperationLog.objects.filter(path='/failed').exists())
+        self.assertEqual(self.writer.stats(), {'queued': 0, 'written': 0, 'dropped': 0, 'failed': 1})
+
+    def test_drop_when_full(self):
+        for i in range(3):
+            self.assertTrue(self.writer.put(self.make_log(f'/drop/{i}')))
+        self.assertFalse(self.writer.put(self.make_log('/drop/3')))
+        self.assertEqual(self.writer.stats(), {'queued': 3, 'written': 0, 'dropped': 1, 'failed': 0})
+        with mock.patch.object(middleware.logger, 'warning') as warning:
+            self.writer.flush()
+            self.writer.flush()
+        # 丢弃数量只在变化时报告一次
+        warning.assert_called_once()
+        self.assertIn('dropped 1', warning.call_args.args[0])
+        self.assertEqual(self.writer.stats(), {'queued': 0, 'written': 3, 'dropped': 1, 'failed': 0})
+
+
+class ApiLoggingMiddlewareTests(APITestCase):
+
+    def setUp(self):
+        self.user = UserInfo.objects.create_superuser(username='log_admin', password='password123')
+        self.client.force_authenticate(user=self.user)
+
+    def create_role(self):
+        return self.client.post('/api/system/role', {'name': 'log_role', 'code': 'log_role'}, format='json',
+                                HTTP_USER_AGENT='Mozilla/5.0 (test)')
+
+    def test_request_time(self):
+        with mock.patch.object(middleware, 'time') as mock_time:
+            mock_time.time.return_value = 1000
+            response = self.create_role()
+        log = OperationLog.objects.get(path='/api/system/role')
+        self.assertEqual(log.created_time, datetime.datetime.fromtimestamp(1000, tz=datetime.timezone.utc))
+        self.assertEqual((log.method, log.status_code), ('POST', response.json()['code']))
+        self.assertEqual(log.creator, self.user)
+
+    def test_view_exception(self):
+        self.client.raise_request_exception = False
+        # 未被 drf 处理的异常，返回的错误页面不是json
+        with mock.patch.object(RoleViewSet, 'create', side_effect=ValueError('create failed')), \
+                mock.patch.object(RoleViewSet, 'get_exception_handler', return_value=lambda exc, context: None):
+            response = self.create_role()
+        self.assertEqual(response.status_code, 500)
+        log = OperationLog.objects.get(path='/api/system/role')
+        self.assertEqual((log.method, log.response_code, log.status_code), ('POST', 500, None))
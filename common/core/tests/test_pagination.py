@@ -0,0 +1,68 @@
+import datetime
+
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from common.core.pagination import CursorPageNumber
+from system.models import UserLoginLog
+
+
+class CursorPageNumberTests(TestCase):
+
+    def setUp(self):
+        now = timezone.now().replace(microsecond=0)
+        # 存在相同的 created_time，需要通过 pk 区分先后
+        offsets = [0, 1, 1, 1, 2, 3, 3]
+        for offset in offsets:
+            obj = UserLoginLog.objects.create(ipaddress='127.0.0.1')
+            UserLoginLog.objects.filter(pk=obj.pk).update(created_time=now + datetime.timedelta(seconds=offset))
+
+    @staticmethod
+    def get_request(**params):
+        return Request(APIRequestFactory().get('/', params))
+
+    def paginate(self, queryset, **params):
+        paginator = CursorPageNumber()
+        results = paginator.paginate_queryset(queryset, self.get_request(**params))
+        return paginator, results, paginator.get_paginated_response([obj.pk for obj in results]).data
+
+    def iter_pages(self, queryset, size=2):
+        pks, cursor = [], ''
+        while cursor is not None:
+            _, _, data = self.paginate(queryset, cursor=cursor, size=size)
+            self.assertEqual(data['total'], queryset.count())
+            pks.extend(data['results'])
+            cursor = data['cursor']
+        return pks
+
+    def test_desc_cursor(self):
+        queryset = UserLoginLog.objects.all()
+        expected = list(queryset.order_by('-created_time', '-pk').values_list('pk', flat=True))
+        self.assertEqual(self.iter_pages(queryset.order_by('-created_time')), expected)
+
+    def test_asc_cursor(self):
+        queryset = UserLoginLog.objects.all()
+        expected = list(queryset.order_by('created_time', 'pk').values_list('pk', flat=True))
+        self.assertEqual(self.iter_pages(queryset.order_by('created_time', 'pk')), expected)
+        self.assertEqual(self.iter_pages(queryset.order_by('created_time'), size=3), expected)
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(NotFound):
+            self.paginate(UserLoginLog.objects.order_by('-created_time'), cursor='invalid')
+
+    def test_skip_total(self):
+        _, _, data = self.paginate(UserLoginLog.objects.order_by('-created_time'), cursor='', size=2, total=0)
+        self.assertIsNone(data['total'])
+        self.assertEqual(len(data['results']), 2)
+        self.assertIsNotNone(data['cursor'])
+
+    def test_fallback_page_number(self):
+        queryset = UserLoginLog.objects.order_by('-pk')
+        paginator, results, data = self.paginate(queryset, cursor='', size=2, page=2)
+        self.assertFalse(paginator.cursor_mode)
+        self.assertNotIn('cursor', data)
+        self.assertEqual(data['total'], 7)
+        self.assertEqual(data['results'], list(queryset.values_list('pk', flat=True)[2:4]))
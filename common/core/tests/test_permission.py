@@ -0,0 +1,42 @@
+from django.test import SimpleTestCase
+
+from common.core.permission import get_menu_pk, get_menu_pk_without_params, get_permission_route_index
+
+
+class PermissionRouteIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.permission_data = {
+            'api/system/user$': (1, 'system.userinfo'),
+            'api/system/user/(?P<pk>[^/.]+)$': (2, 'system.userinfo'),
+            'api/system/user/(?P<pk>[^/.]+)/reset-password$': (3, None),
+            'api/system/role/(?P<pk>[^/.]+)$': (4, 'system.userrole'),
+            'api-docs/schema/': (5, None),
+            'api/flower/(?P<path>.*)$': (6, None),
+        }
+
+    def test_exact_match(self):
+        self.assertEqual(get_menu_pk(self.permission_data, '/api/system/user'), (1, 'system.userinfo'))
+
+    def test_pattern_match_keeps_order(self):
+        self.assertEqual(get_menu_pk(self.permission_data, '/api/system/user/12'), (2, 'system.userinfo'))
+        self.assertEqual(get_menu_pk(self.permission_data, '/api/system/user/12/reset-password'), (3, None))
+        self.assertEqual(get_menu_pk(self.permission_data, '/api/system/role/12'), (4, 'system.userrole'))
+        self.assertEqual(get_menu_pk(self.permission_data, '/api-docs/schema/json'), (5, None))
+        self.assertEqual(get_menu_pk(self.permission_data, '/api/flower/tasks/abc'), (6, None))
+
+    def test_no_match(self):
+        self.assertIsNone(get_menu_pk(self.permission_data, '/api/system/user/12/unknown'))
+        self.assertIsNone(get_menu_pk(self.permission_data, '/api/system/dept'))
+        self.assertIsNone(get_menu_pk({}, '/api/system/dept'))
+
+    def test_without_params(self):
+        self.assertEqual(get_menu_pk_without_params(self.permission_data, '/api/system/role'), (4, 'system.userrole'))
+        self.assertEqual(get_menu_pk_without_params(self.permission_data, '/api/system/user'), (1, 'system.userinfo'))
+
+    def test_index_is_shared_for_same_permission(self):
+        index = get_permission_route_index(self.permission_data)
+        self.assertIs(index, get_permission_route_index(dict(self.permission_data)))
+
+    def test_invalid_pattern_fallback(self):
+        permission_data = {'api/system/(?P=pk)$': (1, None), 'api/system/dept$': (2, None)}
+        self.assertEqual(get_menu_pk(permission_data, '/api/system/dept'), (2, None))
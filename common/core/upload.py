@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# project : xadmin-server
+# filename : upload
+# author : ly_13
+# date : 10/18/2026
+import hashlib
+import math
+import os
+import shutil
+import time
+import uuid
+
+from django.conf import settings
+from django.core.files.move import file_move_safe
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+
+from common.cache.storage import UploadPartInfoCache
+from common.utils import get_logger
+
+logger = get_logger(__name__)
+
+
+class Md5UploadHandlerMixin(object):
+    """
+    接收上传数据的同时计算md5，结果保存在上传文件对象的 md5sum 属性中
+    """
+
+    def new_file(self, *args, **kwargs):
+        self.md5 = hashlib.md5()
+        return super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        result = super().receive_data_chunk(raw_data, start)
+        # 返回 None 表示数据由当前处理器接收，否则交给下一个处理器
+        if result is None:
+            self.md5.update(raw_data)
+        return result
+
+    def file_complete(self, file_size):
+        file_obj = super().file_complete(file_size)
+        if file_obj is not None:
+            file_obj.md5sum = self.md5.hexdigest()
+        return file_obj
+
+
+class Md5MemoryFileUploadHandler(Md5UploadHandlerMixin, MemoryFileUploadHandler):
+    pass
+
+
+class Md5TemporaryFileUploadHandler(Md5UploadHandlerMixin, TemporaryFileUploadHandler):
+    pass
+
+
+class ChunkedUpload(object):
+    """
+    分片上传，分片保存在临时目录，上传信息保存在 UploadPartInfoCache 中，支持断点续传
+    合并分片时同时计算md5，合并后的临时文件保存时直接移动，不再重新读取
+    """
+    read_size = 64 * 1024
+
+    def __init__(self, upload_id):
+        self.upload_id = str(upload_id)
+        self.cache = UploadPartInfoCache(self.upload_id)
+        self.part_dir = os.path.join(settings.FILE_UPLOAD_PART_DIR, self.upload_id)
+
+    @classmethod
+    def create(cls, user_pk, filename, filesize, mime_type):
+        obj = cls(uuid.uuid4().hex)
+        chunk_size = settings.FILE_UPLOAD_CHUNK_SIZE
+        info = {
+            'user': user_pk,
+            'filename': filename,
+            'filesize': filesize,
+            'mime_type': mime_type,
+            'chunk_size': chunk_size,
+            'part_count': max(math.ceil(filesize / chunk_size), 1),
+        }
+        os.makedirs(obj.part_dir, exist_ok=True)
+        obj.cache.set_storage_cache(info, settings.FILE_UPLOAD_PART_TIMEOUT)
+        return obj
+
+    def get_info(self, user_pk=None):
+        info = self.cache.get_storage_cache()
+        if info and (user_pk is None or info.get('user') == user_pk) and os.path.isdir(self.part_dir):
+            return info
+
+    def get_part_path(self, index):
+        return os.path.join(self.part_dir, f"{index}.part")
+
+    @staticmethod
+    def get_part_size(info, index):
+        if index == info['part_count'] - 1:
+            return info['filesize'] - info['chunk_size'] * index
+        return info['chunk_size']
+
+    def save_part(self, info, index, file_obj):
+        """保存分片，重复上传的分片直接覆盖"""
+        if not 0 <= index < info['part_count']:
+            raise ValueError(f"invalid part index {index}")
+        if file_obj.size != self.get_part_size(info, index):
+            raise ValueError(f"invalid part size {file_obj.size}")
+        part_path = self.get_part_path(index)
+        tmp_path = f"{part_path}.{uuid.uuid4().hex}"
+        if hasattr(file_obj, 'temporary_file_path'):
+            file_move_safe(file_obj.temporary_file_path(), tmp_path, allow_overwrite=True)
+        else:
+            with open(tmp_path, 'wb') as f:
+                for chunk in file_obj.chunks():
+                    f.write(chunk)
+        os.replace(tmp_path, part_path)
+        self.cache.expire(settings.FILE_UPLOAD_PART_TIMEOUT)
+
+    def get_uploaded_parts(self, info):
+        result = []
+        for index in range(info['part_count']):
+            part_path = self.get_part_path(index)
+            if os.path.isfile(part_path) and os.path.getsize(part_path) == self.get_part_size(info, index):
+                result.append(index)
+        return result
+
+    def merge(self, info):
+        """合并所有分片，返回带有 md5sum 属性的临时上传文件，分片不完整返回 None"""
+        if len(self.get_uploaded_parts(info)) != info['part_count']:
+            return None
+        file_obj = TemporaryUploadedFile(info['filename'], info['mime_type'], info['filesize'], None)
+        md5 = hashlib.md5()
+        for index in range(info['part_count']):
+            with open(self.get_part_path(index), 'rb') as f:
+                while chunk := f.read(self.read_size):
+                    md5.update(chunk)
+                    file_obj.write(chunk)
+        file_obj.flush()
+        file_obj.seek(0)
+        file_obj.md5sum = md5.hexdigest()
+        return file_obj
+
+    def clean(self):
+        self.cache.del_storage_cache()
+        shutil.rmtree(self.part_dir, ignore_errors=True)
+
+    @classmethod
+    def clean_expired(cls):
+        """清理超时未完成的分片上传"""
+        if not os.path.isdir(settings.FILE_UPLOAD_PART_DIR):
+            return 0
+        count = 0
+        expired_time = time.time() - settings.FILE_UPLOAD_PART_TIMEOUT
+        for entry in os.scandir(settings.FILE_UPLOAD_PART_DIR):
+            if entry.is_dir() and entry.stat().st_mtime < expired_time:
+                cls(entry.name).clean()
+                count += 1
+        return count
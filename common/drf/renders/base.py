@@ -247,6 +247,40 @@ class BaseFileRenderer(BaseRenderer):
     def after_render(self):
         pass
 
+    def initial_stream_writer(self):
+        self.initial_writer()
+
+    def flush_stream(self):
+        """返回已写入的内容，并清空缓冲区"""
+        return []
+
+    def close_stream(self):
+        self.after_render()
+        yield self.get_rendered_value()
+
+    def stream_render(self, serializer, data_chunks):
+        """
+        流式渲染导出数据，用于 StreamingHttpResponse
+        :param serializer: 导出使用的序列化器
+        :param data_chunks: 分批序列化后的数据迭代器
+        """
+        self.template = 'export'
+        self.serializer = serializer
+        try:
+            rendered_fields = self.get_rendered_fields()
+            self.initial_stream_writer()
+            self.write_column_titles(self.get_column_titles(rendered_fields))
+            yield from self.flush_stream()
+            for data in data_chunks:
+                # 会将一些 UUID 字段转化为 string
+                data = json.loads(json.dumps(data, cls=encoders.JSONEncoder))
+                self.write_rows(self.generate_rows(data, rendered_fields))
+                yield from self.flush_stream()
+            yield from self.close_stream()
+        except Exception as e:
+            logger.error(f'stream render error! media:{self.media_type} error:{e}', exc_info=True)
+            raise
+
     def render(self, data, accepted_media_type=None, renderer_context=None):
         if data is None:
             return bytes()
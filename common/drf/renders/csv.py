@@ -40,3 +40,13 @@ class CSVFileRenderer(BaseFileRenderer):
     def get_rendered_value(self):
         value = self.buffer.getvalue()
         return value
+
+    def flush_stream(self):
+        value = self.buffer.getvalue()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        if value:
+            yield value
+
+    def close_stream(self):
+        yield from self.flush_stream()
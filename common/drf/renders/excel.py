@@ -3,10 +3,11 @@ import os
 from tempfile import NamedTemporaryFile, mktemp
 
 from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
 from openpyxl.utils import get_column_letter, quote_sheetname
 from openpyxl.worksheet.datavalidation import DataValidation
-from openpyxl.worksheet.table import Table, TableStyleInfo
+from openpyxl.worksheet.table import Table, TableColumn, TableStyleInfo
 from rest_framework import serializers
 from rest_framework.utils import encoders
 
@@ -21,13 +22,53 @@ class ExcelFileRenderer(BaseFileRenderer):
     wb = None
     ws = None
     row_count = 0
+    column_count = 0
+    column_titles = None
+    table_titles = None
+    stream_chunk_size = 64 * 1024
 
     def initial_writer(self):
         self.wb = Workbook()
         self.ws = self.wb.active
 
+    def initial_stream_writer(self):
+        # 只写模式，已写入的行不会保留在内存中
+        self.wb = Workbook(write_only=True)
+        self.ws = self.wb.create_sheet()
+
+    def write_column_titles(self, column_titles):
+        if self.wb.write_only:
+            # 只写模式需要在写入数据前设置列宽，等待第一批数据后再写入标题
+            self.column_titles = column_titles
+            return
+        super().write_column_titles(column_titles)
+
+    def write_rows(self, rows):
+        if self.wb.write_only and self.column_titles is not None:
+            rows = list(rows)
+            self.set_column_width([self.column_titles] + rows)
+            self.write_row(self.column_titles)
+            self.table_titles = self.column_titles
+            self.column_titles = None
+        super().write_rows(rows)
+
+    def set_column_width(self, rows):
+        self.column_count = max([len(row) for row in rows] or [0])
+        for index in range(self.column_count):
+            max_length = max([len(str(row[index])) for row in rows if index < len(row)] or [0])
+            adjusted_width = min(max((max_length + 2) * 1.0, 30), 300)
+            self.ws.column_dimensions[get_column_letter(index + 1)].width = adjusted_width
+
     def write_row(self, row):
         self.row_count += 1
+        if self.wb.write_only:
+            cells = []
+            for cell_value in row:
+                cell = WriteOnlyCell(self.ws, value=ILLEGAL_CHARACTERS_RE.sub(r'', str(cell_value)))
+                cell.data_type = 's'
+                cells.append(cell)
+            self.ws.append(cells)
+            return
         self.ws.row_dimensions[self.row_count].height = 20
         column_count = 0
         for cell_value in row:
@@ -97,9 +138,19 @@ class ExcelFileRenderer(BaseFileRenderer):
 
         #         self.wb.save('/tmp/test.xlsx')
 
+        self.add_table(count)
+
+    def add_table(self, count):
         if count:
             row = get_column_letter(count)
             tab = Table(displayName="Table", ref=f"A1:{row}{self.row_count}")
+            if self.wb.write_only:
+                # 只写模式无法读取标题单元格，需要手动设置表格列名，否则 Excel 打开时提示修复文件
+                titles = self.table_titles or []
+                tab.tableColumns = [
+                    TableColumn(id=index + 1, name=str(titles[index]) if index < len(titles) else f"Column{index + 1}")
+                    for index in range(count)
+                ]
             style = TableStyleInfo(
                 name="TableStyleLight13",
                 showFirstColumn=True,
@@ -110,17 +161,29 @@ class ExcelFileRenderer(BaseFileRenderer):
             tab.tableStyleInfo = style
             self.ws.add_table(tab)
 
-    def get_rendered_value(self):
+    def iter_rendered_value(self):
         if os.name == 'nt':
             ## 针对 windows 平台，解决 NamedTemporaryFile 方法 权限异常
             tmp_name = mktemp()
             self.wb.save(tmp_name)
-            with open(tmp_name, 'rb') as tmp:
-                value = tmp.read()
-            os.unlink(tmp_name)
-            return value
+            try:
+                with open(tmp_name, 'rb') as tmp:
+                    while chunk := tmp.read(self.stream_chunk_size):
+                        yield chunk
+            finally:
+                os.unlink(tmp_name)
         else:
             with NamedTemporaryFile() as tmp:
                 self.wb.save(tmp.name)
                 tmp.seek(0)
-                return tmp.read()
+                while chunk := tmp.read(self.stream_chunk_size):
+                    yield chunk
+
+    def get_rendered_value(self):
+        return b''.join(self.iter_rendered_value())
+
+    def close_stream(self):
+        if self.column_titles is not None:
+            self.write_rows([])
+        self.add_table(self.column_count)
+        yield from self.iter_rendered_value()
@@ -7,3 +7,6 @@
 from django.dispatch import Signal
 
 django_ready = Signal()
+
+# 批量删除后发送，参数: sender 模型，pks 删除的主键列表，rows_count 各模型删除的数据条数
+post_bulk_delete = Signal()
@@ -22,6 +22,7 @@ from common.cache.redis import CacheList
 from common.celery.decorator import register_as_period_task, after_app_ready_start
 from common.celery.utils import delete_celery_periodic_task, disable_celery_periodic_task, get_celery_periodic_task, \
     create_or_update_celery_periodic_tasks
+from common.core.models import AutoCleanFileMixin
 from common.models import Monitor
 from common.notifications import ServerPerformanceCheckUtil, ImportDataMessage, BatchDeleteDataMessage
 from common.utils.timezone import local_now_display
@@ -137,6 +138,11 @@ def check_server_performance_period():
     ServerPerformanceCheckUtil().check_and_publish()
 
 
+@shared_task(verbose_name=_("Batch delete files"))
+def background_delete_files_job(filelist):
+    AutoCleanFileMixin.bulk_delete_files(filelist)
+
+
 @shared_task(verbose_name=_("Run background task view set"))
 def background_task_view_set_job(view: str, meta: dict, data: str, action_map: dict):
     cache = CacheList(f"view_task_{meta.get("task_id").split("_")[0]}", timeout=3600 * 24)
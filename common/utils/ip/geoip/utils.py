@@ -2,6 +2,7 @@
 #
 import ipaddress
 import os
+import threading
 
 import geoip2.database
 from django.conf import settings
@@ -10,23 +11,32 @@ from geoip2.errors import GeoIP2Error
 
 __all__ = ['get_ip_city_by_geoip']
 reader = None
+reader_lock = threading.Lock()
 
 
-def get_ip_city_by_geoip(ip):
+def get_reader():
+    """
+    只打开一次，MODE_AUTO 优先使用 C 扩展的 mmap 方式，没有扩展时使用 MODE_MMAP，多进程共享操作系统页缓存
+    """
     global reader
+    if reader is None:
+        with reader_lock:
+            if reader is None:
+                path = os.path.join(os.path.dirname(__file__), 'GeoLite2-City.mmdb')
+                reader = geoip2.database.Reader(path, mode=geoip2.database.MODE_AUTO)
+    return reader
+
+
+def get_ip_city_by_geoip(ip):
+    """ip 库打开失败时抛出异常，由调用方处理，避免查询失败的结果被缓存"""
     try:
-        if reader is None:
-            path = os.path.join(os.path.dirname(__file__), 'GeoLite2-City.mmdb')
-            reader = geoip2.database.Reader(path)
         is_private = ipaddress.ip_address(ip.strip()).is_private
         if is_private:
             return _('LAN')
     except ValueError:
         return _("Invalid ip")
-    except Exception:
-        return _("Unknown")
     try:
-        response = reader.city(ip)
+        response = get_reader().city(ip)
     except GeoIP2Error:
         return _("Unknown")
 
@@ -1,13 +1,18 @@
+import bisect
 import ipaddress
 import socket
+from functools import lru_cache
 from ipaddress import ip_network, ip_address
 
 from django.conf import settings
 from django.utils.translation import gettext_lazy as _
 
+from common.utils import get_logger
 from .geoip import get_ip_city_by_geoip
 from .ipip import get_ip_city_by_ipip
 
+logger = get_logger(__name__)
+
 
 def is_ip_address(address):
     """ 192.168.10.1 """
@@ -45,35 +50,115 @@ def in_ip_segment(ip, ip_segment):
     return min(ip1, ip2) <= ip <= max(ip1, ip2)
 
 
+def get_ip_interval(rule):
+    """
+    将 ip 规则转换为整数区间
+    :return: (ip版本, 开始, 结束)，不是 ip 规则返回 None
+    """
+    try:
+        if '/' in rule:
+            network = ip_network(rule, strict=False)
+            return network.version, int(network.network_address), int(network.broadcast_address)
+        if '-' in rule:
+            start_ip, end_ip = [ip_address(item.strip()) for item in rule.split('-')]
+            if start_ip.version != end_ip.version:
+                return None
+            return start_ip.version, min(int(start_ip), int(end_ip)), max(int(start_ip), int(end_ip))
+        address = ip_address(rule)
+        return address.version, int(address), int(address)
+    except ValueError:
+        return None
+
+
+class IpSet(object):
+    """
+    ip 集合，规则预先编译为合并后的整数区间，通过二分查找判断，支持 IPv4 和 IPv6
+    规则: [192.168.10.1, 192.168.1.0/24, 10.1.1.1-10.1.1.20, 2001:db8:2de::e13, 2001:db8:1a:1110::/64, 域名]
+    """
+
+    def __init__(self, ip_group):
+        self.match_all = '*' in ip_group
+        self.hosts = set()
+        intervals = {4: [], 6: []}
+        for rule in ip_group:
+            interval = get_ip_interval(rule)
+            if interval:
+                intervals[interval[0]].append(interval[1:])
+            else:
+                # address / host
+                self.hosts.add(rule)
+        self.starts = {}
+        self.ends = {}
+        for version, items in intervals.items():
+            merged = []
+            for start, end in sorted(items):
+                if merged and start <= merged[-1][1] + 1:
+                    merged[-1][1] = max(merged[-1][1], end)
+                else:
+                    merged.append([start, end])
+            self.starts[version] = [item[0] for item in merged]
+            self.ends[version] = [item[1] for item in merged]
+
+    def __contains__(self, ip):
+        if self.match_all or ip in self.hosts:
+            return True
+        try:
+            address = ip_address(ip)
+        except ValueError:
+            return False
+        value = int(address)
+        index = bisect.bisect_right(self.starts[address.version], value) - 1
+        return index >= 0 and value <= self.ends[address.version][index]
+
+
+@lru_cache(maxsize=64)
+def get_ip_set(ip_group):
+    return IpSet(ip_group)
+
+
 def contains_ip(ip, ip_group):
     """
     ip_group:
     [192.168.10.1, 192.168.1.0/24, 10.1.1.1-10.1.1.20, 2001:db8:2de::e13, 2001:db8:1a:1110::/64.]
-
+    按规则内容缓存编译好的 IpSet，配置修改后规则变化，自动重新编译
     """
+    return ip in get_ip_set(tuple(ip_group))
 
-    if '*' in ip_group:
-        return True
 
-    for _ip in ip_group:
-        if is_ip_address(_ip):
-            # 192.168.10.1
-            if ip == _ip:
-                return True
-        elif is_ip_network(_ip) and is_ip_address(ip):
-            # 192.168.1.0/24
-            if ip_address(ip) in ip_network(_ip):
-                return True
-        elif is_ip_segment(_ip) and is_ip_address(ip):
-            # 10.1.1.1-10.1.1.20
-            if in_ip_segment(ip, _ip):
-                return True
-        else:
-            # address / host
-            if ip == _ip:
-                return True
-
-    return False
+def get_ip_networks(rule):
+    """将 ip 规则 (网段，ip段，ip) 转换为最少数量的网段列表"""
+    interval = get_ip_interval(rule)
+    if not interval:
+        return []
+    version, start, end = interval
+    address_class = ipaddress.IPv4Address if version == 4 else ipaddress.IPv6Address
+    return list(ipaddress.summarize_address_range(address_class(start), address_class(end)))
+
+
+def get_ip_network_lookups(network, max_size=256):
+    """
+    将网段转换为字符串字段的查询条件，不再展开为主机列表
+    IPv4 按字节边界拆分为前缀匹配，数据库可以使用索引进行范围扫描，小网段直接使用 in 查询
+    :return: [(lookup, value)]，无法转换返回空列表
+    """
+    if network.prefixlen == 0:
+        # 全部 IPv4 或 IPv6 地址
+        return [('contains', '.' if network.version == 4 else ':')]
+    if network.num_addresses <= max_size:
+        return [('in', [str(address) for address in network])]
+    if network.version == 4:
+        prefix = (network.prefixlen + 7) // 8 * 8
+        lookups = []
+        for subnet in network.subnets(new_prefix=prefix):
+            octets = str(subnet.network_address).split('.')[:prefix // 8]
+            lookups.append(('startswith', f"{'.'.join(octets)}."))
+        return lookups
+    # IPv6 地址存在压缩写法，只有前缀按组对齐且不含 0 组时，才能使用前缀匹配
+    if network.prefixlen % 16 == 0:
+        groups = network.network_address.exploded.split(':')[:network.prefixlen // 16]
+        if all(int(group, 16) for group in groups):
+            return [('startswith', f"{':'.join(format(int(group, 16), 'x') for group in groups)}:")]
+    return []
 
 
 def is_ip(ip, rule_value):
@@ -94,6 +179,16 @@ def is_ip(ip, rule_value):
 
 
 def get_ip_city(ip):
+    """ip 库只读，按 ip 缓存查询结果，ip 库打开失败时不缓存，下次查询重新打开"""
+    try:
+        return _get_ip_city(ip)
+    except Exception as e:
+        logger.warning(f"get ip {ip} city failed. {e}")
+        return _("Unknown")
+
+
+@lru_cache(maxsize=10000)
+def _get_ip_city(ip):
     if not ip or not isinstance(ip, str):
         return _("Invalid address")
     if ':' in ip:
@@ -111,6 +206,14 @@ def get_ip_city(ip):
     return get_ip_city_by_geoip(ip)
 
 
+def get_ip_city_many(ips):
+    """
+    批量查询 ip 所在城市，相同 ip 只查询一次
+    :return: {ip: 城市}
+    """
+    return {ip: get_ip_city(ip) for ip in set(ips)}
+
+
 def lookup_domain(domain):
     try:
         return socket.gethostbyname(domain), ''
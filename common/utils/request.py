@@ -6,6 +6,7 @@
 # date : 6/27/2023
 import base64
 import json
+from functools import lru_cache
 
 from django.conf import settings
 from django.contrib.auth.models import AbstractBaseUser
@@ -111,15 +112,46 @@ def get_request_path(request, *args, **kwargs):
     return path
 
 
+@lru_cache(maxsize=4096)
+def parse_user_agent(ua_string):
+    """
+    解析 UA，UA 解析需要匹配大量正则，相同的 UA 只解析一次
+    返回的字典在多个请求间共享，不能修改
+    :param ua_string:
+    :return: {'browser': 浏览器, 'os': 操作系统, 'device': 设备, 'is_bot': 是否爬虫, 'agent': 完整描述}
+    """
+    user_agent = parse(ua_string)
+    return {
+        'browser': user_agent.get_browser(),
+        'os': user_agent.get_os(),
+        'device': user_agent.get_device(),
+        'is_bot': user_agent.is_bot,
+        'agent': str(user_agent),
+    }
+
+
+def get_user_agent(request):
+    """
+    获取请求的 UA 解析结果，结果保存在 request 上，同一个请求只获取一次
+    :param request:
+    :return:
+    """
+    # drf 的 Request 需要保存到原始的 HttpRequest 上，中间件和视图才能共用
+    request = getattr(request, '_request', request)
+    user_agent = getattr(request, 'user_agent_info', None)
+    if user_agent is None:
+        user_agent = parse_user_agent(request.META.get('HTTP_USER_AGENT', ''))
+        request.user_agent_info = user_agent
+    return user_agent
+
+
 def get_browser(request):
     """
     获取浏览器名
     :param request:
     :return:
     """
-    ua_string = request.META['HTTP_USER_AGENT']
-    user_agent = parse(ua_string)
-    return user_agent.get_browser()
+    return get_user_agent(request)['browser']
 
 
 def get_os(request):
@@ -128,9 +160,7 @@ def get_os(request):
     :param request:
     :return:
     """
-    ua_string = request.META['HTTP_USER_AGENT']
-    user_agent = parse(ua_string)
-    return user_agent.get_os()
+    return get_user_agent(request)['os']
 
 
 def get_verbose_name(queryset=None, view=None, model=None):
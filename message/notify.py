@@ -21,8 +21,7 @@ from common.celery.utils import get_celery_task_log_path
 from common.core.config import UserConfig
 from common.decorators import cached_method
 from common.utils import get_logger
-from common.utils.timezone import local_now_display
-from message.utils import async_push_message, online_caches
+from message.utils import async_push_message, user_presence
 from system.models import UserInfo
 from system.serializers.userinfo import UserInfoSerializer
 
@@ -55,6 +54,7 @@ class MessageNotify(AsyncJsonWebsocketConsumer):
         self.room_group_name = None
         self.disconnected = True
         self.user = None
+        self.heartbeat_task = None
 
     async def connect(self):
         self.user = self.scope["user"]
@@ -80,7 +80,8 @@ class MessageNotify(AsyncJsonWebsocketConsumer):
                 self.disconnected = False
                 # Join room group
                 await self.channel_layer.group_add(self.room_group_name, self.channel_name)
-                online_caches.push(self.room_group_name, {'time': local_now_display(), 'name': self.channel_name})
+                await sync_to_async(user_presence.connect)(self.user.pk, self.channel_name)
+                self.heartbeat_task = asyncio.create_task(self.presence_heartbeat())
 
                 await self.accept()
                 # 建立连接，推送用户信息
@@ -88,14 +89,24 @@ class MessageNotify(AsyncJsonWebsocketConsumer):
 
     async def disconnect(self, close_code):
         self.disconnected = True
+        if self.heartbeat_task:
+            self.heartbeat_task.cancel()
+            self.heartbeat_task = None
+            await sync_to_async(user_presence.disconnect)(self.user.pk, self.channel_name)
         if self.room_group_name:
             await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
 
-            if self.channel_layer._get_group_channel_name(self.room_group_name) not in self.channel_layer.groups:
-                online_caches.pop(self.room_group_name)
-
         logger.info(f"{self.user} disconnect")
 
+    async def presence_heartbeat(self):
+        # 定时续期在线状态，进程异常退出后连接过期，由定时任务移出在线用户
+        while not self.disconnected:
+            await asyncio.sleep(user_presence.heartbeat_interval)
+            try:
+                await sync_to_async(user_presence.heartbeat)(self.user.pk, self.channel_name)
+            except Exception as e:
+                logger.warning(f"{self.user} presence heartbeat failed {e}")
+
     @classmethod
     async def encode_json(cls, content):
         return json.dumps(content, cls=encoders.JSONEncoder, ensure_ascii=False)
@@ -0,0 +1,23 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# project : xadmin-server
+# filename : tasks
+# author : ly_13
+# date : 10/18/2026
+
+from celery import shared_task
+from django.utils.translation import gettext_lazy as _
+
+from common.celery.decorator import register_as_period_task
+from common.utils import get_logger
+from message.utils import user_presence
+
+logger = get_logger(__name__)
+
+
+@shared_task(verbose_name=_("Clean expired websocket connections"))
+@register_as_period_task(interval=60)
+def clean_expired_presence_job():
+    count = user_presence.clean_expired()
+    if count:
+        logger.info(f"clean expired presence, {count} users offline")
@@ -0,0 +1,88 @@
+import uuid
+
+import mock
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+
+from message.tasks import clean_expired_presence_job
+from message.utils import UserPresence
+
+
+class UserPresenceTests(SimpleTestCase):
+
+    def setUp(self):
+        # 使用独立的键前缀，避免影响其他测试的在线用户
+        template = {**settings.CACHE_KEY_TEMPLATE, 'user_presence_key': f'presence_{uuid.uuid4().hex}'}
+        with override_settings(CACHE_KEY_TEMPLATE=template):
+            self.presence = UserPresence()
+        self.addCleanup(self.clean_keys)
+        time_patch = mock.patch('message.utils.time.time', return_value=1000)
+        self.now = time_patch.start()
+        self.addCleanup(time_patch.stop)
+
+    def clean_keys(self):
+        connection = self.presence.get_connection()
+        keys = list(connection.scan_iter(f'{self.presence.prefix}_*'))
+        if keys:
+            connection.delete(*keys)
+
+    def test_connect_and_disconnect(self):
+        self.assertFalse(self.presence.is_online(1))
+        self.assertEqual(self.presence.connect(1, 'channel_a'), 1)
+        self.assertTrue(self.presence.is_online(1))
+        self.assertEqual(self.presence.connection_count(1), 1)
+        ttl = self.presence.get_connection().ttl(self.presence.get_user_key(1))
+        self.assertTrue(0 < ttl <= self.presence.timeout)
+
+        self.assertEqual(self.presence.disconnect(1, 'channel_a'), 0)
+        self.assertFalse(self.presence.is_online(1))
+        self.assertEqual(self.presence.get_online_user_pks(), set())
+
+    def test_multi_connections(self):
+        self.assertEqual(self.presence.connect(1, 'channel_a'), 1)
+        self.assertEqual(self.presence.connect(1, 'channel_b'), 2)
+        # 心跳续期不会重复计数
+        self.assertEqual(self.presence.heartbeat(1, 'channel_a'), 2)
+        # 关闭其中一个连接，用户仍然在线
+        self.assertEqual(self.presence.disconnect(1, 'channel_a'), 1)
+        self.assertTrue(self.presence.is_online(1))
+        self.assertEqual(self.presence.disconnect(1, 'channel_b'), 0)
+        self.assertFalse(self.presence.is_online(1))
+
+    def test_expired_connection(self):
+        self.presence.connect(1, 'channel_a')
+        self.presence.connect(1, 'channel_b')
+        self.now.return_value = 1060
+        self.presence.heartbeat(1, 'channel_a')
+        # channel_b 没有心跳，已经过期
+        self.now.return_value = 1100
+        self.assertEqual(self.presence.connection_count(1), 1)
+        # 断开连接时顺便清理过期的连接
+        self.assertEqual(self.presence.disconnect(1, 'channel_a'), 0)
+        self.assertFalse(self.presence.is_online(1))
+
+    def test_filter_online(self):
+        for pk in [1, 3, 5]:
+            self.presence.connect(pk, f'channel_{pk}')
+        self.assertEqual(self.presence.get_online_user_pks(), {1, 3, 5})
+        connection = mock.Mock(wraps=self.presence.get_connection())
+        # 分批使用 SMISMEMBER 查询，不读取整个在线集合
+        with mock.patch.object(self.presence, 'batch_size', 2), \
+                mock.patch.object(self.presence, 'get_connection', return_value=connection):
+            self.assertEqual(self.presence.filter_online([1, 2, 3, 4, 5]), {1, 3, 5})
+            self.assertEqual(self.presence.filter_online([]), set())
+        self.assertEqual(connection.smismember.call_count, 3)
+        connection.smembers.assert_not_called()
+
+    def test_clean_expired_job(self):
+        self.presence.connect(1, 'channel_a')
+        self.presence.connect(2, 'channel_b')
+        self.now.return_value = 1060
+        self.presence.heartbeat(2, 'channel_b')
+        # 进程异常退出，用户 1 的连接没有断开，过期后由定时任务清理
+        self.now.return_value = 1100
+        with mock.patch('message.tasks.user_presence', self.presence):
+            clean_expired_presence_job()
+        self.assertEqual(self.presence.get_online_user_pks(), {2})
+        self.assertFalse(self.presence.get_connection().exists(self.presence.get_user_key(1)))
+        self.assertEqual(self.presence.clean_expired(), 0)
@@ -4,21 +4,113 @@
 # filename : utils
 # author : ly_13
 # date : 3/6/2024
+import asyncio
+import itertools
 import json
-from typing import Dict
+import time
+from typing import Dict, Iterable
 
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
 from django.conf import settings
+from django_redis import get_redis_connection
 from rest_framework.utils import encoders
 
-from common.cache.redis import CacheHash
+from common.utils import get_logger
 
-online_caches = CacheHash(key='online_users_socket')
+logger = get_logger(__name__)
+
+
+class UserPresence(object):
+    """
+    在线用户索引，多个 ASGI 进程共享
+    online: 在线用户 pk 集合
+    user_{pk}: 用户的 websocket 连接，有序集合，score 为连接过期时间，连接需要定时心跳续期
+    进程异常退出时遗留的连接过期后由定时任务清理
+    """
+    heartbeat_interval = 30
+    timeout = 90  # 超过该时间未心跳的连接视为已断开
+    batch_size = 1000
+
+    connect_script = """
+    redis.call('zadd', KEYS[1], ARGV[2], ARGV[1])
+    redis.call('expire', KEYS[1], ARGV[3])
+    redis.call('sadd', KEYS[2], ARGV[4])
+    return redis.call('zcard', KEYS[1])
+    """
+
+    disconnect_script = """
+    if ARGV[1] ~= '' then
+        redis.call('zrem', KEYS[1], ARGV[1])
+    end
+    redis.call('zremrangebyscore', KEYS[1], '-inf', ARGV[2])
+    local count = redis.call('zcard', KEYS[1])
+    if count == 0 then
+        redis.call('srem', KEYS[2], ARGV[3])
+    end
+    return count
+    """
+
+    def __init__(self):
+        self.prefix = settings.CACHE_KEY_TEMPLATE.get('user_presence_key')
+        self.online_key = f"{self.prefix}_online"
+
+    @staticmethod
+    def get_connection():
+        return get_redis_connection("default")
+
+    def get_user_key(self, pk):
+        return f"{self.prefix}_user_{pk}"
+
+    def connect(self, pk, channel_name):
+        """新建连接或心跳续期，返回用户当前的连接数"""
+        script = self.get_connection().register_script(self.connect_script)
+        return script(keys=[self.get_user_key(pk), self.online_key],
+                      args=[channel_name, time.time() + self.timeout, self.timeout, pk])
+
+    heartbeat = connect
+
+    def disconnect(self, pk, channel_name=''):
+        """断开连接，并清理过期的连接，用户没有连接时移出在线集合，返回用户剩余的连接数"""
+        script = self.get_connection().register_script(self.disconnect_script)
+        return script(keys=[self.get_user_key(pk), self.online_key], args=[channel_name, time.time(), pk])
+
+    def connection_count(self, pk):
+        return self.get_connection().zcount(self.get_user_key(pk), time.time(), '+inf')
+
+    def is_online(self, pk):
+        return bool(self.get_connection().sismember(self.online_key, pk))
+
+    def filter_online(self, pks):
+        """返回 pks 中在线的用户，复杂度与 pks 数量相关，与在线用户总数无关"""
+        connection = self.get_connection()
+        result = set()
+        for batch in itertools.batched(pks, self.batch_size):
+            for pk, online in zip(batch, connection.smismember(self.online_key, batch)):
+                if online:
+                    result.add(pk)
+        return result
+
+    def get_online_user_pks(self):
+        return {int(pk) for pk in self.get_connection().smembers(self.online_key)}
+
+    def clean_expired(self):
+        """清理进程异常退出时遗留的连接，返回清理的离线用户数"""
+        connection = self.get_connection()
+        count = 0
+        for pks in itertools.batched(connection.sscan_iter(self.online_key, count=self.batch_size), self.batch_size):
+            for pk in pks:
+                pk = pk.decode() if isinstance(pk, bytes) else pk
+                if self.disconnect(pk) == 0:
+                    count += 1
+        return count
+
+
+user_presence = UserPresence()
 
 
 def get_online_user_pks():
-    return {int(key.split('_')[-1]) for key in online_caches.get_all().keys()}
+    return user_presence.get_online_user_pks()
 
 
 async def async_push_message(user_pk: str | int, message: Dict, message_type='push_message'):
@@ -35,6 +127,21 @@ async def push_message(user_pk: str | int, message: Dict, message_type='push_mes
     return await async_push_message(user_pk, message, message_type)
 
 
+@async_to_sync
+async def push_messages(user_pks: Iterable[str | int], message: Dict, message_type='push_message', batch_size=500):
+    """
+    同一条消息推送给多个用户，在同一个事件循环中并发推送，消息只序列化一次
+    """
+    channel_layer = get_channel_layer()
+    event = {
+        'type': message_type,
+        'data': json.dumps(message, cls=encoders.JSONEncoder, ensure_ascii=False)
+    }
+    prefix = settings.CACHE_KEY_TEMPLATE.get('user_websocket_key')
+    for pks in itertools.batched(user_pks, batch_size):
+        await asyncio.gather(*[channel_layer.group_send(f"{prefix}_{pk}", event) for pk in pks])
+
+
 @async_to_sync
 async def check_message(user_obj, message):
     room_group_name = f"{settings.CACHE_KEY_TEMPLATE.get('user_websocket_key')}_{user_obj.pk}"
@@ -1,10 +1,11 @@
+import itertools
 from typing import List, Dict
 
 from django.db import transaction
 
 from common.core.config import UserConfig
 from common.utils import get_logger
-from message.utils import push_message, get_online_user_pks
+from message.utils import push_messages, user_presence
 from notifications.serializers.message import NoticeMessageSerializer
 from system.models import UserInfo
 
@@ -12,12 +13,14 @@ logger = get_logger(__name__)
 
 from django.db.models import QuerySet
 
-from notifications.models import MessageContent
+from notifications.models import MessageContent, MessageUserRead
+from notifications.unread import UserUnreadCounter
 
 SYSTEM = MessageContent.NoticeChoices.SYSTEM
 
 
 class SiteMessageUtil:
+    batch_size = 1000  # 批量写入用户消息的每批数量
 
     @classmethod
     def send_msg(cls, subject, message, user_ids=None, level=MessageContent.LevelChoices.DEFAULT,
@@ -33,19 +36,34 @@ class SiteMessageUtil:
             fields=['pk', 'level', 'title', 'notice_type', 'message'],
             instance=notify_obj, ignore_field_permission=True).data
         notice_message['message_type'] = 'notify_message'
-        online_pks = get_online_user_pks()  # 仅推送在线用户
-        for pk in set(pks) & online_pks:
-            if UserConfig(pk).PUSH_MESSAGE_NOTICE:
-                push_message(pk, notice_message)
+        online_pks = user_presence.filter_online(pks)  # 仅推送在线用户
+        push_configs = UserConfig.for_users(online_pks, 'PUSH_MESSAGE_NOTICE', True)
+        push_messages([pk for pk, push_notice in push_configs.items() if push_notice], notice_message)
         return notify_obj
 
+    @staticmethod
+    def get_recipient_pks(users):
+        if isinstance(users, QuerySet):
+            if users.model is UserInfo:
+                return list(users.values_list('pk', flat=True))
+            return list(users)
+        if not isinstance(users, (list, tuple, set)):
+            users = [users]
+        return list(dict.fromkeys(user.pk if isinstance(user, UserInfo) else user for user in users))
+
+    @classmethod
+    def bulk_add_notice_users(cls, notify_obj, pks):
+        """
+        分批写入用户消息记录，代替 notice_user.set，不再触发逐条的 m2m_changed 推送
+        """
+        for batch in itertools.batched(pks, cls.batch_size):
+            MessageUserRead.objects.bulk_create([MessageUserRead(notice=notify_obj, owner_id=pk) for pk in batch],
+                                                ignore_conflicts=True)
+
     @classmethod
     def base_notify(cls, users: List | QuerySet, title: str, message: str, notice_type: int,
                     level: MessageContent.LevelChoices, extra_json: Dict = None):
-        if isinstance(users, (QuerySet, list)):
-            recipients = users
-        else:
-            recipients = [users]
+        pks = cls.get_recipient_pks(users)
         with transaction.atomic():
             notify_obj = MessageContent.objects.create(
                 title=title,
@@ -55,9 +73,12 @@ class SiteMessageUtil:
                 notice_type=notice_type,
                 extra_json=extra_json
             )
-            notify_obj.notice_user.set(recipients)
-        cls.push_notice_messages(notify_obj, [user.pk for user in recipients] if isinstance(recipients[0],
-                                                                                            UserInfo) else recipients)
+            cls.bulk_add_notice_users(notify_obj, pks)
+            if notice_type in MessageContent.get_user_choices():
+                transaction.on_commit(lambda: UserUnreadCounter.incr_users(pks))
+            else:
+                transaction.on_commit(lambda: UserUnreadCounter.invalid_users(pks))
+        cls.push_notice_messages(notify_obj, pks)
         return notify_obj
 
     @classmethod
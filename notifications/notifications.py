@@ -85,11 +85,12 @@ class Message(metaclass=MessageType):
 
     @staticmethod
     def send_msg(receive_user_ids, backends_msg_mapper):
+        # 所有发送方式共用同一次查询的用户
+        users = list(UserInfo.objects.filter(id__in=receive_user_ids))
         for backend, msg in backends_msg_mapper.items():
             try:
                 backend = BACKEND(backend)
                 client = backend.client()
-                users = UserInfo.objects.filter(id__in=receive_user_ids).all()
                 client.send_msg(users, **msg)
             except NotImplementedError:
                 continue
@@ -92,7 +92,10 @@ class NoticeMessageSerializer(BaseModelSerializer):
             del attrs['files']
             queryset = UploadFile.objects.filter(
                 filepath__in=[file.replace(os.path.join('/', settings.MEDIA_URL), '') for file in files])
-            attrs['file'] = get_filter_queryset(queryset, self.request.user).all()
+            # 相同内容的文件共用存储路径，同一路径只关联一个文件
+            pks = dict(get_filter_queryset(queryset, self.request.user).order_by('created_time').values_list(
+                'filepath', 'pk'))
+            attrs['file'] = UploadFile.objects.filter(pk__in=pks.values())
         return attrs
 
     def create(self, validated_data):
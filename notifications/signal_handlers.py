@@ -2,15 +2,17 @@ import inspect
 from importlib import import_module
 
 from django.apps import AppConfig
-from django.db.models.signals import post_save, post_migrate, m2m_changed
+from django.db.models.signals import post_save, post_migrate, m2m_changed, pre_delete, post_delete
 from django.dispatch import receiver
 from django.utils.functional import LazyObject
 
+from common.decorators import on_transaction_commit
 from common.utils import get_logger
 from common.utils.connection import RedisPubSub
 from notifications.message import SiteMessageUtil
-from notifications.models import SystemMsgSubscription, MessageContent
+from notifications.models import SystemMsgSubscription, MessageContent, MessageUserRead
 from notifications.notifications import SystemMessage
+from notifications.unread import UserUnreadCounter
 from system.models import UserInfo
 
 logger = get_logger(__name__)
@@ -115,3 +117,85 @@ def clean_m2m_notify_cache_handler(sender, instance, **kwargs):
 # def clean_notify_cache_handler(sender, instance, **kwargs):
 #     if issubclass(sender, MessageUserRead):
 #         invalid_notify_cache(instance.owner.pk)
+
+
+@on_transaction_commit
+def incr_unread_notice_seq():
+    UserUnreadCounter.incr_notice_seq()
+
+
+@on_transaction_commit
+def invalid_all_unread_counter():
+    UserUnreadCounter.invalid_all()
+
+
+@on_transaction_commit
+def invalid_users_unread_counter(pks):
+    UserUnreadCounter.invalid_users(pks)
+
+
+def get_notice_user_pks(instance, pk_set, model):
+    if model is UserInfo:
+        return pk_set
+    if instance.notice_type == MessageContent.NoticeChoices.ROLE:
+        return list(UserInfo.objects.filter(roles__in=pk_set).values_list('pk', flat=True).distinct())
+    if instance.notice_type == MessageContent.NoticeChoices.DEPT:
+        return list(UserInfo.objects.filter(dept__in=pk_set).values_list('pk', flat=True))
+    return []
+
+
+@receiver(post_save, sender=MessageContent)
+def unread_counter_post_save_handler(sender, instance, created, **kwargs):
+    # 新建全员公告只递增序号，修改消息无法确定影响范围，所有计数重新计算
+    if not created:
+        invalid_all_unread_counter()
+    elif instance.publish and instance.notice_type == MessageContent.NoticeChoices.NOTICE:
+        incr_unread_notice_seq()
+
+
+@receiver(pre_delete, sender=MessageContent)
+def unread_counter_pre_delete_handler(sender, instance, **kwargs):
+    invalid_all_unread_counter()
+
+
+@receiver(m2m_changed, sender=MessageContent.notice_user.through)
+@receiver(m2m_changed, sender=MessageContent.notice_dept.through)
+@receiver(m2m_changed, sender=MessageContent.notice_role.through)
+def unread_counter_m2m_handler(sender, instance, action, pk_set, model, **kwargs):
+    if action not in ['post_add', 'post_remove', 'post_clear']:
+        return
+    if not isinstance(instance, MessageContent) or not pk_set:
+        invalid_all_unread_counter()
+        return
+    pks = get_notice_user_pks(instance, pk_set, model)
+    if pks:
+        invalid_users_unread_counter(pks)
+
+
+@receiver([post_save, post_delete], sender=MessageUserRead)
+def unread_counter_read_handler(sender, instance, **kwargs):
+    # 删除消息时，已递增全局版本号
+    origin = kwargs.get('origin')
+    if isinstance(origin, MessageContent) or getattr(origin, 'model', None) is MessageContent:
+        return
+    invalid_users_unread_counter([instance.owner_id])
+
+
+@receiver(post_save, sender=UserInfo)
+def unread_counter_user_handler(sender, instance, created, update_fields=None, **kwargs):
+    # 用户部门可能变化，部门公告的未读数量需要重新计算
+    if created or (update_fields and 'dept' not in update_fields and 'dept_id' not in update_fields):
+        return
+    invalid_users_unread_counter([instance.pk])
+
+
+@receiver(m2m_changed, sender=UserInfo.roles.through)
+def unread_counter_user_roles_handler(sender, instance, action, pk_set, **kwargs):
+    if action not in ['post_add', 'post_remove', 'post_clear']:
+        return
+    if isinstance(instance, UserInfo):
+        invalid_users_unread_counter([instance.pk])
+    elif pk_set:
+        invalid_users_unread_counter(list(pk_set))
+    else:
+        invalid_all_unread_counter()
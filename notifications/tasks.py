@@ -0,0 +1,29 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# project : xadmin-server
+# filename : tasks
+# author : ly_13
+# date : 10/18/2026
+
+from celery import shared_task
+from django.utils.translation import gettext_lazy as _
+
+from common.celery.decorator import register_as_period_task
+from common.utils import get_logger
+from message.utils import get_online_user_pks
+from notifications.unread import UserUnreadCounter
+from system.models import UserInfo
+
+logger = get_logger(__name__)
+
+
+@shared_task(
+    verbose_name=_("Reconcile unread message counters"),
+    description=_("Recalculate the unread message counters of online users to correct possible deviations")
+)
+@register_as_period_task(interval=600)
+def reconcile_unread_counter_job():
+    users = UserInfo.objects.filter(pk__in=get_online_user_pks()).select_related('dept')
+    drift = UserUnreadCounter.reconcile(users.iterator())
+    if drift:
+        logger.warning(f"reconcile unread counters, {drift} users drift")
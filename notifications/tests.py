@@ -1 +1,103 @@
-# Create your tests here.
+import mock
+from rest_framework import permissions
+from rest_framework.test import APITestCase
+
+from notifications.message import SiteMessageUtil
+from notifications.models import MessageContent, MessageUserRead
+from notifications.unread import UserUnreadCounter
+from notifications.views.user_site_msg import UserSiteMessageViewSet
+from system.models import UserInfo
+
+
+class UserUnreadCounterTests(APITestCase):
+
+    def setUp(self):
+        self.user = UserInfo.objects.create_user(username='unread_user', password='password123')
+        self.other = UserInfo.objects.create_user(username='unread_other', password='password123')
+        self.counter = UserUnreadCounter(self.user)
+        self.addCleanup(UserUnreadCounter.invalid_users, [self.user.pk, self.other.pk])
+        UserUnreadCounter.invalid_users([self.user.pk, self.other.pk])
+
+    def send_msg(self, user_ids):
+        with self.captureOnCommitCallbacks(execute=True):
+            return SiteMessageUtil.notify_info(user_ids, 'title', 'message')
+
+    def create_notice(self, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return MessageContent.objects.create(title='notice', notice_type=MessageContent.NoticeChoices.NOTICE,
+                                                 **kwargs)
+
+    def get_cached(self, pk):
+        data = UserUnreadCounter.get_connection().hgetall(UserUnreadCounter.get_cache_key(pk))
+        return {k.decode(): int(v) for k, v in data.items()}
+
+    def test_refresh_when_missing(self):
+        self.send_msg([self.user.pk])
+        self.assertEqual(self.get_cached(self.user.pk), {})
+        # 计数不存在时从数据库计算并保存
+        with mock.patch.object(UserUnreadCounter, 'compute', wraps=self.counter.compute) as compute:
+            self.assertEqual(self.counter.get_counts(), {'notice': 1, 'announce': 0})
+            self.assertEqual(self.counter.get_counts(), {'notice': 1, 'announce': 0})
+        compute.assert_called_once()
+        self.assertEqual(self.get_cached(self.user.pk)['notice'], 1)
+
+    def test_incr_and_decr(self):
+        self.assertEqual(self.counter.get_counts(), {'notice': 0, 'announce': 0})
+        with mock.patch.object(UserUnreadCounter, 'compute') as compute:
+            self.send_msg([self.user.pk, self.other.pk])
+            self.assertEqual(self.counter.get_counts(), {'notice': 1, 'announce': 0})
+            UserUnreadCounter.incr_users([self.user.pk], amount=-1)
+            self.assertEqual(self.counter.get_counts(), {'notice': 0, 'announce': 0})
+        compute.assert_not_called()
+        # 不存在计数的用户不创建计数，下次查询时计算
+        self.assertEqual(self.get_cached(self.other.pk), {})
+        self.assertEqual(UserUnreadCounter(self.other).get_counts(), {'notice': 1, 'announce': 0})
+
+    def test_notice_seq(self):
+        self.assertEqual(self.counter.get_counts(), {'notice': 0, 'announce': 0})
+        # 发布全员公告只递增全局序号，不重新计算
+        with mock.patch.object(UserUnreadCounter, 'compute') as compute:
+            self.create_notice()
+            self.assertEqual(self.counter.get_counts(), {'notice': 0, 'announce': 1})
+        compute.assert_not_called()
+        self.assertEqual(UserUnreadCounter(self.other).get_counts(), {'notice': 0, 'announce': 1})
+        self.create_notice()
+        self.assertEqual(self.counter.get_counts(), {'notice': 0, 'announce': 2})
+        self.assertEqual(UserUnreadCounter(self.other).get_counts(), {'notice': 0, 'announce': 2})
+
+    def test_invalid_all_after_update(self):
+        notice = self.create_notice()
+        self.assertEqual(self.counter.get_counts(), {'notice': 0, 'announce': 1})
+        # 修改消息无法增量更新，全局版本号变化后重新计算
+        with self.captureOnCommitCallbacks(execute=True):
+            notice.publish = False
+            notice.save(update_fields=['publish'])
+        self.assertEqual(self.counter.get_counts(), {'notice': 0, 'announce': 0})
+
+    def test_mark_read(self):
+        notify_obj = self.send_msg([self.user.pk])
+        notice = self.create_notice()
+        self.assertEqual(self.counter.get_counts(), {'notice': 1, 'announce': 1})
+
+        self.client.force_authenticate(user=self.user)
+        with mock.patch.object(UserSiteMessageViewSet, 'permission_classes', [permissions.IsAuthenticated]):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.patch('/api/notifications/site-messages/batch-read',
+                                             {'pks': [str(notify_obj.pk), str(notice.pk)]}, format='json',
+                                             HTTP_USER_AGENT='Mozilla/5.0 (test)')
+        self.assertEqual(response.json()['code'], 1000)
+        self.assertFalse(MessageUserRead.objects.filter(owner=self.user, unread=True).exists())
+        self.assertEqual(self.counter.get_counts(), {'notice': 0, 'announce': 0})
+
+    def test_reconcile(self):
+        self.send_msg([self.user.pk])
+        self.assertEqual(self.counter.get_counts(), {'notice': 1, 'announce': 0})
+        self.assertEqual(UserUnreadCounter(self.other).get_counts(), {'notice': 0, 'announce': 0})
+        self.assertEqual(UserUnreadCounter.reconcile([self.user, self.other]), 0)
+
+        # 批量更新不触发信号，缓存的计数出现偏差
+        MessageUserRead.objects.filter(owner=self.user).update(unread=False)
+        self.assertEqual(self.counter.get_counts(), {'notice': 1, 'announce': 0})
+        self.assertEqual(UserUnreadCounter.reconcile([self.user, self.other]), 1)
+        self.assertEqual(self.counter.get_counts(), {'notice': 0, 'announce': 0})
+        self.assertEqual(UserUnreadCounter.reconcile([self.user]), 0)
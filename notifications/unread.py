@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# project : xadmin-server
+# filename : unread
+# author : ly_13
+# date : 10/18/2026
+import itertools
+
+from django.conf import settings
+from django.db.models import Q
+from django_redis import get_redis_connection
+
+from common.utils import get_logger
+from notifications.models import MessageContent
+
+logger = get_logger(__name__)
+
+
+def get_users_notice_q(user_obj):
+    q = Q()
+    q |= Q(notice_type=MessageContent.NoticeChoices.NOTICE)
+    q |= Q(notice_type=MessageContent.NoticeChoices.DEPT, notice_dept=user_obj.dept)
+    q |= Q(notice_type=MessageContent.NoticeChoices.ROLE, notice_role__in=user_obj.roles.all())
+    return q
+
+
+def get_user_unread_q1(user_obj):
+    return get_users_notice_q(user_obj) & ~Q(notice_user=user_obj)
+
+
+def get_user_unread_q2(user_obj):
+    return Q(notice_type__in=MessageContent.get_user_choices(), notice_user=user_obj, messageuserread__unread=True)
+
+
+def get_user_unread_q(user_obj):
+    return get_user_unread_q1(user_obj) | get_user_unread_q2(user_obj)
+
+
+class UserUnreadCounter(object):
+    """
+    用户未读消息计数，保存在 Redis hash 中，轮询未读数量时不再查询数据库
+    notice: 未读通知数量（系统通知，用户通知）
+    announce: 未读公告数量（公告，部门公告，角色公告）
+    seq: 计算时全员公告的序号，发布全员公告只递增全局序号，未读公告数量 = announce + 当前序号 - seq
+    version: 计算时的全局版本号，消息被修改或删除等无法增量更新时递增，所有计数重新计算
+    """
+    timeout = 3600 * 24
+    batch_size = 1000
+    incr_script = """
+    if redis.call('exists', KEYS[1]) == 1 then
+        return redis.call('hincrby', KEYS[1], ARGV[1], ARGV[2])
+    end
+    """
+
+    def __init__(self, user_obj):
+        self.user_obj = user_obj
+        self.cache_key = self.get_cache_key(user_obj.pk)
+
+    @staticmethod
+    def get_connection():
+        return get_redis_connection("default")
+
+    @staticmethod
+    def get_cache_key(pk):
+        return f"{settings.CACHE_KEY_TEMPLATE.get('unread_count_key')}_{pk}"
+
+    @staticmethod
+    def get_seq_key():
+        return f"{settings.CACHE_KEY_TEMPLATE.get('unread_count_key')}_notice_seq"
+
+    @staticmethod
+    def get_version_key():
+        return f"{settings.CACHE_KEY_TEMPLATE.get('unread_count_key')}_version"
+
+    def get_queryset(self):
+        return MessageContent.objects.filter(publish=True).distinct()
+
+    def compute(self):
+        queryset = self.get_queryset()
+        return {
+            'notice': queryset.filter(get_user_unread_q2(self.user_obj)).count(),
+            'announce': queryset.filter(get_user_unread_q1(self.user_obj)).count(),
+        }
+
+    def get_global_state(self, connection):
+        seq, version = connection.mget([self.get_seq_key(), self.get_version_key()])
+        return int(seq or 0), int(version or 0)
+
+    def refresh(self):
+        """从数据库重新计算并保存计数"""
+        connection = self.get_connection()
+        # 先读取全局状态再计算，计算期间发布的公告最多多算一条，由定时校准修正
+        seq, version = self.get_global_state(connection)
+        counts = self.compute()
+        with connection.pipeline() as pipe:
+            pipe.hset(self.cache_key, mapping={**counts, 'seq': seq, 'version': version})
+            pipe.expire(self.cache_key, self.timeout)
+            pipe.execute()
+        return counts
+
+    def get_counts(self):
+        """
+        :return: {'notice': 未读通知数量, 'announce': 未读公告数量}
+        """
+        connection = self.get_connection()
+        with connection.pipeline() as pipe:
+            pipe.hgetall(self.cache_key)
+            pipe.mget([self.get_seq_key(), self.get_version_key()])
+            data, (seq, version) = pipe.execute()
+        data = {(k.decode() if isinstance(k, bytes) else k): int(v) for k, v in data.items()}
+        if not data or data.get('version') != int(version or 0):
+            return self.refresh()
+        return {
+            'notice': max(data.get('notice', 0), 0),
+            'announce': max(data.get('announce', 0) + int(seq or 0) - data.get('seq', 0), 0),
+        }
+
+    def invalid(self):
+        self.invalid_users([self.user_obj.pk])
+
+    @classmethod
+    def incr_users(cls, pks, field='notice', amount=1):
+        """已存在计数的用户增量更新，不存在的用户在下次查询时计算"""
+        connection = cls.get_connection()
+        script = connection.register_script(cls.incr_script)
+        for batch in itertools.batched(pks, cls.batch_size):
+            with connection.pipeline(transaction=False) as pipe:
+                for pk in batch:
+                    script(keys=[cls.get_cache_key(pk)], args=[field, amount], client=pipe)
+                pipe.execute()
+
+    @classmethod
+    def invalid_users(cls, pks):
+        connection = cls.get_connection()
+        for batch in itertools.batched(pks, cls.batch_size):
+            connection.delete(*[cls.get_cache_key(pk) for pk in batch])
+
+    @classmethod
+    def incr_notice_seq(cls):
+        """发布全员公告，所有用户的未读公告数量加一"""
+        return cls.get_connection().incr(cls.get_seq_key())
+
+    @classmethod
+    def invalid_all(cls):
+        return cls.get_connection().incr(cls.get_version_key())
+
+    @classmethod
+    def reconcile(cls, users):
+        """重新计算用户的计数，返回计数有偏差的用户数量"""
+        drift = 0
+        for user_obj in users:
+            counter = cls(user_obj)
+            cached = counter.get_counts()
+            if cached != counter.refresh():
+                drift += 1
+        return drift
@@ -13,6 +13,7 @@ from rest_framework.decorators import action
 
 from common.core.filter import BaseFilterSet, PkMultipleFilter
 from common.core.modelset import BaseModelSet, ListDeleteModelSet
+from common.core.pagination import CursorPageNumber
 from common.core.response import ApiResponse
 from common.swagger.utils import get_default_response_schema
 from notifications.models import MessageContent, MessageUserRead
@@ -36,6 +37,7 @@ class NoticeMessageViewSet(BaseModelSet):
 
     ordering_fields = ['updated_time', 'created_time']
     filterset_class = NoticeMessageFilter
+    pagination_class = CursorPageNumber
 
     @extend_schema(
         request=OpenApiRequest(
@@ -17,30 +17,13 @@ from rest_framework.filters import OrderingFilter
 
 from common.core.filter import BaseFilterSet
 from common.core.modelset import OnlyListModelSet, CacheListResponseMixin
+from common.core.pagination import CursorPageNumber
 from common.core.response import ApiResponse
 from common.swagger.utils import get_default_response_schema
 from notifications.models import MessageContent, MessageUserRead
 from notifications.serializers.message import UserNoticeSerializer
-
-
-def get_users_notice_q(user_obj):
-    q = Q()
-    q |= Q(notice_type=MessageContent.NoticeChoices.NOTICE)
-    q |= Q(notice_type=MessageContent.NoticeChoices.DEPT, notice_dept=user_obj.dept)
-    q |= Q(notice_type=MessageContent.NoticeChoices.ROLE, notice_role__in=user_obj.roles.all())
-    return q
-
-
-def get_user_unread_q1(user_obj):
-    return get_users_notice_q(user_obj) & ~Q(notice_user=user_obj)
-
-
-def get_user_unread_q2(user_obj):
-    return Q(notice_type__in=MessageContent.get_user_choices(), notice_user=user_obj, messageuserread__unread=True)
-
-
-def get_user_unread_q(user_obj):
-    return get_user_unread_q1(user_obj) | get_user_unread_q2(user_obj)
+from notifications.unread import get_users_notice_q, get_user_unread_q1, get_user_unread_q2, get_user_unread_q, \
+    UserUnreadCounter
 
 
 class UserSiteMessageViewSetFilter(BaseFilterSet):
@@ -66,10 +49,23 @@ class UserSiteMessageViewSet(OnlyListModelSet, CacheListResponseMixin):
     filter_backends = [filters.DjangoFilterBackend, OrderingFilter]
     ordering_fields = ['created_time']
     filterset_class = UserSiteMessageViewSetFilter
+    pagination_class = CursorPageNumber
+    counter_ignore_params = {'page', 'size', 'ordering', 'cursor', 'total'}  # 这些参数不影响未读数量，可以直接使用未读计数
+
+    def get_unread_counts(self):
+        """没有过滤条件时，使用缓存的未读计数，否则查询数据库"""
+        if set(self.request.query_params.keys()) - self.counter_ignore_params:
+            return None
+        return UserUnreadCounter(self.request.user).get_counts()
 
     # @cache_response(timeout=600, key_func='get_cache_key')
     def list(self, request, *args, **kwargs):
-        unread_count = self.filter_queryset(self.get_queryset()).filter(get_user_unread_q(self.request.user)).count()
+        counts = self.get_unread_counts()
+        if counts is not None:
+            unread_count = counts['notice'] + counts['announce']
+        else:
+            unread_count = self.filter_queryset(self.get_queryset()).filter(
+                get_user_unread_q(self.request.user)).count()
         q = get_users_notice_q(request.user)
         q |= Q(notice_type__in=MessageContent.get_user_choices(), notice_user=request.user)
         self.queryset = self.filter_queryset(self.get_queryset()).filter(q)
@@ -100,20 +96,15 @@ class UserSiteMessageViewSet(OnlyListModelSet, CacheListResponseMixin):
         """用户未读消息"""
         notice_queryset = self.filter_queryset(self.get_queryset()).filter(get_user_unread_q2(request.user))
         announce_queryset = self.filter_queryset(self.get_queryset()).filter(get_user_unread_q1(request.user))
-        results = [
-            {
-                "key": "1",
-                "name": "layout.notice",
-                "list": self.serializer_class(notice_queryset[:10], many=True, context={'request': request}).data,
-                "total": notice_queryset.count()
-            },
-            {
-                "key": "2",
-                "name": "layout.announcement",
-                "list": self.serializer_class(announce_queryset[:10], many=True, context={'request': request}).data,
-                "total": announce_queryset.count()
-            }
-        ]
+        counts = self.get_unread_counts()
+        if counts is None:
+            counts = {'notice': notice_queryset.count(), 'announce': announce_queryset.count()}
+        results = []
+        for key, name, queryset, total in [("1", "layout.notice", notice_queryset, counts['notice']),
+                                           ("2", "layout.announcement", announce_queryset, counts['announce'])]:
+            # 没有未读消息时，不再查询消息列表
+            data = self.serializer_class(queryset[:10], many=True, context={'request': request}).data if total else []
+            results.append({"key": key, "name": name, "list": data, "total": total})
 
         return ApiResponse(data={'results': results, 'total': sum([item.get('total', 0) for item in results])})
 
@@ -122,6 +113,7 @@ class UserSiteMessageViewSet(OnlyListModelSet, CacheListResponseMixin):
             MessageUserRead.objects.filter(notice__id__in=pks, owner=request.user, unread=True).update(unread=False)
             for pk in pks:
                 MessageUserRead.objects.update_or_create(owner=request.user, notice_id=pk, defaults={'unread': False})
+            UserUnreadCounter(request.user).invalid()
         return ApiResponse()
 
     @extend_schema(
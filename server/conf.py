@@ -77,6 +77,7 @@ class Config(dict):
         # SIMPLE_JWT
         'ACCESS_TOKEN_LIFETIME': 3600,  # Unit: second
         'REFRESH_TOKEN_LIFETIME': 15 * 24 * 3600,  # Unit: second
+        'AUTH_USER_CACHE_TIMEOUT': 60,  # 认证用户信息缓存时间, Unit: second
     }
     settings = {
         # 密码安全配置
@@ -135,6 +136,8 @@ class Config(dict):
         'PERMISSION_DATA_ENABLED': True,  # 数据权限控制
         'REFERER_CHECK_ENABLED': False,  # referer 校验
         'EXPORT_MAX_LIMIT': 20000,  # 限制导出数据数量
+        'FILE_UPLOAD_CHUNK_SIZE': 5 * 1024 * 1024,  # 分片上传的分片大小
+        'FILE_UPLOAD_PART_TIMEOUT': 24 * 3600,  # 未完成的分片上传保留时间, Unit: second
         # 验证码配置
         'VERIFY_CODE_TTL': 5 * 60,  # Unit: second
         'VERIFY_CODE_LIMIT': 60,
@@ -181,6 +184,11 @@ class Config(dict):
             '/api/common/api/health': ['GET'],
         },
         'API_LOG_METHODS': ["POST", "DELETE", "PUT", "PATCH"],
+        # 操作日志异步批量写入，队列满时丢弃新日志
+        'API_LOG_ASYNC': True,
+        'API_LOG_QUEUE_SIZE': 10000,
+        'API_LOG_BATCH_SIZE': 500,
+        'API_LOG_FLUSH_INTERVAL': 1,
         'API_MODEL_MAP': {
             "/api/system/refresh": "Token刷新",
             "/api/flower": "定时任务",
@@ -70,7 +70,11 @@ class RequestMiddleware:
     def __call__(self, request):
         request.request_uuid = uuid.uuid4()
         set_current_request(request)
-        response = self.get_response(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            # 请求结束后清理，避免线程复用时后续代码读取到上一个请求
+            set_current_request(None)
         return response
 
 
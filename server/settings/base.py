@@ -11,7 +11,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 import os
 
-from ..const import CONFIG, PROJECT_DIR
+from ..const import CONFIG, PROJECT_DIR, TMP_DIR
 
 BASE_DIR = PROJECT_DIR
 # Quick-start development settings - unsuitable for production
@@ -255,10 +255,15 @@ MEDIA_URL = "media/"
 MEDIA_ROOT = os.path.join(PROJECT_DIR, "data", "upload")
 FILE_UPLOAD_SIZE = CONFIG.FILE_UPLOAD_SIZE
 PICTURE_UPLOAD_SIZE = CONFIG.PICTURE_UPLOAD_SIZE
+# 上传时边接收边计算文件md5，保存文件时不再重新读取
 FILE_UPLOAD_HANDLERS = [
-    "django.core.files.uploadhandler.MemoryFileUploadHandler",
-    "django.core.files.uploadhandler.TemporaryFileUploadHandler",
+    "common.core.upload.Md5MemoryFileUploadHandler",
+    "common.core.upload.Md5TemporaryFileUploadHandler",
 ]
+# 分片上传，分片大小和未完成分片的保留时间
+FILE_UPLOAD_CHUNK_SIZE = CONFIG.FILE_UPLOAD_CHUNK_SIZE
+FILE_UPLOAD_PART_TIMEOUT = CONFIG.FILE_UPLOAD_PART_TIMEOUT
+FILE_UPLOAD_PART_DIR = os.path.join(TMP_DIR, "upload")
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
@@ -278,7 +283,18 @@ CACHE_KEY_TEMPLATE = {
     'user_websocket_key': 'user_websocket',
     'upload_part_info_key': 'upload_part_info',
     'black_access_token_key': 'black_access_token',
-    'common_resource_ids_key': 'common_resource_ids'
+    'auth_user_key': 'auth_user',
+    'common_resource_ids_key': 'common_resource_ids',
+    'data_permission_version_key': 'data_permission_version',
+    'dept_tree_version_key': 'dept_tree_version',
+    'search_columns_version_key': 'search_columns_version',
+    'dashboard_rollup_version_key': 'dashboard_rollup_version',
+    'menu_route_version_key': 'menu_route_version',
+    'unread_count_key': 'unread_count',
+    'user_presence_key': 'user_presence',
+    'cache_namespace_key': 'cache_namespace',
+    'captcha_key': 'captcha',
+    'captcha_pool_key': 'captcha_pool',
 }
 
 APPEND_SLASH = False
@@ -48,6 +48,12 @@ PERMISSION_DATA_AUTH_APPS = [
 API_LOG_ENABLE = CONFIG.API_LOG_ENABLE
 API_LOG_METHODS = CONFIG.API_LOG_METHODS  # 'ALL'
 
+# 操作日志异步批量写入，后台线程每 API_LOG_FLUSH_INTERVAL 秒或队列达到 API_LOG_BATCH_SIZE 时写入
+API_LOG_ASYNC = CONFIG.API_LOG_ASYNC
+API_LOG_QUEUE_SIZE = CONFIG.API_LOG_QUEUE_SIZE
+API_LOG_BATCH_SIZE = CONFIG.API_LOG_BATCH_SIZE
+API_LOG_FLUSH_INTERVAL = CONFIG.API_LOG_FLUSH_INTERVAL
+
 # 忽略日志记录, 支持model 或者 request_path, 不支持正则
 API_LOG_IGNORE = CONFIG.API_LOG_IGNORE
 
@@ -100,6 +100,9 @@ SIMPLE_JWT = {
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1),
 }
 
+# 认证时缓存的用户信息过期时间，用户修改，角色变化，登出时主动失效
+AUTH_USER_CACHE_TIMEOUT = CONFIG.AUTH_USER_CACHE_TIMEOUT
+
 CORS_ALLOW_CREDENTIALS = True
 CORS_ALLOW_ALL_ORIGINS = True
 
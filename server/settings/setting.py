@@ -130,6 +130,8 @@ CAPTCHA_PUNCTUATION = """_"',.;:-"""
 CAPTCHA_FLITE_PATH = None
 CAPTCHA_SOX_PATH = None
 CAPTCHA_MATH_CHALLENGE_OPERATOR = "*"
+# 从 Redis 验证码池中获取预先渲染好的验证码，定时任务补充验证码池到 CAPTCHA_POOL_SIZE，需要运行 celery beat
 CAPTCHA_GET_FROM_POOL = False
 CAPTCHA_GET_FROM_POOL_TIMEOUT = 5
+CAPTCHA_POOL_SIZE = 1000
 CAPTCHA_2X_IMAGE = True
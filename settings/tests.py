@@ -1 +1,68 @@
-# Create your tests here.
+import uuid
+
+import mock
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from settings.utils.security import LoginBlockUtil, incr_sliding_window, get_sliding_window_count
+
+
+@override_settings(SECURITY_LOGIN_LIMIT_COUNT=3, SECURITY_LOGIN_LIMIT_TIME=30)
+class SlidingWindowBlockTests(SimpleTestCase):
+
+    def setUp(self):
+        self.username = f"user_{uuid.uuid4().hex[:8]}"
+        self.ip = '127.0.0.1'
+
+    def tearDown(self):
+        LoginBlockUtil.unblock_user(self.username)
+
+    def test_block_when_limit_reached(self):
+        block_util = LoginBlockUtil(self.username, self.ip)
+        self.assertEqual(block_util.incr_failed_count(), 2)
+        self.assertEqual(block_util.incr_failed_count(), 1)
+        self.assertFalse(block_util.is_block())
+        self.assertEqual(block_util.incr_failed_count(), 0)
+        self.assertTrue(block_util.is_block())
+        self.assertTrue(LoginBlockUtil.is_user_block(self.username))
+        self.assertEqual(block_util.get_failed_count(), 3)
+
+    def test_window_slides(self):
+        limit_key = f"_TEST_LIMIT_{self.username}"
+        block_key = f"_TEST_BLOCK_{self.username}"
+        self.addCleanup(cache.delete_many, [limit_key, block_key])
+        with mock.patch('settings.utils.security.time.time') as now:
+            now.return_value = 1000
+            self.assertEqual(incr_sliding_window(limit_key, block_key, 10, 3), 1)
+            now.return_value = 1005
+            self.assertEqual(incr_sliding_window(limit_key, block_key, 10, 3), 2)
+            # 第一次记录已经滑出窗口
+            now.return_value = 1011
+            self.assertEqual(incr_sliding_window(limit_key, block_key, 10, 3), 2)
+            self.assertIsNone(cache.get(block_key))
+            now.return_value = 1016
+            self.assertEqual(get_sliding_window_count(limit_key, 10), 1)
+            now.return_value = 1017
+            self.assertEqual(incr_sliding_window(limit_key, block_key, 10, 2), 2)
+            self.assertEqual(cache.get(block_key), 1017)
+
+    def test_unblock_user_resets_count(self):
+        block_util = LoginBlockUtil(self.username, self.ip)
+        for _ in range(3):
+            block_util.incr_failed_count()
+        self.assertTrue(block_util.is_block())
+
+        LoginBlockUtil.unblock_user(self.username)
+        block_util = LoginBlockUtil(self.username, self.ip)
+        self.assertFalse(block_util.is_block())
+        self.assertEqual(block_util.get_failed_count(), 0)
+        self.assertEqual(block_util.incr_failed_count(), 2)
+
+    def test_migrate_integer_counter(self):
+        block_util = LoginBlockUtil(self.username, self.ip)
+        # 旧版本使用整数保存失败次数
+        cache.set(block_util.limit_key, 2, 60)
+        self.assertEqual(block_util.get_failed_count(), 2)
+        self.assertEqual(block_util.incr_failed_count(), 2)
+        self.assertEqual(block_util.get_failed_count(), 1)
+        self.assertFalse(block_util.is_block())
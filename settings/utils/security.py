@@ -4,15 +4,72 @@
 # filename : security
 # author : ly_13
 # date : 8/10/2024
-
+import datetime
+import time
+import uuid
+from functools import cached_property
 
 from django.conf import settings
 from django.core.cache import cache
-from django.utils import timezone
 from django.utils.dateparse import parse_datetime
+from django_redis import get_redis_connection
 
+from common.cache.storage import CacheNamespace
 from common.utils import ip
 
+# KEYS: 计数 key, 锁定 key, [计数 key 的命名空间代数 key]
+# ARGV: 当前时间(毫秒), 窗口时间(毫秒), 锁定次数, 锁定时间(秒), 本次记录
+# 清理窗口外的记录，记录本次，窗口内次数达到上限时锁定，返回窗口内次数
+SLIDING_WINDOW_SCRIPT = """
+local limit_key = KEYS[1]
+if KEYS[3] then
+    limit_key = limit_key .. '_g' .. (redis.call('get', KEYS[3]) or '0')
+end
+-- 兼容旧版本使用字符串保存的计数
+if redis.call('type', limit_key).ok ~= 'zset' then
+    redis.call('del', limit_key)
+end
+local now = tonumber(ARGV[1])
+redis.call('zremrangebyscore', limit_key, '-inf', now - tonumber(ARGV[2]))
+redis.call('zadd', limit_key, now, ARGV[5])
+redis.call('pexpire', limit_key, ARGV[2])
+local count = redis.call('zcard', limit_key)
+if count >= tonumber(ARGV[3]) then
+    redis.call('set', KEYS[2], math.floor(now / 1000), 'EX', ARGV[4])
+end
+return count
+"""
+
+
+def incr_sliding_window(limit_key, block_key, window, limit_count, namespace_key=None):
+    """
+    滑动窗口计数，检查和计数在一次 Redis 请求中原子完成，并发请求不会少计
+    :param window: 窗口时间，同时也是锁定时间，单位秒
+    :return: 窗口内的次数
+    """
+    connection = get_redis_connection("default")
+    keys = [limit_key, block_key]
+    if namespace_key:
+        keys.append(namespace_key)
+    now = int(time.time() * 1000)
+    script = connection.register_script(SLIDING_WINDOW_SCRIPT)
+    return script(keys=keys, args=[now, window * 1000, limit_count, window, f"{now}_{uuid.uuid4().hex[:8]}"])
+
+
+def get_sliding_window_count(limit_key, window):
+    now = int(time.time() * 1000)
+    try:
+        return get_redis_connection("default").zcount(limit_key, now - window * 1000, '+inf')
+    except Exception:
+        # 旧版本使用字符串保存的计数
+        return int(cache.get(limit_key, 0))
+
+
+def get_block_many(block_utils):
+    """一次 MGET 查询多个锁定状态，返回与 block_utils 顺序对应的是否锁定"""
+    data = cache.get_many([block_util.block_key for block_util in block_utils])
+    return [block_util.check_block_value(data.get(block_util.block_key)) for block_util in block_utils]
+
 
 class BlockUtil:
     BLOCK_KEY_TMPL: str
@@ -35,10 +92,18 @@ class BlockUtilBase:
     def __init__(self, username, ip):
         self.username = username
         self.ip = ip
-        self.limit_key = self.LIMIT_KEY_TMPL.format(username, ip)
         self.block_key = self.BLOCK_KEY_TMPL.format(username)
         self.key_ttl = int(settings.SECURITY_LOGIN_LIMIT_TIME) * 60
 
+    @property
+    def namespace(self):
+        # 失败次数以 block_key 为命名空间，解除锁定时递增代数，所有 ip 的失败次数一起失效
+        return CacheNamespace(self.block_key, timeout=self.key_ttl)
+
+    @cached_property
+    def limit_key(self):
+        return self.namespace.make_key(self.LIMIT_KEY_TMPL.format(self.username, self.ip))
+
     def get_remainder_times(self):
         times_up = settings.SECURITY_LOGIN_LIMIT_COUNT
         times_failed = self.get_failed_count()
@@ -46,30 +111,22 @@ class BlockUtilBase:
         return times_remainder
 
     def incr_failed_count(self) -> int:
-        limit_key = self.limit_key
-        count = cache.get(limit_key, 0)
-        count += 1
-        cache.set(limit_key, count, self.key_ttl)
-
+        """增加失败次数，返回剩余次数"""
         limit_count = settings.SECURITY_LOGIN_LIMIT_COUNT
-        if count >= limit_count:
-            cache.set(self.block_key, True, self.key_ttl)
+        count = incr_sliding_window(self.LIMIT_KEY_TMPL.format(self.username, self.ip), self.block_key,
+                                    self.key_ttl, limit_count, self.namespace.cache_key)
         return limit_count - count
 
     def get_failed_count(self):
-        count = cache.get(self.limit_key, 0)
-        return count
+        return get_sliding_window_count(self.limit_key, self.key_ttl)
 
     def clean_failed_count(self):
-        cache.delete(self.limit_key)
-        cache.delete(self.block_key)
+        cache.delete_many([self.limit_key, self.block_key])
 
     @classmethod
     def unblock_user(cls, username):
-        key_limit = cls.LIMIT_KEY_TMPL.format(username, '*')
         key_block = cls.BLOCK_KEY_TMPL.format(username)
-        # Redis 尽量不要用通配
-        cache.delete_pattern(key_limit)
+        CacheNamespace(key_block, timeout=int(settings.SECURITY_LOGIN_LIMIT_TIME) * 60).incr_version()
         cache.delete(key_block)
 
     @classmethod
@@ -77,8 +134,12 @@ class BlockUtilBase:
         block_key = cls.BLOCK_KEY_TMPL.format(username)
         return bool(cache.get(block_key))
 
+    @staticmethod
+    def check_block_value(value):
+        return bool(value)
+
     def is_block(self):
-        return bool(cache.get(self.block_key))
+        return self.check_block_value(cache.get(self.block_key))
 
 
 class BlockGlobalIpUtilBase:
@@ -102,29 +163,27 @@ class BlockGlobalIpUtilBase:
     def set_block_if_need(self):
         if self.ip_in_white_list or self.ip_in_black_list:
             return
-        count = cache.get(self.limit_key, 0)
-        count += 1
-        cache.set(self.limit_key, count, self.key_ttl)
-
-        limit_count = settings.SECURITY_LOGIN_IP_LIMIT_COUNT
-        if count < limit_count:
-            return
-        cache.set(self.block_key, timezone.now().isoformat(), self.key_ttl)
+        incr_sliding_window(self.limit_key, self.block_key, self.key_ttl, settings.SECURITY_LOGIN_IP_LIMIT_COUNT)
 
     def clean_block_if_need(self):
-        cache.delete(self.limit_key)
-        cache.delete(self.block_key)
+        cache.delete_many([self.limit_key, self.block_key])
 
-    def is_block(self):
+    def check_block_value(self, value):
         if self.ip_in_white_list:
             return False
         if self.ip_in_black_list:
             return True
-        return bool(cache.get(self.block_key))
+        return bool(value)
+
+    def is_block(self):
+        return self.check_block_value(cache.get(self.block_key))
 
     def get_block_info(self):
         try:
             data = cache.get(self.block_key)
+            if isinstance(data, int):
+                # 锁定时间戳，单位秒
+                return datetime.datetime.fromtimestamp(data, tz=datetime.timezone.utc)
             if data:
                 return parse_datetime(data)
             return "N/A"
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# project : xadmin-server
+# filename : backfill_login_city
+# author : ly_13
+# date : 10/18/2026
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils.translation import gettext_lazy as _
+
+from common.utils.ip import get_ip_city_many
+from system.models import UserLoginLog
+
+
+class Command(BaseCommand):
+    help = 'Backfill user login log city'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Recompute the city of all login logs')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options.get('batch_size')
+        queryset = UserLoginLog.objects.filter(ipaddress__isnull=False)
+        if not options.get('all'):
+            queryset = queryset.filter(Q(city__isnull=True) | Q(city__in=['', 'Unknown', str(_("Unknown"))]))
+        queryset = queryset.only('pk', 'ipaddress', 'city').order_by('pk')
+
+        # 按主键分批处理，每批相同 ip 只查询一次
+        last_pk = None
+        count = 0
+        while True:
+            batch_queryset = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+            objs = list(batch_queryset[:batch_size])
+            if not objs:
+                break
+            last_pk = objs[-1].pk
+            cities = get_ip_city_many([obj.ipaddress for obj in objs])
+            update_objs = []
+            for obj in objs:
+                city = str(cities.get(obj.ipaddress) or _("Unknown"))
+                if obj.city != city:
+                    obj.city = city
+                    update_objs.append(obj)
+            UserLoginLog.objects.bulk_update(update_objs, ['city'], batch_size=batch_size)
+            count += len(update_objs)
+            self.stdout.write(f"backfill login city {count} updated, last pk {last_pk}")
+        self.stdout.write(self.style.SUCCESS(f"backfill login city finished, {count} updated"))
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-18 18:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0010_modellabelfieldextension_field_read_only_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='uploadfile',
+            name='md5sum',
+            field=models.CharField(db_index=True, max_length=36, verbose_name='File md5sum'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.1.4 on 2026-10-18 18:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0011_uploadfile_md5sum_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_time', models.DateTimeField(auto_now_add=True, null=True, verbose_name='Created time')),
+                ('updated_time', models.DateTimeField(auto_now=True, null=True, verbose_name='Updated time')),
+                ('description', models.CharField(blank=True, max_length=256, null=True, verbose_name='Description')),
+                ('name', models.CharField(choices=[('login', 'User login'), ('operation', 'Operation log'), ('register', 'User register')], max_length=32, verbose_name='Rollup name')),
+                ('day', models.DateField(verbose_name='Day')),
+                ('count', models.BigIntegerField(default=0, verbose_name='Count')),
+            ],
+            options={
+                'verbose_name': 'Daily rollup',
+                'verbose_name_plural': 'Daily rollup',
+                'ordering': ('-day',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='operationlog',
+            index=models.Index(fields=['created_time'], name='system_oper_created_dbd54a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userloginlog',
+            index=models.Index(fields=['created_time'], name='system_user_created_f5a0ae_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyrollup',
+            constraint=models.UniqueConstraint(fields=('name', 'day'), name='unique_daily_rollup_name_day'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.4 on 2026-10-18 19:33
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0012_dailyrollup_log_created_time_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='operationlog',
+            name='created_time',
+            field=models.DateTimeField(blank=True, default=django.utils.timezone.now, null=True, verbose_name='Created time'),
+        ),
+    ]
@@ -8,6 +8,7 @@
 
 from .abstract import *
 from .config import *
+from .dashboard import *
 from .department import *
 from .field import *
 from .log import *
@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# project : xadmin-server
+# filename : dashboard
+# author : ly_13
+# date : 10/18/2026
+
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+from common.core.models import DbBaseModel
+
+
+class DailyRollup(DbBaseModel):
+    """面板统计的按天汇总数据，由定时任务增量更新，面板接口只读取汇总数据"""
+
+    class NameChoices(models.TextChoices):
+        LOGIN = 'login', _("User login")
+        OPERATION = 'operation', _("Operation log")
+        REGISTER = 'register', _("User register")
+
+    name = models.CharField(max_length=32, choices=NameChoices, verbose_name=_("Rollup name"))
+    day = models.DateField(verbose_name=_("Day"))
+    count = models.BigIntegerField(default=0, verbose_name=_("Count"))
+
+    class Meta:
+        verbose_name = _("Daily rollup")
+        verbose_name_plural = verbose_name
+        ordering = ('-day',)
+        constraints = [
+            models.UniqueConstraint(fields=['name', 'day'], name='unique_daily_rollup_name_day'),
+        ]
+
+    def __str__(self):
+        return f"{self.name}-{self.day}"
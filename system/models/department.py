@@ -5,16 +5,55 @@
 # author : ly_13
 # date : 8/10/2024
 
-import json
+from collections import defaultdict
 
 from django.db import models
 from django.utils.translation import gettext_lazy as _
-from rest_framework.utils import encoders
 
+from common.cache.storage import DeptTreeVersionCache
 from common.core.models import DbAuditModel, DbUuidModel
 from system.models import ModeTypeAbstract
 
 
+class DeptTreeIndex(object):
+    """
+    进程内的部门树索引，保存部门的父子邻接关系，查询上下级部门的复杂度为 O(结果数量)
+    部门变化时会递增 DeptTreeVersionCache 版本号，各进程在下次查询时重新加载
+    """
+
+    def __init__(self, version, dept_all_list):
+        self.version = version
+        self.parents = {}
+        self.children = defaultdict(list)
+        for dept in dept_all_list:
+            pk, parent = str(dept['pk']), dept['parent']
+            self.parents[pk] = str(parent) if parent else None
+            if parent:
+                self.children[str(parent)].append(pk)
+
+    def descendants(self, dept_id):
+        """包含自身及所有下级部门"""
+        result = [str(dept_id)]
+        seen = set(result)
+        for pk in result:
+            for child in self.children.get(pk, []):
+                if child not in seen:
+                    seen.add(child)
+                    result.append(child)
+        return result
+
+    def ancestors(self, dept_id):
+        """包含自身及所有上级部门"""
+        result = [str(dept_id)]
+        seen = set(result)
+        parent = self.parents.get(result[0])
+        while parent and parent not in seen:
+            seen.add(parent)
+            result.append(parent)
+            parent = self.parents.get(parent)
+        return result
+
+
 class DeptInfo(DbAuditModel, ModeTypeAbstract, DbUuidModel):
     name = models.CharField(verbose_name=_("Department name"), max_length=128)
     code = models.CharField(max_length=128, verbose_name=_("Department code"), unique=True)
@@ -28,22 +67,46 @@ class DeptInfo(DbAuditModel, ModeTypeAbstract, DbUuidModel):
                                         "If the value of the registration parameter channel is consistent with the department code, the user is automatically bound to the department"))
     is_active = models.BooleanField(verbose_name=_("Is active"), default=True)
 
+    _tree_index = None
+
     @classmethod
-    def recursion_dept_info(cls, dept_id: int, dept_all_list=None, dept_list=None, is_parent=False):
-        parent = 'parent'
-        pk = 'pk'
-        if is_parent:
-            parent, pk = pk, parent
-        if not dept_all_list:
-            dept_all_list = DeptInfo.objects.values("pk", "parent")
-        if dept_list is None:
-            dept_list = [dept_id]
-        for dept in dept_all_list:
-            if dept.get(parent) == dept_id:
-                if dept.get(pk):
-                    dept_list.append(dept.get(pk))
-                    cls.recursion_dept_info(dept.get(pk), dept_all_list, dept_list, is_parent)
-        return json.loads(json.dumps(list(set(dept_list)), cls=encoders.JSONEncoder))
+    def get_tree_index(cls) -> DeptTreeIndex:
+        version = DeptTreeVersionCache().get_version()
+        tree_index = cls._tree_index
+        if tree_index is None or tree_index.version != version:
+            tree_index = DeptTreeIndex(version, cls.objects.values("pk", "parent"))
+            DeptInfo._tree_index = tree_index
+        return tree_index
+
+    @classmethod
+    def invalid_tree_index(cls):
+        DeptTreeVersionCache().incr_version()
+        DeptInfo._tree_index = None
+
+    @classmethod
+    def descendants(cls, dept_id):
+        return cls.get_tree_index().descendants(dept_id)
+
+    @classmethod
+    def ancestors(cls, dept_id):
+        return cls.get_tree_index().ancestors(dept_id)
+
+    @classmethod
+    def recursion_dept_info(cls, dept_id, is_parent=False):
+        """
+        获取部门及其所有下级部门的ID，is_parent 为 True 时，获取部门及其所有上级部门的ID
+        :param dept_id: 部门ID，或部门ID列表
+        """
+        tree_index = cls.get_tree_index()
+        func = tree_index.ancestors if is_parent else tree_index.descendants
+        if not isinstance(dept_id, (list, tuple, set)):
+            return func(dept_id)
+        dept_list = []
+        for pk in dept_id:
+            if isinstance(pk, dict):
+                pk = pk.get('pk')
+            dept_list.extend(func(pk))
+        return list(dict.fromkeys(dept_list))
 
     class Meta:
         verbose_name = _("Department")
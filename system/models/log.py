@@ -35,6 +35,7 @@ class UserLoginLog(DbAuditModel):
         verbose_name = _("User login log")
         verbose_name_plural = verbose_name
         ordering = ('-created_time',)
+        indexes = [models.Index(fields=['created_time'])]
 
     @staticmethod
     def get_login_type(query_key):
@@ -50,6 +51,8 @@ class UserLoginLog(DbAuditModel):
 
 
 class OperationLog(DbAuditModel):
+    # 日志由后台线程批量写入，创建时间使用请求时间，不使用写入时间
+    created_time = models.DateTimeField(default=timezone.now, verbose_name=_("Created time"), null=True, blank=True)
     module = models.CharField(max_length=64, verbose_name=_("Module"), null=True, blank=True)
     path = models.CharField(max_length=400, verbose_name=_("URL path"), null=True, blank=True)
     body = models.TextField(verbose_name=_("Request body"), null=True, blank=True)
@@ -67,6 +70,7 @@ class OperationLog(DbAuditModel):
         verbose_name = _("Operation log")
         verbose_name_plural = verbose_name
         ordering = ("-created_time",)
+        indexes = [models.Index(fields=['created_time'])]
 
     def remove_expired(cls, clean_day=30 * 6):
         clean_time = timezone.now() - datetime.timedelta(days=clean_day)
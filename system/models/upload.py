@@ -14,13 +14,14 @@ from common.core.models import upload_directory_path, DbAuditModel, AutoCleanFil
 
 
 class UploadFile(AutoCleanFileMixin, DbAuditModel):
+    share_file = True  # 相同内容的文件共用底层存储，没有引用时才删除
     filepath = models.FileField(verbose_name=_("Filepath"), null=True, blank=True, upload_to=upload_directory_path)
     file_url = models.URLField(verbose_name=_("Internet URL"), max_length=255, blank=True, null=True,
                                help_text=_("Usually an address accessible to the outside Internet"))
     filename = models.CharField(verbose_name=_("Filename"), max_length=255)
     filesize = models.IntegerField(verbose_name=_("Filesize"))
     mime_type = models.CharField(max_length=255, verbose_name=_("Mime type"))
-    md5sum = models.CharField(max_length=36, verbose_name=_("File md5sum"))
+    md5sum = models.CharField(max_length=36, verbose_name=_("File md5sum"), db_index=True)
     is_tmp = models.BooleanField(verbose_name=_("Tmp file"), default=False,
                                  help_text=_("Temporary files are automatically cleared by scheduled tasks"))
     is_upload = models.BooleanField(verbose_name=_("Upload file"), default=False)
@@ -28,14 +29,37 @@ class UploadFile(AutoCleanFileMixin, DbAuditModel):
     def save(self, *args, **kwargs):
         self.filename = self.filename[:255]
         if not self.md5sum and not self.file_url:
-            md5 = hashlib.md5()
-            for chunk in self.filepath.chunks():
-                md5.update(chunk)
+            # 上传处理器已经计算过md5的，不再重新读取文件
+            md5sum = getattr(self.filepath.file, 'md5sum', None)
+            if not md5sum:
+                md5 = hashlib.md5()
+                for chunk in self.filepath.chunks():
+                    md5.update(chunk)
+                md5sum = md5.hexdigest()
             if not self.filesize:
                 self.filesize = self.filepath.size
-            self.md5sum = md5.hexdigest()
+            self.md5sum = md5sum
         return super().save(*args, **kwargs)
 
+    @classmethod
+    def get_shared_filepath(cls, md5sum, filesize, queryset=None):
+        """获取相同内容的已存储文件，queryset 用于限制可以引用的文件范围"""
+        storage = cls._meta.get_field('filepath').storage
+        if queryset is None:
+            queryset = cls.objects.all()
+        queryset = queryset.filter(md5sum=md5sum, filesize=filesize, is_upload=True).exclude(filepath='')
+        for name in queryset.values_list('filepath', flat=True).distinct()[:3]:
+            if name and storage.exists(name):
+                return name
+
+    @classmethod
+    def build_from_upload(cls, file_obj, **kwargs):
+        """根据上传文件构建对象，内容相同的文件直接引用已存储的文件"""
+        md5sum = getattr(file_obj, 'md5sum', '')
+        filepath = md5sum and cls.get_shared_filepath(md5sum, file_obj.size) or file_obj
+        return cls(filename=file_obj.name, filepath=filepath, md5sum=md5sum, mime_type=file_obj.content_type,
+                   filesize=file_obj.size, is_upload=True, **kwargs)
+
     class Meta:
         verbose_name = _("Upload file")
         verbose_name_plural = verbose_name
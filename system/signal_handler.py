@@ -7,13 +7,17 @@
 import itertools
 
 from django.contrib.auth import user_logged_out
-from django.db.models.signals import post_save, pre_delete
+from django.db.models.signals import post_save, pre_delete, m2m_changed
 from django.dispatch import receiver
 
-from common.base.magic import cache_response, MagicCacheData
+from common.base.magic import MagicCacheData
+from common.cache.storage import DataPermissionVersionCache, SearchColumnsVersionCache, MenuRouteVersionCache, \
+    AuthUserCache
 from common.core.config import SysConfig
+from common.decorators import on_transaction_commit
 from common.utils import get_logger
-from system.models import Menu, UserRole, UserInfo, DeptInfo, SystemConfig
+from system.models import Menu, MenuMeta, UserRole, UserInfo, DeptInfo, SystemConfig, DataPermission, \
+    ModelLabelField, ModelLabelFieldExtension, ModelSeparationField
 from system.signal import invalid_user_cache_signal
 
 logger = get_logger(__name__)
@@ -25,19 +29,19 @@ def get_cache_data_keys(pks):
             yield f'get_user_permission_{pk}_{method}'
 
 
-def get_cache_response_keys(pks):
-    for pk in pks:
-        yield f'UserRoutesAPIView_get_{pk}'
+@on_transaction_commit
+def invalid_auth_user_cache(pks, batch_length=1000):
+    # 认证时缓存的用户信息，事务提交后再删除，避免并发请求在提交前重新缓存旧的用户信息
+    for data in itertools.batched(pks, batch_length):
+        AuthUserCache.del_many_storage_cache([AuthUserCache(pk).cache_key for pk in data])
 
 
 def batch_invalid_cache(pks, batch_length=1000):
-    cleans = [
-        (MagicCacheData.invalid_caches, get_cache_data_keys(pks)),
-        (cache_response.invalid_caches, get_cache_response_keys(pks))
-    ]
-    for keys in cleans:
-        for data in itertools.batched(keys[1], batch_length):
-            keys[0](data)
+    pks = list(pks)
+    for data in itertools.batched(get_cache_data_keys(pks), batch_length):
+        MagicCacheData.invalid_caches(data)
+    invalid_auth_user_cache(pks, batch_length)
+
 
 @receiver([post_save, pre_delete], sender=Menu)
 def clean_cache_handler(sender, instance, **kwargs):
@@ -68,12 +72,87 @@ def invalid_dept_cache_handler(sender, instance, **kwargs):
     logger.info(f"invalid cache {instance}")
 
 
+@on_transaction_commit
+def incr_data_permission_version():
+    DataPermissionVersionCache().incr_version()
+
+
+@on_transaction_commit
+def invalid_dept_tree_index():
+    DeptInfo.invalid_tree_index()
+
+
+@receiver([post_save, pre_delete], sender=DeptInfo)
+def invalid_dept_tree_index_handler(sender, instance, **kwargs):
+    invalid_dept_tree_index()
+
+
+@receiver([post_save, pre_delete], sender=DataPermission)
+@receiver([post_save, pre_delete], sender=DeptInfo)
+def invalid_data_permission_cache_handler(sender, instance, **kwargs):
+    incr_data_permission_version()
+    logger.info(f"invalid data permission cache {instance}")
+
+
+@receiver(m2m_changed, sender=DataPermission.menu.through)
+@receiver(m2m_changed, sender=DeptInfo.rules.through)
+@receiver(m2m_changed, sender=UserInfo.rules.through)
+def invalid_data_permission_m2m_cache_handler(sender, instance, **kwargs):
+    if kwargs.get('action') in ['post_add', 'post_remove', 'post_clear']:
+        incr_data_permission_version()
+        logger.info(f"invalid data permission cache {instance}")
+
+
+@on_transaction_commit
+def incr_search_columns_version():
+    SearchColumnsVersionCache().incr_version()
+
+
+@receiver([post_save, pre_delete], sender=ModelLabelField)
+@receiver([post_save, pre_delete], sender=ModelLabelFieldExtension)
+@receiver([post_save, pre_delete], sender=ModelSeparationField)
+def invalid_search_columns_cache_handler(sender, instance, **kwargs):
+    incr_search_columns_version()
+
+
+@on_transaction_commit
+def incr_menu_route_version():
+    MenuRouteVersionCache().incr_version()
+
+
+@receiver([post_save, pre_delete], sender=Menu)
+@receiver([post_save, pre_delete], sender=MenuMeta)
+@receiver([post_save, pre_delete], sender=UserRole)
+@receiver([post_save, pre_delete], sender=DeptInfo)
+def invalid_menu_route_cache_handler(sender, instance, **kwargs):
+    incr_menu_route_version()
+
+
+@receiver(m2m_changed, sender=UserRole.menu.through)
+@receiver(m2m_changed, sender=DeptInfo.roles.through)
+def invalid_menu_route_m2m_cache_handler(sender, instance, **kwargs):
+    if kwargs.get('action') in ['post_add', 'post_remove', 'post_clear']:
+        incr_menu_route_version()
+
+
 @receiver([post_save, pre_delete], sender=UserInfo)
 def invalid_user_cache_handler(sender, instance, **kwargs):
     batch_invalid_cache([instance.pk])
     logger.info(f"invalid cache {instance}")
 
 
+@receiver(m2m_changed, sender=UserInfo.roles.through)
+def invalid_user_role_cache_handler(sender, instance, action, **kwargs):
+    if isinstance(instance, UserInfo):
+        if action in ['post_add', 'post_remove', 'post_clear']:
+            batch_invalid_cache([instance.pk])
+    elif action in ['post_add', 'post_remove']:
+        batch_invalid_cache(list(kwargs.get('pk_set')))
+    elif action == 'pre_clear':
+        # 从角色一侧清空用户时没有 pk_set，需要在清空前查询
+        batch_invalid_cache(list(instance.userinfo_set.values_list('pk', flat=True)))
+
+
 # 清理用户相关缓存，用户登出会自动清理
 @receiver([invalid_user_cache_signal, user_logged_out])
 def invalid_user_cache(sender, **kwargs):
@@ -6,10 +6,12 @@
 # date : 6/29/2023
 
 from celery import shared_task
+from django.utils.translation import gettext_lazy as _
 
 from common.celery.decorator import register_as_period_task
 from common.utils import get_logger
 from system.utils.ctasks import auto_clean_operation_log, auto_clean_black_token, auto_clean_tmp_file
+from system.utils.dashboard import refresh_daily_rollups
 
 logger = get_logger(__name__)
 
@@ -30,3 +32,9 @@ def auto_clean_black_token_job():
 @register_as_period_task(crontab='32 2 * * *')
 def auto_clean_tmp_file_job():
     auto_clean_tmp_file(clean_day=7)
+
+
+@shared_task(verbose_name=_("Refresh dashboard daily rollups"))
+@register_as_period_task(interval=300)
+def refresh_dashboard_rollup_job():
+    refresh_daily_rollups()
@@ -0,0 +1,83 @@
+import mock
+from django.contrib.auth import user_logged_out
+from django.test import TestCase
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+
+from common.cache.storage import AuthUserCache
+from common.core.auth import CookieJWTAuthentication, ServerAccessToken
+from system.models import UserInfo, UserRole
+
+
+class AuthUserCacheTests(TestCase):
+
+    def setUp(self):
+        self.user = UserInfo.objects.create_user(username='cache_user', password='password123')
+        self.role = UserRole.objects.create(name='cache_role', code='cache_role')
+        self.token = str(ServerAccessToken.for_user(self.user)).encode('utf-8')
+        self.addCleanup(AuthUserCache(self.user.pk).del_storage_cache)
+        AuthUserCache(self.user.pk).del_storage_cache()
+
+    def authenticate(self):
+        auth = CookieJWTAuthentication()
+        return auth.get_user(auth.get_validated_token(self.token))
+
+    def get_snapshot(self):
+        return AuthUserCache(self.user.pk).get_storage_cache()
+
+    def test_cache_snapshot(self):
+        self.authenticate()
+        self.assertIsNotNone(self.get_snapshot())
+        user_obj = self.authenticate()
+        self.assertEqual(user_obj.pk, self.user.pk)
+        self.assertEqual(user_obj.role_ids, [])
+
+    def test_check_revoke_token(self):
+        with mock.patch.object(api_settings, 'CHECK_REVOKE_TOKEN', True):
+            self.token = str(ServerAccessToken.for_user(self.user)).encode('utf-8')
+            # 需要校验用户密码，每次都查询数据库，不写入用户缓存
+            with self.assertNumQueries(1):
+                self.assertEqual(self.authenticate().pk, self.user.pk)
+            self.assertIsNone(self.get_snapshot())
+
+    def test_deactivate_user(self):
+        self.authenticate()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save(update_fields=['is_active'])
+            # 事务提交后才删除缓存，提交前的并发请求不会重新缓存旧数据
+            self.assertIsNotNone(self.get_snapshot())
+        self.assertIsNone(self.get_snapshot())
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_change_roles_from_user(self):
+        self.authenticate()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.roles.add(self.role)
+        self.assertIsNone(self.get_snapshot())
+        self.authenticate()
+        self.assertEqual(self.authenticate().role_ids, [self.role.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.roles.remove(self.role)
+        self.assertIsNone(self.get_snapshot())
+
+    def test_change_roles_from_role(self):
+        self.authenticate()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.role.userinfo_set.add(self.user)
+        self.assertIsNone(self.get_snapshot())
+
+        self.authenticate()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.role.userinfo_set.clear()
+        self.assertIsNone(self.get_snapshot())
+        self.authenticate()
+        self.assertEqual(self.authenticate().role_ids, [])
+
+    def test_logout(self):
+        self.authenticate()
+        with self.captureOnCommitCallbacks(execute=True):
+            user_logged_out.send(sender=UserInfo, request=None, user=self.user)
+        self.assertIsNone(self.get_snapshot())
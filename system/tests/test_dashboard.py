@@ -0,0 +1,136 @@
+import collections
+import datetime
+
+from django.db import IntegrityError
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from common.cache.storage import DashboardRollupVersionCache
+from system.models import UserInfo, UserLoginLog, OperationLog, DailyRollup
+from system.utils.dashboard import refresh_daily_rollups, get_rollup_trend, get_day_start, clean_daily_rollup
+
+
+class DailyRollupTests(APITestCase):
+
+    def setUp(self):
+        self.today = timezone.localdate()
+        self.admin = UserInfo.objects.create_superuser(username='rollup_admin', password='password123')
+        for days in [0, 1, 1, 3, 40]:
+            self.create_data(days)
+
+    def get_time(self, days):
+        if days == 0:
+            return timezone.now()
+        return get_day_start(self.today - datetime.timedelta(days=days)) + datetime.timedelta(hours=1)
+
+    def create_data(self, days):
+        created_time = self.get_time(days)
+        login_log = UserLoginLog.objects.create(creator=self.admin)
+        operation_log = OperationLog.objects.create(path='/rollup')
+        user = UserInfo.objects.create_user(username=f'rollup_{UserInfo.objects.count()}', password='password123')
+        # created_time 自动设置为当前时间，需要单独更新
+        for obj in [login_log, operation_log, user]:
+            obj.__class__.objects.filter(pk=obj.pk).update(created_time=created_time)
+        return user
+
+    @staticmethod
+    def raw_counts(model):
+        """直接查询源数据，按本地日期统计"""
+        return dict(collections.Counter(timezone.localdate(created_time) for created_time in
+                                        model.objects.values_list('created_time', flat=True)))
+
+    @staticmethod
+    def rollup_counts(name):
+        return dict(DailyRollup.objects.filter(name=name).values_list('day', 'count'))
+
+    def refresh(self):
+        version = DashboardRollupVersionCache().get_version()
+        refresh_daily_rollups()
+        self.assertEqual(DashboardRollupVersionCache().get_version(), version + 1)
+
+    def assert_rollups(self):
+        for name, model in [(DailyRollup.NameChoices.LOGIN, UserLoginLog),
+                            (DailyRollup.NameChoices.OPERATION, OperationLog),
+                            (DailyRollup.NameChoices.REGISTER, UserInfo)]:
+            self.assertEqual(self.rollup_counts(name), self.raw_counts(model))
+
+    def test_model(self):
+        rollup = DailyRollup.objects.create(name=DailyRollup.NameChoices.LOGIN, day=self.today, count=1)
+        self.assertEqual(str(rollup), f"login-{self.today}")
+        with self.assertRaises(IntegrityError):
+            DailyRollup.objects.create(name=DailyRollup.NameChoices.LOGIN, day=self.today, count=2)
+
+    def test_refresh(self):
+        self.refresh()
+        self.assert_rollups()
+        self.assertEqual(self.rollup_counts(DailyRollup.NameChoices.LOGIN)[self.today - datetime.timedelta(days=1)],
+                         2)
+
+        # 增量汇总时重新汇总最后一天和前一天，补齐延迟写入的数据
+        self.create_data(0)
+        self.create_data(1)
+        self.refresh()
+        self.assert_rollups()
+
+        # 用户全量汇总，删除用户后汇总数据同步减少
+        UserInfo.objects.filter(username__startswith='rollup_').exclude(pk=self.admin.pk).filter(
+            created_time__lt=get_day_start(self.today - datetime.timedelta(days=30))).delete()
+        self.refresh()
+        self.assert_rollups()
+
+    def test_clean_rollup(self):
+        self.refresh()
+        clean_time = timezone.now() - datetime.timedelta(days=30)
+        OperationLog.objects.filter(created_time__lt=clean_time).delete()
+        self.assertEqual(clean_daily_rollup(DailyRollup.NameChoices.OPERATION, clean_time), 1)
+        self.assertEqual(self.rollup_counts(DailyRollup.NameChoices.OPERATION), self.raw_counts(OperationLog))
+
+    def test_rollup_trend(self):
+        self.refresh()
+        version = DashboardRollupVersionCache().get_version()
+        results, count = get_rollup_trend(DailyRollup.NameChoices.LOGIN, 7, self.today, version)
+        raw_counts = self.raw_counts(UserLoginLog)
+        self.assertEqual(count, UserLoginLog.objects.count())
+        self.assertEqual(results, [
+            {'day': day.strftime('%m-%d'), 'count': raw_counts.get(day, 0)}
+            for day in [self.today - datetime.timedelta(days=i) for i in range(7, -1, -1)]
+        ])
+        self.assertEqual(results[-2]['count'], 2)
+
+        # 相同版本号直接读取缓存
+        self.create_data(0)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_rollup_trend(DailyRollup.NameChoices.LOGIN, 7, self.today, version),
+                             (results, count))
+        self.refresh()
+        version = DashboardRollupVersionCache().get_version()
+        self.assertEqual(get_rollup_trend(DailyRollup.NameChoices.LOGIN, 7, self.today, version)[1], count + 1)
+
+    def test_dashboard_view(self):
+        self.refresh()
+        self.client.force_authenticate(user=self.admin)
+        for url, model in [('user-login-total', UserLoginLog), ('user-total', UserInfo),
+                           ('today-operate-total', OperationLog)]:
+            data = self.client.get(f'/api/system/dashboard/{url}', HTTP_USER_AGENT='Mozilla/5.0 (test)').json()
+            self.assertEqual(data['count'], model.objects.count())
+            raw_counts = self.raw_counts(model)
+            self.assertEqual([item['count'] for item in data['results']],
+                             [raw_counts.get(self.today - datetime.timedelta(days=i), 0) for i in range(7, -1, -1)])
+
+    def test_user_active(self):
+        now = timezone.now()
+        for days, user in zip([0, 2, 5, 20], UserInfo.objects.filter(username__startswith='rollup_')):
+            UserInfo.objects.filter(pk=user.pk).update(last_login=now - datetime.timedelta(days=days),
+                                                      date_joined=now - datetime.timedelta(days=days))
+        self.client.force_authenticate(user=self.admin)
+        data = self.client.get('/api/system/dashboard/user-active', HTTP_USER_AGENT='Mozilla/5.0 (test)').json()
+
+        # 与逐个时间段单独查询的结果一致
+        expected = []
+        for date in [1, 3, 7, 30]:
+            x_day = now - datetime.timedelta(days=date - 1, hours=now.hour, minutes=now.minute, seconds=now.second,
+                                             microseconds=now.microsecond)
+            expected.append([date, UserInfo.objects.filter(date_joined__gte=x_day).count(),
+                             UserInfo.objects.filter(last_login__gte=x_day).count()])
+        self.assertEqual(data['data'], expected)
+        self.assertEqual([item[2] for item in expected], [1, 2, 3, 4])
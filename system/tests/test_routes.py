@@ -0,0 +1,127 @@
+import mock
+from django.core.cache import cache
+from rest_framework import permissions
+from rest_framework.test import APITestCase
+
+from system.models import UserInfo, UserRole, DeptInfo, Menu, MenuMeta
+from system.views.admin.menu import MenuViewSet
+from system.views.routes import get_route_signature
+
+
+class UserRoutesCacheTests(APITestCase):
+
+    def setUp(self):
+        permission_patch = mock.patch.object(MenuViewSet, 'permission_classes', [permissions.IsAuthenticated])
+        permission_patch.start()
+        self.addCleanup(permission_patch.stop)
+
+        self.directory = self.create_menu('system', Menu.MenuChoices.DIRECTORY, rank=1)
+        self.user_menu = self.create_menu('user', Menu.MenuChoices.MENU, rank=1, parent=self.directory)
+        self.role_menu = self.create_menu('role', Menu.MenuChoices.MENU, rank=2, parent=self.directory)
+        self.permission = self.create_menu('user:list', Menu.MenuChoices.PERMISSION, rank=1, parent=self.user_menu)
+        self.role = UserRole.objects.create(name='route_role', code='route_role')
+        self.role.menu.add(self.directory, self.user_menu, self.role_menu, self.permission)
+        self.dept = DeptInfo.objects.create(name='route_dept', code='route_dept')
+        self.dept.roles.add(self.role)
+
+        self.user = UserInfo.objects.create_user(username='route_user', password='password123')
+        self.user.roles.add(self.role)
+        self.dept_user = UserInfo.objects.create_user(username='route_dept_user', password='password123',
+                                                      dept=self.dept)
+
+    @staticmethod
+    def create_menu(name, menu_type, rank, parent=None):
+        meta = MenuMeta.objects.create(title=name)
+        return Menu.objects.create(name=name, path=f'/{name}', menu_type=menu_type, rank=rank, parent=parent,
+                                   meta=meta)
+
+    def get_routes(self, user):
+        self.client.force_authenticate(user=user)
+        return self.client.get('/api/system/routes', HTTP_USER_AGENT='Mozilla/5.0 (test)').json()
+
+    def get_children(self, user):
+        data = self.get_routes(user)['data']
+        self.assertEqual(len(data), 1)
+        return [item['name'] for item in data[0]['children']]
+
+    def test_share_routes(self):
+        other = UserInfo.objects.create_user(username='route_other', password='password123', dept=self.dept)
+        other.roles.add(self.role)
+        self.user.dept = self.dept
+        self.user.save(update_fields=['dept'])
+        self.assertEqual(get_route_signature(self.user), get_route_signature(other))
+
+        routes = self.get_routes(self.user)
+        self.assertEqual(routes['auths'], ['user:list'])
+        self.assertEqual(self.get_children(self.user), ['user', 'role'])
+        # 相同角色和部门的用户共用一份路由树，不再查询菜单
+        with mock.patch('system.views.routes.Menu.objects.filter') as menu_filter:
+            other_routes = self.get_routes(other)
+        menu_filter.assert_not_called()
+        self.assertEqual((other_routes['data'], other_routes['auths']), (routes['data'], routes['auths']))
+
+    def test_dept_routes(self):
+        self.assertNotEqual(get_route_signature(self.user)[0], get_route_signature(self.dept_user)[0])
+        self.assertEqual(self.get_children(self.dept_user), ['user', 'role'])
+        self.assertEqual(self.get_routes(self.dept_user)['auths'], ['user:list'])
+
+    def test_invalid_after_menu_change(self):
+        self.assertEqual(self.get_children(self.user), ['user', 'role'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.role_menu.is_active = False
+            self.role_menu.save(update_fields=['is_active'])
+        self.assertEqual(self.get_children(self.user), ['user'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user_menu.meta.title = 'users'
+            self.user_menu.meta.save(update_fields=['title'])
+        self.assertEqual(self.get_routes(self.user)['data'][0]['children'][0]['meta']['title'], 'users')
+
+    def test_stale_while_refreshing(self):
+        self.assertEqual(self.get_children(self.user), ['user', 'role'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.role_menu.is_active = False
+            self.role_menu.save(update_fields=['is_active'])
+        # 菜单版本号变化后，其他进程正在重新生成时返回旧的路由树
+        refresh_key = f"refresh_magic_cache_data_get_role_routes_{get_route_signature(self.user)[0]}"
+        cache.add(refresh_key, 1, 60)
+        self.addCleanup(cache.delete, refresh_key)
+        self.assertEqual(self.get_children(self.user), ['user', 'role'])
+        cache.delete(refresh_key)
+        self.assertEqual(self.get_children(self.user), ['user'])
+
+    def test_invalid_after_role_and_dept_change(self):
+        self.assertEqual(self.get_children(self.user), ['user', 'role'])
+        self.assertEqual(self.get_children(self.dept_user), ['user', 'role'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.dept.is_active = False
+            self.dept.save(update_fields=['is_active'])
+        self.assertEqual(self.get_routes(self.dept_user)['data'], [])
+        self.assertEqual(self.get_children(self.user), ['user', 'role'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.role.is_active = False
+            self.role.save(update_fields=['is_active'])
+        self.assertEqual(self.get_routes(self.user)['data'], [])
+
+    def test_invalid_after_m2m_change(self):
+        self.assertEqual(self.get_routes(self.user)['auths'], ['user:list'])
+        self.assertEqual(self.get_children(self.dept_user), ['user', 'role'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.role.menu.remove(self.permission)
+        self.assertEqual(self.get_routes(self.user)['auths'], [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.dept.roles.clear()
+        self.assertEqual(self.get_routes(self.dept_user)['data'], [])
+
+    def test_invalid_after_rank(self):
+        self.assertEqual(self.get_children(self.user), ['user', 'role'])
+        superuser = UserInfo.objects.create_superuser(username='route_admin', password='password123')
+        self.client.force_authenticate(user=superuser)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/system/menu/rank', [str(self.role_menu.pk), str(self.user_menu.pk)],
+                                        format='json', HTTP_USER_AGENT='Mozilla/5.0 (test)')
+        self.assertEqual(response.json()['code'], 1000)
+        # 排序使用批量更新，不触发 save 信号，需要单独让路由缓存失效
+        self.assertEqual(self.get_children(self.user), ['role', 'user'])
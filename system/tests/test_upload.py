@@ -0,0 +1,61 @@
+import hashlib
+import shutil
+import tempfile
+
+import mock
+from django.core.files.base import ContentFile
+from django.test import override_settings
+from rest_framework import permissions
+from rest_framework.test import APITestCase, APIRequestFactory, force_authenticate
+
+from system.models import UserInfo, UploadFile
+from system.views.admin.file import UploadFileViewSet
+
+
+class ChunkInitShareFileTests(APITestCase):
+    content = b'user a secret file'
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        # 只测试文件引用逻辑，菜单权限由 IsAuthenticated 单独控制
+        permission_patch = mock.patch.object(UploadFileViewSet, 'permission_classes', [permissions.IsAuthenticated])
+        permission_patch.start()
+        self.addCleanup(permission_patch.stop)
+        # 上传大小限制来自系统配置，测试数据库中没有初始化配置
+        size_patch = mock.patch('system.views.admin.file.get_upload_max_size', return_value=1024 * 1024)
+        size_patch.start()
+        self.addCleanup(size_patch.stop)
+
+        self.user_a = UserInfo.objects.create_user(username='user_a', password='password123')
+        self.user_b = UserInfo.objects.create_user(username='user_b', password='password123')
+        self.file_a = UploadFile(filename='a.txt', filepath=ContentFile(self.content, name='a.txt'),
+                                 mime_type='text/plain', filesize=len(self.content), is_upload=True,
+                                 creator=self.user_a)
+        self.file_a.save(force_insert=True)
+
+    def chunk_init(self, user):
+        request = APIRequestFactory().post('/api/system/file/chunk-init', {
+            'filename': 'b.txt',
+            'filesize': len(self.content),
+            'md5sum': hashlib.md5(self.content).hexdigest(),
+        }, format='json', HTTP_USER_AGENT='Mozilla/5.0 (test)')
+        force_authenticate(request, user=user)
+        return UploadFileViewSet.as_view({'post': 'chunk_init'})(request)
+
+    def test_claim_other_user_file_by_md5(self):
+        response = self.chunk_init(self.user_b)
+        self.assertEqual(response.data['code'], 1000)
+        # 不能直接引用其他用户的文件，需要上传文件内容
+        self.assertNotIn('file', response.data['data'])
+        self.assertIn('upload_id', response.data['data'])
+        self.assertFalse(UploadFile.objects.filter(creator=self.user_b).exists())
+
+    def test_reuse_own_file_by_md5(self):
+        response = self.chunk_init(self.user_a)
+        self.assertEqual(response.data['code'], 1000)
+        obj = UploadFile.objects.get(pk=response.data['data']['file']['pk'])
+        self.assertEqual(obj.filepath.name, self.file_a.filepath.name)
@@ -9,15 +9,14 @@ import ipaddress
 from django.conf import settings
 from django.utils.translation import gettext_lazy as _
 from rest_framework.exceptions import APIException
-from user_agents import parse
 
 from captcha.utils import CaptchaAuth
 from common.base.utils import AESCipherV2
 from common.utils.ip import get_ip_city
-from common.utils.request import get_request_ip, get_browser, get_os, get_request_ident
+from common.utils.request import get_request_ip, get_request_ident, get_user_agent
 from common.utils.token import verify_token_cache
 from common.utils.verify_code import TokenTempCache, SendAndVerifyCodeUtil
-from settings.utils.security import LoginIpBlockUtil, LoginBlockUtil
+from settings.utils.security import LoginIpBlockUtil, LoginBlockUtil, get_block_many
 from system.models import UserLoginLog, UserInfo
 from system.notifications import DifferentCityLoginMessage
 from system.serializers.log import LoginLogSerializer
@@ -66,12 +65,20 @@ def get_username_password(need, request, token):
 
 
 def check_is_block(username, ipaddr, ip_block=LoginIpBlockUtil, login_block=LoginBlockUtil):
-    if ip_block and ip_block(ipaddr).is_block():
-        ip_block(ipaddr).set_block_if_need()
+    # ip 和账户的锁定状态通过一次 MGET 查询
+    block_utils = []
+    if ip_block:
+        block_utils.append(ip_block(ipaddr))
+    if login_block:
+        block_utils.append(login_block(username, ipaddr))
+    blocks = get_block_many(block_utils)
+
+    if ip_block and blocks[0]:
+        block_utils[0].set_block_if_need()
         raise APIException(_("The address has been locked (please contact admin to unlock it or try"
                              " again after {} minutes)").format(settings.SECURITY_LOGIN_IP_LIMIT_TIME))
 
-    if login_block and login_block(username, ipaddr).is_block():
+    if login_block and blocks[-1]:
         raise APIException(_("The account has been locked (please contact admin to unlock it or try"
                              " again after {} minutes)").format(settings.SECURITY_LOGIN_LIMIT_TIME))
 
@@ -80,13 +87,14 @@ def save_login_log(request, login_type=UserLoginLog.LoginTypeChoices.USERNAME, s
     login_ip = get_request_ip(request) if request else ''
     login_ip = login_ip or '0.0.0.0'
     login_city = get_ip_city(login_ip) or _("Unknown")
+    user_agent = get_user_agent(request)
     data = {
         'ipaddress': login_ip,
         'city': str(login_city),
-        'browser': get_browser(request),
-        'system': get_os(request),
+        'browser': user_agent['browser'],
+        'system': user_agent['os'],
         'status': status,
-        'agent': str(parse(request.META['HTTP_USER_AGENT'])),
+        'agent': user_agent['agent'],
         'login_type': login_type
     }
     serializer = LoginLogSerializer(data=data, ignore_field_permission=True)
@@ -116,11 +124,10 @@ def verify_sms_email_code(request, block_utils):
     try:
         SendAndVerifyCodeUtil(target).verify(verify_code)
     except Exception as e:
-        block_util.incr_failed_count()
+        times_remainder = block_util.incr_failed_count()
         ip_block.set_block_if_need()
         request.user = UserInfo.objects.filter(**{query_key: target}).first()
         save_login_log(request, login_type=UserLoginLog.get_login_type(query_key), status=False)
-        times_remainder = block_util.get_remainder_times()
         if times_remainder > 0:
             detail = _(
                 "{error} please enter it again. "
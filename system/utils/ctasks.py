@@ -11,13 +11,17 @@ from celery.utils.log import get_task_logger
 from django.utils import timezone
 from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
 
-from system.models import OperationLog, UploadFile
+from common.core.upload import ChunkedUpload
+from system.models import OperationLog, UploadFile, DailyRollup
+from system.utils.dashboard import clean_daily_rollup
 
 logger = get_task_logger(__name__)
 
 
 def auto_clean_operation_log(clean_day=30 * 6):
-    return OperationLog.remove_expired(clean_day)
+    OperationLog.remove_expired(clean_day)
+    clean_time = timezone.now() - datetime.timedelta(days=clean_day)
+    clean_daily_rollup(DailyRollup.NameChoices.OPERATION, clean_time)
 
 
 def auto_clean_black_token(clean_day=1):
@@ -33,3 +37,4 @@ def auto_clean_tmp_file(clean_day=1):
         if instance.delete():
             _rows_count += 1
     logger.info(f"clean {_rows_count} upload tmp file")
+    logger.info(f"clean {ChunkedUpload.clean_expired()} expired chunked upload")
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# project : xadmin-server
+# filename : dashboard
+# author : ly_13
+# date : 10/18/2026
+import datetime
+
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from common.base.magic import MagicCacheData
+from common.cache.storage import DashboardRollupVersionCache
+from common.utils import get_logger
+from system.models import DailyRollup, UserLoginLog, OperationLog, UserInfo
+
+logger = get_logger(__name__)
+
+# 汇总数据来源，(模型, 是否全量汇总)。日志只增不改，增量汇总；用户可能被删除，数据量小，全量汇总
+ROLLUP_SOURCES = {
+    DailyRollup.NameChoices.LOGIN: (UserLoginLog, False),
+    DailyRollup.NameChoices.OPERATION: (OperationLog, False),
+    DailyRollup.NameChoices.REGISTER: (UserInfo, True),
+}
+
+
+def get_day_start(day):
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+def refresh_daily_rollup(name):
+    """
+    按天汇总数据，增量汇总时从已汇总的最后一天的前一天开始重新汇总，补齐延迟写入的数据
+    """
+    model, full = ROLLUP_SOURCES[name]
+    queryset = model.objects.filter(created_time__isnull=False)
+    last_day = None
+    if not full:
+        last_day = DailyRollup.objects.filter(name=name).aggregate(day=Max('day'))['day']
+    if last_day:
+        queryset = queryset.filter(created_time__gte=get_day_start(last_day - datetime.timedelta(days=1)))
+    data_count = queryset.annotate(day=TruncDate('created_time')).values('day').annotate(
+        count=Count('pk')).order_by()
+    rollups = [DailyRollup(name=name, day=item['day'], count=item['count']) for item in data_count]
+    with transaction.atomic():
+        if full:
+            DailyRollup.objects.filter(name=name).exclude(day__in=[item.day for item in rollups]).delete()
+        DailyRollup.objects.bulk_create(rollups, batch_size=1000, update_conflicts=True,
+                                        unique_fields=['name', 'day'], update_fields=['count', 'updated_time'])
+    return len(rollups)
+
+
+def refresh_daily_rollups():
+    for name in ROLLUP_SOURCES:
+        count = refresh_daily_rollup(name)
+        logger.info(f"refresh {name} daily rollup {count} days")
+    DashboardRollupVersionCache().incr_version()
+
+
+def clean_daily_rollup(name, clean_time):
+    """源数据被清理后，同步清理汇总数据，保证汇总总数和源数据一致"""
+    deleted, _ = DailyRollup.objects.filter(name=name, day__lt=timezone.localdate(clean_time)).delete()
+    return deleted
+
+
+def get_trend_percent(results):
+    if len(results) > 1:
+        y = results[-2].get('count')
+        return round(100 * (results[-1].get('count') - y) / 1 if y == 0 else y)
+    return 0
+
+
+@MagicCacheData.make_cache(timeout=3600 * 24, single_flight=True,
+                           key_func=lambda name, limit_day, day, version: f"{name}_{limit_day}_{day}_{version}")
+def get_rollup_trend(name, limit_day, day, version):
+    """
+    从汇总数据获取最近 limit_day 天的趋势和总数，按 (日期, 汇总版本号) 缓存
+    :return: ([{'day': '10-18', 'count': 1}], 总数)
+    """
+    start_day = day - datetime.timedelta(days=limit_day)
+    queryset = DailyRollup.objects.filter(name=name)
+    dict_count = dict(queryset.filter(day__gte=start_day, day__lte=day).values_list('day', 'count'))
+    results = []
+    for i in range(limit_day + 1):
+        date = start_day + datetime.timedelta(days=i)
+        results.append({'day': date.strftime('%m-%d'), 'count': dict_count.get(date, 0)})
+    return results, queryset.aggregate(total=Sum('count'))['total'] or 0
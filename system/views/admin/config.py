@@ -62,3 +62,4 @@ class UserPersonalConfigViewSet(SystemConfigViewSet):
     filterset_class = UserPersonalConfigFilter
     import_data_serializer_class = UserPersonalConfigExportImportSerializer
     export_data_serializer_class = UserPersonalConfigExportImportSerializer
+    import_data_bulk_write = True  # 用户配置没有 post_save 信号
@@ -5,6 +5,7 @@
 # author : ly_13
 # date : 7/24/2024
 
+from django.db import transaction
 from django.utils.translation import gettext_lazy as _
 from django_filters import rest_framework as filters
 from drf_spectacular.plumbing import build_object_type, build_basic_type, build_array_type
@@ -15,10 +16,11 @@ from rest_framework.decorators import action
 from rest_framework.parsers import MultiPartParser
 
 from common.core.config import SysConfig, UserConfig
-from common.core.filter import BaseFilterSet
+from common.core.filter import BaseFilterSet, get_filter_queryset
 from common.core.modelset import BaseModelSet
 from common.core.response import ApiResponse
 from common.core.throttle import UploadThrottle
+from common.core.upload import ChunkedUpload
 from common.swagger.utils import get_default_response_schema
 from common.utils import get_logger
 from system.models import UploadFile
@@ -78,7 +80,6 @@ class UploadFileViewSet(BaseModelSet):
         """上传文件"""
 
         files = request.FILES.getlist('file', [])
-        result = []
         file_upload_max_size = get_upload_max_size(request.user)
         for file_obj in files:
             try:
@@ -88,7 +89,129 @@ class UploadFileViewSet(BaseModelSet):
             except Exception as e:
                 logger.error(f"user:{request.user} upload file type error Exception:{e}")
                 return ApiResponse(code=1002, detail=_("Wrong upload file type"))
-            obj = UploadFile.objects.create(creator=request.user, filename=file_obj.name, is_upload=True, is_tmp=True,
-                                            filepath=file_obj, mime_type=file_obj.content_type, filesize=file_obj.size)
-            result.append(obj)
+        result = []
+        with transaction.atomic():
+            for file_obj in files:
+                obj = UploadFile.build_from_upload(file_obj, creator=request.user, is_tmp=True)
+                obj.save(force_insert=True)
+                result.append(obj)
         return ApiResponse(data=self.get_serializer(result, many=True).data)
+
+    def get_chunk_state(self, chunked, info):
+        return {
+            'upload_id': chunked.upload_id,
+            'chunk_size': info['chunk_size'],
+            'part_count': info['part_count'],
+            'uploaded_parts': chunked.get_uploaded_parts(info),
+        }
+
+    @extend_schema(
+        description="分片上传初始化，传入 upload_id 时返回已上传的分片，用于断点续传",
+        request=OpenApiRequest(
+            build_object_type(properties={
+                'upload_id': build_basic_type(OpenApiTypes.STR),
+                'filename': build_basic_type(OpenApiTypes.STR),
+                'filesize': build_basic_type(OpenApiTypes.NUMBER),
+                'mime_type': build_basic_type(OpenApiTypes.STR),
+                'md5sum': build_basic_type(OpenApiTypes.STR),
+            })
+        ),
+        responses=get_default_response_schema()
+    )
+    @action(methods=['post'], detail=False, url_path='chunk-init', throttle_classes=[UploadThrottle, ])
+    def chunk_init(self, request, *args, **kwargs):
+        """分片上传初始化"""
+        upload_id = request.data.get('upload_id')
+        if upload_id:
+            chunked = ChunkedUpload(upload_id)
+            info = chunked.get_info(request.user.pk)
+            if not info:
+                return ApiResponse(code=1001, detail=_("Upload task does not exist or has expired"))
+            return ApiResponse(data=self.get_chunk_state(chunked, info))
+
+        filename = request.data.get('filename')
+        try:
+            filesize = int(request.data.get('filesize'))
+        except (TypeError, ValueError):
+            filesize = -1
+        if not filename or filesize < 0:
+            return ApiResponse(code=1001, detail=_("Parameter error"))
+        file_upload_max_size = get_upload_max_size(request.user)
+        if filesize > file_upload_max_size:
+            return ApiResponse(code=1003, detail=_("upload file size cannot exceed {}").format(file_upload_max_size))
+
+        mime_type = request.data.get('mime_type') or 'application/octet-stream'
+        md5sum = request.data.get('md5sum')
+        if md5sum:
+            # 内容相同的文件已存在，直接引用，无需上传
+            # 客户端的 md5 未经校验，只能引用自己上传或有数据权限的文件，避免通过 md5 获取他人的文件
+            queryset = get_filter_queryset(UploadFile.objects.all(), request.user)
+            queryset = queryset | UploadFile.objects.filter(creator=request.user)
+            filepath = UploadFile.get_shared_filepath(md5sum, filesize, queryset)
+            if filepath:
+                obj = UploadFile.objects.create(creator=request.user, filename=filename, filepath=filepath,
+                                                md5sum=md5sum, filesize=filesize, mime_type=mime_type,
+                                                is_upload=True, is_tmp=True)
+                return ApiResponse(data={'file': self.get_serializer(obj).data})
+
+        chunked = ChunkedUpload.create(request.user.pk, filename, filesize, mime_type)
+        return ApiResponse(data=self.get_chunk_state(chunked, chunked.get_info()))
+
+    @extend_schema(
+        description="上传分片",
+        request=OpenApiRequest(
+            build_object_type(properties={
+                'upload_id': build_basic_type(OpenApiTypes.STR),
+                'index': build_basic_type(OpenApiTypes.NUMBER),
+                'file': build_basic_type(OpenApiTypes.BINARY),
+            })
+        ),
+        responses=get_default_response_schema()
+    )
+    @action(methods=['post'], detail=False, url_path='chunk-part', parser_classes=(MultiPartParser,))
+    def chunk_part(self, request, *args, **kwargs):
+        """上传分片"""
+        chunked = ChunkedUpload(request.data.get('upload_id', ''))
+        info = chunked.get_info(request.user.pk)
+        if not info:
+            return ApiResponse(code=1001, detail=_("Upload task does not exist or has expired"))
+        file_obj = request.FILES.get('file')
+        try:
+            chunked.save_part(info, int(request.data.get('index')), file_obj)
+        except Exception as e:
+            logger.warning(f"user:{request.user} upload part failed {e}")
+            return ApiResponse(code=1002, detail=_("Wrong upload file part"))
+        return ApiResponse()
+
+    @extend_schema(
+        description="合并分片，完成上传",
+        request=OpenApiRequest(
+            build_object_type(properties={
+                'upload_id': build_basic_type(OpenApiTypes.STR),
+                'md5sum': build_basic_type(OpenApiTypes.STR),
+            })
+        ),
+        responses=get_default_response_schema()
+    )
+    @action(methods=['post'], detail=False, url_path='chunk-complete', throttle_classes=[UploadThrottle, ])
+    def chunk_complete(self, request, *args, **kwargs):
+        """完成分片上传"""
+        chunked = ChunkedUpload(request.data.get('upload_id', ''))
+        info = chunked.get_info(request.user.pk)
+        if not info:
+            return ApiResponse(code=1001, detail=_("Upload task does not exist or has expired"))
+        file_obj = chunked.merge(info)
+        if file_obj is None:
+            return ApiResponse(code=1002, detail=_("Upload file parts are incomplete"),
+                               data=self.get_chunk_state(chunked, info))
+        try:
+            md5sum = request.data.get('md5sum')
+            if md5sum and md5sum != file_obj.md5sum:
+                chunked.clean()
+                return ApiResponse(code=1002, detail=_("File md5sum verification failed"))
+            obj = UploadFile.build_from_upload(file_obj, creator=request.user, is_tmp=True)
+            obj.save(force_insert=True)
+        finally:
+            file_obj.close()
+        chunked.clean()
+        return ApiResponse(data=self.get_serializer(obj).data)
@@ -10,6 +10,7 @@ from django_filters import rest_framework as filters
 
 from common.core.filter import BaseFilterSet, PkMultipleFilter
 from common.core.modelset import ListDeleteModelSet, OnlyExportDataAction
+from common.core.pagination import CursorPageNumber
 from system.models import UserLoginLog
 from system.serializers.log import LoginLogSerializer
 
@@ -32,4 +33,6 @@ class LoginLogViewSet(ListDeleteModelSet, OnlyExportDataAction):
     serializer_class = LoginLogSerializer
 
     ordering_fields = ['created_time']
+    pagination_class = CursorPageNumber
     filterset_class = LoginLogFilter
+    batch_destroy_bulk = True  # 日志数据量大，且没有文件和自定义删除逻辑
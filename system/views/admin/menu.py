@@ -20,7 +20,7 @@ from common.core.utils import get_all_url_dict
 from common.swagger.utils import get_default_response_schema
 from system.models import Menu, ModelLabelField
 from system.serializers.menu import MenuSerializer
-from system.signal_handler import clean_cache_handler
+from system.signal_handler import clean_cache_handler, incr_menu_route_version
 from system.utils.menu import get_view_permissions
 
 
@@ -68,6 +68,10 @@ class MenuViewSet(BaseModelSet, RankAction, ImportExportDataAction, ChoicesActio
         """获取后端API列表"""
         return ApiResponse(data=get_all_url_dict(''))
 
+    def perform_rank(self, ranks):
+        super().perform_rank(ranks)
+        incr_menu_route_version()  # 菜单排序变化，路由树需要重新生成
+
     @temporary_disable_signal(post_save, receiver=clean_cache_handler, sender=Menu)
     def _save_permissions(self, instance, permissions, skip_existing):
         # 该代码禁用了信号，菜单数据不刷新
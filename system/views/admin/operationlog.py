@@ -10,6 +10,7 @@ from django_filters import rest_framework as filters
 
 from common.core.filter import BaseFilterSet, PkMultipleFilter
 from common.core.modelset import ListDeleteModelSet, OnlyExportDataAction
+from common.core.pagination import CursorPageNumber
 from system.models import OperationLog
 from system.serializers.log import OperationLogSerializer
 
@@ -40,4 +41,6 @@ class OperationLogViewSet(ListDeleteModelSet, OnlyExportDataAction):
     serializer_class = OperationLogSerializer
 
     ordering_fields = ['created_time', 'updated_time', 'exec_time']
+    pagination_class = CursorPageNumber
     filterset_class = OperationLogFilter
+    batch_destroy_bulk = True  # 日志数据量大，且没有文件和自定义删除逻辑
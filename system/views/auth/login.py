@@ -33,10 +33,9 @@ def login_failed(request, username):
     login_ip_block = LoginIpBlockUtil(ipaddr)
     request.user = UserInfo.objects.filter(username=username).first()
     save_login_log(request, status=False)
-    login_block_util.incr_failed_count()
+    times_remainder = login_block_util.incr_failed_count()
     login_ip_block.set_block_if_need()
 
-    times_remainder = login_block_util.get_remainder_times()
     if times_remainder > 0:
         detail = _(
             "The username or password you entered is incorrect, "
@@ -6,7 +6,7 @@
 # date : 3/13/2024
 import datetime
 
-from django.db.models import Count
+from django.db.models import Count, Q
 from django.db.models.functions import TruncDay
 from django.utils import timezone
 from drf_spectacular.plumbing import build_object_type, build_basic_type, build_array_type
@@ -15,10 +15,12 @@ from drf_spectacular.utils import extend_schema
 from rest_framework.decorators import action
 from rest_framework.viewsets import GenericViewSet
 
+from common.cache.storage import DashboardRollupVersionCache
 from common.core.response import ApiResponse
 from common.swagger.utils import get_default_response_schema
-from system.models import UserLoginLog, OperationLog, UserInfo
+from system.models import UserLoginLog, OperationLog, UserInfo, DailyRollup
 from system.serializers.log import LoginLogSerializer
+from system.utils.dashboard import get_trend_percent, get_rollup_trend
 
 
 def trend_info(queryset, limit_day=30):
@@ -33,13 +35,7 @@ def trend_info(queryset, limit_day=30):
     for i in range(limit_day, -1, -1):
         date = (today - datetime.timedelta(days=i)).strftime('%m-%d')
         results.append({'day': date, 'count': dict_count[date] if date in dict_count else 0})
-    if len(results) > 1:
-        y = results[-2].get('count')
-        percent = round(100 * (results[-1].get('count') - y) / 1 if y == 0 else y)
-    else:
-        percent = 0
-
-    return results, percent, queryset.count()
+    return results, get_trend_percent(results), queryset.count()
 
 
 def get_schema_response(has_count=True):
@@ -70,37 +66,48 @@ class DashboardViewSet(GenericViewSet):
     serializer_class = LoginLogSerializer
     ordering_fields = ['created_time']
 
+    def get_trend_info(self, name, limit_day=30):
+        """
+        优先读取定时任务汇总的按天数据，存在数据权限等过滤条件或者还未汇总时，直接查询
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        version = DashboardRollupVersionCache().get_version()
+        if queryset.query.has_filters() or not version:
+            return trend_info(queryset, limit_day)
+        results, count = get_rollup_trend(name, limit_day, timezone.localdate(), version)
+        return results, get_trend_percent(results), count
+
     @extend_schema(responses=get_schema_response())
     @action(methods=['GET'], detail=False, url_path='user-login-total')
     def user_login_total(self, request, *args, **kwargs):
         """{cls}-用户登录"""
-        results, percent, count = trend_info(self.filter_queryset(self.get_queryset()), 7)
+        results, percent, count = self.get_trend_info(DailyRollup.NameChoices.LOGIN, 7)
         return ApiResponse(results=results, percent=percent, count=count)
 
     @extend_schema(responses=get_schema_response())
     @action(methods=['GET'], detail=False, queryset=UserInfo.objects.all(), url_path='user-total')
     def user_total(self, request, *args, **kwargs):
         """{cls}-用户数量"""
-        results, percent, count = trend_info(self.filter_queryset(self.get_queryset()), 7)
+        results, percent, count = self.get_trend_info(DailyRollup.NameChoices.REGISTER, 7)
         return ApiResponse(results=results, percent=percent, count=count)
 
     @extend_schema(responses=get_schema_response(False))
     @action(methods=['GET'], detail=False, queryset=UserInfo.objects.all(), url_path='user-registered-trend')
     def user_registered_trend(self, request, *args, **kwargs):
         """{cls}-注册报表"""
-        return ApiResponse(data=trend_info(self.filter_queryset(self.get_queryset()))[0])
+        return ApiResponse(data=self.get_trend_info(DailyRollup.NameChoices.REGISTER)[0])
 
     @extend_schema(responses=get_schema_response(False))
     @action(methods=['GET'], detail=False, url_path='user-login-trend')
     def user_login_trend(self, request, *args, **kwargs):
         """{cls}-登录报表"""
-        return ApiResponse(data=trend_info(self.filter_queryset(self.get_queryset()))[0])
+        return ApiResponse(data=self.get_trend_info(DailyRollup.NameChoices.LOGIN)[0])
 
     @extend_schema(responses=get_schema_response())
     @action(methods=['GET'], detail=False, queryset=OperationLog.objects.all(), url_path='today-operate-total')
     def today_operate_total(self, request, *args, **kwargs):
         """{cls}-最近操作日志"""
-        results, percent, count = trend_info(self.filter_queryset(self.get_queryset()), 7)
+        results, percent, count = self.get_trend_info(DailyRollup.NameChoices.OPERATION, 7)
         return ApiResponse(results=results, percent=percent, count=count)
 
     @extend_schema(
@@ -115,13 +122,13 @@ class DashboardViewSet(GenericViewSet):
         """{cls}-活跃用户"""
         today = timezone.now()
         active_date_list = [1, 3, 7, 30]
-        results = []
-        queryset = self.filter_queryset(self.get_queryset())
+        aggregates = {}
         for date in active_date_list:
             x_day = today - datetime.timedelta(days=date - 1, hours=today.hour, minutes=today.minute,
                                                seconds=today.second, microseconds=today.microsecond)
-            x_day_register_user = queryset.filter(date_joined__gte=x_day).count()
-            x_day_active_user = queryset.filter(last_login__gte=x_day).values('last_login').annotate(
-                count=Count('pk', distinct=True)).count()
-            results.append([date, x_day_register_user, x_day_active_user])
+            aggregates[f'register_{date}'] = Count('pk', filter=Q(date_joined__gte=x_day))
+            aggregates[f'active_{date}'] = Count('pk', filter=Q(last_login__gte=x_day))
+        # 一条聚合语句统计所有时间段的注册和活跃用户
+        data = self.filter_queryset(self.get_queryset()).order_by().aggregate(**aggregates)
+        results = [[date, data[f'register_{date}'], data[f'active_{date}']] for date in active_date_list]
         return ApiResponse(data=results)
@@ -4,47 +4,72 @@
 # filename : routes
 # author : ly_13
 # date : 4/21/2024
+import hashlib
+
+from django.db.models import Q
 from drf_spectacular.utils import extend_schema
 from rest_framework.generics import GenericAPIView
 
-from common.base.magic import cache_response
+from common.base.magic import MagicCacheData
 from common.base.utils import menu_list_to_tree, format_menu_data
-from common.core.modelset import CacheDetailResponseMixin
-from common.core.permission import get_user_menu_queryset
+from common.cache.storage import MenuRouteVersionCache
+from common.core.auth import get_user_role_ids
 from common.core.response import ApiResponse
 from system.models import Menu
 from system.serializers.route import RouteSerializer
 
 
-def get_auths(user):
-    if user.is_superuser:
-        menu_obj = Menu.objects.filter(is_active=True)
-    else:
-        menu_obj = get_user_menu_queryset(user)
-    if not menu_obj:
-        menu_obj = Menu.objects.none()
-    return menu_obj.filter(menu_type=Menu.MenuChoices.PERMISSION).values_list('name', flat=True).distinct()
+def get_route_signature(user_obj):
+    """
+    用户的菜单只由 (角色, 部门) 决定，相同组合的用户共用一份路由树
+    :return: (签名, 角色ID列表, 部门ID)，超级管理员签名为 superuser
+    """
+    if user_obj.is_superuser:
+        return 'superuser', None, None
+    role_pks = sorted(str(pk) for pk in get_user_role_ids(user_obj))
+    dept_pk = str(user_obj.dept_id) if user_obj.dept_id else None
+    signature = hashlib.md5(f"{','.join(role_pks)}|{dept_pk}".encode('utf-8')).hexdigest()
+    return signature, role_pks, dept_pk
+
+
+@MagicCacheData.make_cache(timeout=3600 * 24, single_flight=True, stale_time=60, local_timeout=5,
+                           key_func=lambda signature, *args: signature,
+                           version_func=lambda *args: MenuRouteVersionCache().get_version())
+def get_role_routes(signature, role_pks, dept_pk):
+    """
+    按 (角色, 部门) 签名缓存路由树和按钮权限，缓存数据中保存菜单版本号
+    菜单版本号变化后，由一个进程重新生成，其他进程在 stale_time 内返回旧数据
+    :return: {'data': 路由树, 'auths': 按钮权限}
+    """
+    queryset = Menu.objects.filter(is_active=True)
+    if signature != 'superuser':
+        q = Q()
+        if role_pks:
+            q |= Q(userrole__in=role_pks, userrole__is_active=True)
+        if dept_pk:
+            q |= Q(userrole__deptinfo=dept_pk, userrole__deptinfo__is_active=True)
+        if not q:
+            return {'data': [], 'auths': []}
+        queryset = queryset.filter(q).distinct()
+
+    route_list, auths = [], []
+    menu_type = [Menu.MenuChoices.DIRECTORY, Menu.MenuChoices.MENU]
+    # 一次查询获取目录，菜单和按钮权限
+    menus = list(queryset.select_related('meta', 'parent').order_by('rank'))
+    for menu in menus:
+        if menu.menu_type == Menu.MenuChoices.PERMISSION:
+            auths.append(menu.name)
+        elif menu.menu_type in menu_type:
+            route_list.append(menu)
+    route_list = RouteSerializer(route_list, many=True, ignore_field_permission=True).data
+    return {'data': format_menu_data(menu_list_to_tree(route_list)), 'auths': list(dict.fromkeys(auths))}
 
 
-class UserRoutesAPIView(GenericAPIView, CacheDetailResponseMixin):
+class UserRoutesAPIView(GenericAPIView):
     """获取菜单路由"""
 
     @extend_schema(exclude=True)
-    @cache_response(timeout=3600 * 24, key_func='get_cache_key')
     def get(self, request):
-        route_list = []
-        user_obj = request.user
-        menu_type = [Menu.MenuChoices.DIRECTORY, Menu.MenuChoices.MENU]
-        if user_obj.is_superuser:
-            route_list = RouteSerializer(Menu.objects.filter(is_active=True, menu_type__in=menu_type).order_by('rank'),
-                                         many=True, ignore_field_permission=True).data
-
-            return ApiResponse(data=format_menu_data(menu_list_to_tree(route_list)), auths=get_auths(user_obj))
-        else:
-            menu_queryset = get_user_menu_queryset(user_obj)
-            if menu_queryset:
-                route_list = RouteSerializer(
-                    menu_queryset.filter(menu_type__in=menu_type).distinct().order_by('rank'), many=True,
-                    ignore_field_permission=True).data
-
-        return ApiResponse(data=format_menu_data(menu_list_to_tree(route_list)), auths=get_auths(user_obj))
+        signature, role_pks, dept_pk = get_route_signature(request.user)
+        routes = get_role_routes(signature, role_pks, dept_pk)
+        return ApiResponse(data=routes['data'], auths=routes['auths'])